@@ -1,13 +1,67 @@
 # app/api/server.py
-import os, sys, subprocess, requests
-from fastapi import FastAPI, HTTPException
+import json, os, sys, subprocess, requests
+import threading
+import time
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI, HTTPException, Request
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
 from pydantic import BaseModel
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.infra.es_client import get_es
+from app.retrieval import embedder, reranker
 from app.retrieval.searcher import elser_only, hybrid_rrf
+from app.generation.evidence import gate
+from app.generation.generator import DEFAULT_REFUSAL
+from app.generation.guardrails import REFUSAL, check_query
+from app.llm import ollama_client
+from app.utils import metrics, profiling
+from app.utils.logging import get_logger
+from app.utils.metrics import span
 
-app = FastAPI(title="Elastic RAG API")
+log = get_logger(__name__)
+
+def warm_up() -> None:
+    """Load MiniLM (+ the cross-encoder when RERANK_ENABLED=1) and open the ES client."""
+    t0 = time.perf_counter()
+    try:
+        with span("warmup"):
+            embedder.warm_up()
+            if reranker.rerank_enabled():
+                reranker.warm_up()
+            get_es()
+    except Exception:
+        log.exception("warm-up failed; models will load on the first request instead")
+        return
+    log.info("warm-up done in %.1fs", time.perf_counter() - t0)
+
+def preload_models() -> None:
+    """
+    Load model weights without running them. Used by the pre-fork launcher (scripts/serve.py):
+    the parent loads once and forked workers share the pages copy-on-write. No forward pass runs
+    here, so no torch/OpenMP thread pool exists yet when the parent forks.
+    """
+    with span("preload"):
+        embedder.load()
+        if reranker.rerank_enabled():
+            reranker.load()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Imports are lazy, so the worker accepts requests immediately; WARMUP_ON_START=1 loads the
+    # models in the background instead of on the first query.
+    if os.getenv("WARMUP_ON_START", "0") == "1":
+        threading.Thread(target=warm_up, name="warmup", daemon=True).start()
+    # /query runs in the threadpool; concurrent requests share one MiniLM forward pass
+    if os.getenv("EMBED_BATCHING", "1") == "1":
+        embedder.start_batching()
+    if os.getenv("PROFILE_SAMPLER", "0") == "1":
+        profiling.sampler.start()
+    yield
+    profiling.sampler.stop()
+    embedder.stop_batching()
+
+app = FastAPI(title="Elastic RAG API", lifespan=lifespan)
 
 # (optional) CORS if you’ll call from a web UI
 app.add_middleware(
@@ -15,60 +69,99 @@ app.add_middleware(
     allow_origins=["*"], allow_methods=["*"], allow_headers=["*"]
 )
 
+HTTP_SECONDS = metrics.histogram("rag_http_request_seconds", "End-to-end API request latency")
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    if not metrics.ENABLED or request.url.path == "/metrics":
+        return await call_next(request)
+    t0 = time.perf_counter()
+    with metrics.trace_request() as tr:
+        response = await call_next(request)
+    HTTP_SECONDS.observe(time.perf_counter() - t0, path=request.url.path, status=response.status_code)
+    if tr.spans:
+        # e.g. "embed;dur=11.8, es;dur=84.0, prompt_build;dur=0.2, llm;dur=2310.4"
+        response.headers["Server-Timing"] = tr.server_timing()
+    return response
+
+@app.middleware("http")
+async def profile_requests(request: Request, call_next):
+    # X-Profile / PROFILE_SAMPLE_RATE; @profiling.profiled endpoints run under the profiler
+    with profiling.request_scope(request.headers, request.url.path) as scope:
+        response = await call_next(request)
+    if scope.profile_id:
+        response.headers["X-Profile-Id"] = scope.profile_id
+    return response
+
+def require_admin(request: Request) -> None:
+    """
+    Admin endpoints need X-Admin-Token == ADMIN_TOKEN; without ADMIN_TOKEN, loopback clients only.
+    Behind a reverse proxy on the same host every request comes from loopback, so set ADMIN_TOKEN there.
+    """
+    token = os.getenv("ADMIN_TOKEN")
+    if token:
+        if request.headers.get("x-admin-token") != token:
+            raise HTTPException(403, "admin token required")
+    elif not request.client or request.client.host not in ("127.0.0.1", "::1", "localhost"):
+        raise HTTPException(403, "set ADMIN_TOKEN to use admin endpoints remotely")
+
 # ---------- Models ----------
+class QueryFilters(BaseModel):
+    collection: str | list[str] | None = None
+    file_id: str | list[str] | None = None
+    filename: str | list[str] | None = None
+    ingested_after: str | None = None   # ISO date, inclusive
+    ingested_before: str | None = None
+
 class QueryIn(BaseModel):
     q: str
     k: int = 5
     mode: str = "hybrid"       # "elser" | "hybrid"
+    rerank: bool | None = None  # None -> RERANK_ENABLED env default
+    filters: QueryFilters | None = None  # pre-filters applied in every retrieval leg
+    session_id: str | None = None  # follow-up turns reuse the LLM context of earlier ones
 
 class QueryOut(BaseModel):
     answer: str
     citations: list
+    session_id: str | None = None
+    degraded: str | None = None  # "bm25" when ES fell back to lexical-only search
 
 class IngestIn(BaseModel):
     limit: int | None = None
     index: bool = True
 
 # ---------- Helpers ----------
-def call_ollama(prompt: str, model: str | None = None, base_url: str | None = None, timeout=120) -> str:
-    url = f"{base_url or os.getenv('OLLAMA_BASE_URL','http://127.0.0.1:11434')}/api/generate"
-    data = {
-        "model": model or os.getenv("OLLAMA_MODEL", "llama3.2:1b"),
-        "prompt": prompt,
-        "stream": False,
-        "options": {"temperature": 0.2}
-    }
-    r = requests.post(url, json=data, timeout=timeout)
-    if r.status_code != 200:
-        raise HTTPException(502, f"Ollama error {r.status_code}: {r.text[:200]}")
-    return r.json().get("response", "")
-
-def make_prompt(question, hits):
-    parts = []
-    for i, h in enumerate(hits, start=1):
-        p0, p1 = (h.get("page_range") or [None, None])
-        meta = f"[{i}] {h.get('filename','')} p.{p0}-{p1} {h.get('drive_url','')}".strip()
-        txt = (h.get("snippet") or h.get("text") or "").strip()
-        parts.append(meta + "\n" + txt)
-    context = "\n\n".join(parts[:10])
-    return f"""You are a helpful assistant. Answer the QUESTION using only the CONTEXT.
-If the answer cannot be found, say "I don't know." Be concise.
-
-QUESTION:
-{question}
-
-CONTEXT:
-{context}
-
-Answer:"""
+def call_ollama(question: str, hits: list, session_id: str | None = None, model: str | None = None,
+                timeout=120) -> str:
+    """Prefix-stable prompt (system, context, question) through app.llm.ollama_client."""
+    try:
+        out = ollama_client.answer(question, hits, session_id=session_id, model=model,
+                                   options={"temperature": 0.2}, timeout=timeout)
+    except requests.HTTPError as e:
+        raise HTTPException(502, f"Ollama error {e.response.status_code}: {e.response.text[:200]}")
+    return out.get("response", "")
 
 # ---------- Endpoints ----------
-@app.post("/query", response_model=QueryOut)
-def query(body: QueryIn):
-    hits = elser_only(body.q, body.k) if body.mode == "elser" else hybrid_rrf(body.q, body.k)
-    prompt = make_prompt(body.q, hits)
-    answer = call_ollama(prompt).strip()
+def _retrieve(body: QueryIn):
+    """
+    Guardrail, retrieval and evidence gate shared by /query and /query/stream:
+    (hits, degraded, refusal). `refusal` is the answer when the LLM shouldn't be called.
+    """
+    with span("guardrail"):
+        blocked = check_query(body.q)
+    if blocked:  # rejected before any search or generation
+        return [], None, REFUSAL
+    search_fn = elser_only if body.mode == "elser" else hybrid_rrf
+    filters = body.filters.model_dump(exclude_none=True) if body.filters else None
+    hits = search_fn(body.q, body.k, rerank_hits=body.rerank, filters=filters)
+    degraded = hits[0].get("degraded") if hits else None
+    ok, _ = gate(hits, "elser" if body.mode == "elser" else "hybrid")
+    if not ok:  # weak evidence: the LLM would only say it doesn't know
+        return [], degraded, DEFAULT_REFUSAL
+    return hits, degraded, None
 
+def _citations(hits: list) -> list:
     citations = []
     for i, h in enumerate(hits, start=1):
         citations.append({
@@ -80,7 +173,49 @@ def query(body: QueryIn):
             "page_range": h.get("page_range"),
             "snippet": (h.get("snippet") or "")[:300],
         })
-    return {"answer": answer, "citations": citations}
+    return citations
+
+@app.post("/query", response_model=QueryOut)
+@profiling.profiled
+def query(body: QueryIn):
+    hits, degraded, refusal = _retrieve(body)
+    if refusal is not None:
+        return {"answer": refusal, "citations": [], "session_id": body.session_id, "degraded": degraded}
+    answer = call_ollama(body.q, hits, body.session_id).strip()
+    return {"answer": answer, "citations": _citations(hits), "session_id": body.session_id, "degraded": degraded}
+
+@app.post("/query/stream")
+@profiling.profiled
+def query_stream(body: QueryIn):
+    """
+    /query as NDJSON, so clients can render the answer while it is generated:
+      {"type": "meta", "citations": [...], "session_id": ..., "degraded": ...}   once, before generation
+      {"type": "token", "text": "..."}                                            per generated piece
+      {"type": "done", "answer": "..."}  or  {"type": "error", "message": "..."}  last
+    Retrieval runs before the response starts, so its errors are still plain HTTP errors.
+    """
+    hits, degraded, refusal = _retrieve(body)
+    meta = {"type": "meta", "citations": _citations(hits), "session_id": body.session_id, "degraded": degraded}
+
+    def lines():
+        yield json.dumps(meta) + "\n"
+        if refusal is not None:
+            yield json.dumps({"type": "token", "text": refusal}) + "\n"
+            yield json.dumps({"type": "done", "answer": refusal}) + "\n"
+            return
+        parts = []
+        try:
+            for piece in ollama_client.answer_stream(body.q, hits, session_id=body.session_id,
+                                                     options={"temperature": 0.2}):
+                parts.append(piece)
+                yield json.dumps({"type": "token", "text": piece}) + "\n"
+        except Exception as e:  # headers are gone; report in-band
+            log.exception("streaming generation failed")
+            yield json.dumps({"type": "error", "message": f"{type(e).__name__}: {e}"}) + "\n"
+            return
+        yield json.dumps({"type": "done", "answer": "".join(parts).strip()}) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
 
 @app.post("/ingest")
 def ingest(body: IngestIn):
@@ -93,6 +228,47 @@ def ingest(body: IngestIn):
         raise HTTPException(500, f"ingest failed\nSTDOUT:\n{p.stdout}\n\nSTDERR:\n{p.stderr}")
     return {"ok": True, "stdout": p.stdout}
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics_endpoint():
+    return PlainTextResponse(metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+@app.get("/admin/profiles", dependencies=[Depends(require_admin)])
+def admin_profiles():
+    """Recent request profiles (newest first) with their five hottest functions."""
+    return {"profiles": profiling.list_profiles()}
+
+@app.get("/admin/profiles/{profile_id}", dependencies=[Depends(require_admin)])
+def admin_profile(profile_id: str, format: str = "json"):
+    """One profile: json (top functions + text report), text, html (pyinstrument) or pstats (cProfile dump)."""
+    p = profiling.get_profile(profile_id)
+    if p is None:
+        raise HTTPException(404, f"no profile {profile_id} (only the last {profiling.KEEP} are kept)")
+    if format == "text":
+        return PlainTextResponse(p.get("text", ""))
+    if format == "html" and p.get("html"):
+        return Response(p["html"], media_type="text/html")
+    if format == "pstats":
+        data = profiling.pstats_bytes(p)
+        if data is None:
+            raise HTTPException(400, "pstats is only available for cProfile profiles")
+        return Response(data, media_type="application/octet-stream",
+                        headers={"Content-Disposition": f'attachment; filename="{profile_id}.pstats"'})
+    return {k: v for k, v in p.items() if k not in ("pstats", "html")}
+
+@app.get("/admin/profiler/stacks", dependencies=[Depends(require_admin)])
+def admin_stacks(format: str = "json", limit: int = 50):
+    """Continuous sampler: hottest stacks and leaf functions, or the collapsed stacks for a flame graph."""
+    if format == "collapsed":
+        return PlainTextResponse(profiling.sampler.collapsed())
+    return profiling.sampler.top(limit)
+
+@app.post("/admin/profiler/{action}", dependencies=[Depends(require_admin)])
+def admin_sampler(action: str):
+    if action not in ("start", "stop", "reset"):
+        raise HTTPException(404, f"unknown action {action}")
+    getattr(profiling.sampler, action)()
+    return {"running": profiling.sampler.running, "samples": profiling.sampler.samples}
+
 @app.get("/healthz")
 def healthz():
     es_ok = False
@@ -103,8 +279,7 @@ def healthz():
 
     ollama_ok = False
     try:
-        base = os.getenv("OLLAMA_BASE_URL", "http://127.0.0.1:11434")
-        r = requests.get(base + "/api/tags", timeout=5)
+        r = requests.get(ollama_client.base_url() + "/api/tags", timeout=5)
         ollama_ok = r.ok
     except Exception:
         ollama_ok = False
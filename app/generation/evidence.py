@@ -0,0 +1,116 @@
+# app/generation/evidence.py
+"""
+Evidence gate: decide before generation whether the retrieved hits can support an answer.
+
+When they can't, the caller returns the refusal directly instead of paying seconds of LLM time
+for the model to say "I don't know." Three signals, all already available after retrieval:
+
+  score   best ES score of the hits (RRF-fused score in hybrid mode, bool score in elser mode)
+  legs    hybrid only: how many of the BM25 / ELSER / kNN legs at least ranked the best hit.
+          Each leg adds at most 1 / (rank_constant + 1) to an RRF score, so this is a lower bound
+  cosine  best query-chunk cosine (MiniLM), computed by the searcher's follow-up ids query
+
+A hit set passes when every signal meets its threshold. Thresholds come per mode from
+EVIDENCE_CALIBRATION_PATH (written by scripts/calibrate_evidence.py). EVIDENCE_MIN_SCORE /
+_LEGS / _COSINE, when set, override them.
+
+EVIDENCE_GATE=auto (default) turns the gate on only once a calibration file exists, so an
+uncalibrated install neither refuses answers on guessed thresholds nor pays for the cosine
+follow-up query. EVIDENCE_GATE=1 forces it on (then only explicitly set thresholds and "no
+hits" apply without a calibration), 0 turns it off. The file is checked on every call and
+re-read when it changes, so a calibration run takes effect without a restart.
+"""
+import json
+import math
+import os
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.utils.logging import get_logger
+from app.utils.metrics import inc
+
+log = get_logger(__name__)
+
+SIGNALS = ("score", "legs", "cosine")
+
+def _calibration() -> Optional[Dict[str, Any]]:
+    return _load(os.getenv("EVIDENCE_CALIBRATION_PATH", "./tmp/evidence_calibration.json"))
+
+def gate_enabled() -> bool:
+    setting = os.getenv("EVIDENCE_GATE", "auto").lower()
+    if setting == "auto":
+        return _calibration() is not None
+    return setting == "1"
+
+def needs_cosine(mode: str | None = None) -> bool:
+    """Whether the gate will read per-hit cosine, i.e. whether the searcher should compute it."""
+    return gate_enabled() and thresholds(mode)["min_cosine"] > 0
+
+def _load(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        st = Path(path).stat()
+        return _parse(path, st.st_mtime_ns, st.st_size)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError):
+        # not cached: a file caught mid-write is read again on the next call
+        log.warning("evidence: ignoring unreadable calibration file %s", path)
+        return None
+
+@lru_cache(maxsize=4)
+def _parse(path: str, mtime_ns: int, size: int) -> Dict[str, Any]:
+    """The parsed file, cached per version (errors propagate and aren't cached)."""
+    return json.loads(Path(path).read_text())
+
+def thresholds(mode: str | None) -> Dict[str, float]:
+    """min_score / min_legs / min_cosine for a retrieval mode (0 = signal not checked)."""
+    out = {"min_score": 0.0, "min_legs": 0.0, "min_cosine": 0.0}
+    cal = _calibration()
+    if cal and mode:
+        out.update(cal.get("modes", {}).get(mode, {}).get("thresholds", {}))
+    for name in SIGNALS:
+        value = os.getenv(f"EVIDENCE_MIN_{name.upper()}")
+        if value is not None:
+            out[f"min_{name}"] = float(value)
+    if mode is None:
+        out["min_score"] = 0.0  # score scales differ per mode; unknown mode -> don't compare
+    return out
+
+def signals(hits: List[Dict[str, Any]], mode: str | None) -> Dict[str, Optional[float]]:
+    """Evidence signals of a hit list (None when a signal isn't available)."""
+    scores = [h["score"] for h in hits if h.get("score") is not None]
+    cosines = [h["cosine"] for h in hits if h.get("cosine") is not None]
+    top = max(scores) if scores else None
+    legs = None
+    if mode == "hybrid" and top is not None:
+        from app.retrieval.searcher import RRF_RANK_CONSTANT
+        legs = float(math.ceil(top * (RRF_RANK_CONSTANT + 1) - 1e-4))  # float32 scores
+    return {"score": top, "legs": legs, "cosine": max(cosines) if cosines else None}
+
+def check(sig: Dict[str, Optional[float]], limits: Dict[str, float]) -> Optional[str]:
+    """Name of the first signal below its threshold, or None when the evidence is strong enough."""
+    for name in SIGNALS:
+        floor = limits.get(f"min_{name}", 0.0)
+        if floor and sig.get(name) is not None and sig[name] < floor:
+            return name
+    return None
+
+def gate(hits: List[Dict[str, Any]], mode: str | None = None) -> Tuple[bool, Dict[str, Any]]:
+    """
+    (answer?, details). details has the signals and "reason": "ok", "no_hits", "disabled" or the
+    signal that failed. Every decision is counted in rag_evidence_gate_total{mode,decision,reason}.
+    """
+    if not hits:
+        ok, sig, reason = False, {}, "no_hits"
+    elif not gate_enabled():
+        ok, sig, reason = True, {}, "disabled"
+    else:
+        # BM25 fallback hits (see searcher._search_or_bm25) carry BM25 scores, not this mode's
+        mode = hits[0].get("degraded") or mode
+        sig = signals(hits, mode)
+        weak = check(sig, thresholds(mode))
+        ok, reason = weak is None, weak or "ok"
+    inc("rag_evidence_gate_total", mode=mode or "unknown", decision="answer" if ok else "skip", reason=reason,
+        help="Pre-generation evidence gate decisions (skip = LLM not called)")
+    return ok, {**sig, "reason": reason}
@@ -1,9 +1,201 @@
+# app/generation/guardrails.py
+"""
+Deny-list guardrail, run before retrieval on every query path (/query, scripts.answer,
+scripts.search), so a rejected query costs microseconds instead of an ES search plus generation.
+
+Patterns are phrases, one per line, in GUARDRAIL_PATTERNS_DIR/*.txt (blank lines and "#" comments
+ignored); the file stem is the category reported for a match. Queries and patterns are compared
+as lowercase word sequences, so "Self-Harm" matches "self harm" and "skill" doesn't match "kill".
+Words are also reduced to a crude stem (plural -s, -ing, -ed, final -e), so "suicides",
+"self-harming" and "credit card generators" hit the same phrases as their base forms.
+
+All patterns go into one word-level Aho-Corasick automaton. A check is a single pass over the
+query's words, independent of how many patterns are loaded (see scripts/bench_guardrails.py).
+Pattern files are re-read when their mtimes change, checked at most every
+GUARDRAIL_RELOAD_SECONDS, and the rebuilt automaton is swapped in atomically.
+"""
+import os
+import re
+import threading
+import time
+from collections import deque
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from app.utils.logging import get_logger
+from app.utils.metrics import inc
+
+log = get_logger(__name__)
+
+REFUSAL = "I can’t help with that."
+
+# used when no pattern files exist (the old hard-coded list)
 UNSAFE_KEYWORDS = [
     "build a bomb", "make a weapon", "self-harm", "suicide", "credit card generator"
 ]
 
-def is_safe(query: str) -> bool:
-    q = query.lower()
-    return not any(bad in q for bad in UNSAFE_KEYWORDS)
+_WORDS = re.compile(r"[^\W_]+")
 
-REFUSAL = "I can’t help with that."
+
+@lru_cache(maxsize=65536)
+def stem(word: str) -> str:
+    """Strip simple English inflections; applied to pattern and query words alike."""
+    if word.endswith("ies") and len(word) > 4:
+        return word[:-3] + "y"
+    if word.endswith("s") and not word.endswith("ss") and len(word) > 3:
+        word = word[:-1]
+    for suffix in ("ing", "ed"):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            word = word[:-len(suffix)]
+            break
+    if word.endswith("e") and len(word) > 3:
+        word = word[:-1]
+    return word
+
+
+def words(text: str) -> Tuple[str, ...]:
+    return tuple(stem(w) for w in _WORDS.findall(text.lower()))
+
+
+class Match(NamedTuple):
+    category: str
+    pattern: str
+
+
+class Automaton:
+    """Aho-Corasick over words: goto / fail / output per state, built once, read-only after."""
+
+    __slots__ = ("_goto", "_fail", "_out", "size")
+
+    def __init__(self, patterns: Iterable[Tuple[str, str]]):
+        goto: List[Dict[str, int]] = [{}]
+        out: List[Optional[Match]] = [None]
+        self.size = 0
+        for category, pattern in patterns:
+            seq = words(pattern)
+            if not seq:
+                continue
+            node = 0
+            for w in seq:
+                nxt = goto[node].get(w)
+                if nxt is None:
+                    nxt = goto[node][w] = len(goto)
+                    goto.append({})
+                    out.append(None)
+                node = nxt
+            if out[node] is None:
+                out[node] = Match(category, pattern)
+                self.size += 1
+
+        # BFS for failure links; a state also reports the match of its longest proper suffix state
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for w, child in goto[node].items():
+                queue.append(child)
+                f = fail[node]
+                while f and w not in goto[f]:
+                    f = fail[f]
+                fail[child] = goto[f].get(w, 0)
+                if out[child] is None:
+                    out[child] = out[fail[child]]
+        self._goto, self._fail, self._out = goto, fail, out
+
+    def search(self, seq: Iterable[str]) -> Optional[Match]:
+        """First pattern found in the word sequence, or None."""
+        goto, fail, out = self._goto, self._fail, self._out
+        node = 0
+        for w in seq:
+            while node and w not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(w, 0)
+            if out[node] is not None:
+                return out[node]
+        return None
+
+
+def load_patterns(directory: Path) -> List[Tuple[str, str]]:
+    """(category, pattern) for every non-comment line of every *.txt file in `directory`."""
+    out = []
+    for path in sorted(directory.glob("*.txt")):
+        for line in path.read_text(encoding="utf-8").splitlines():
+            line = line.strip()
+            if line and not line.startswith("#"):
+                out.append((path.stem, line))
+    return out
+
+
+class Guardrail:
+    def __init__(self, directory: str | Path, reload_seconds: float = 5.0):
+        self.dir = Path(directory)
+        self.reload_seconds = reload_seconds
+        self._lock = threading.Lock()
+        self._stamp: Tuple = ()
+        self._checked = 0.0
+        self._automaton = Automaton(())
+        self.reload(force=True)
+
+    def _files_stamp(self) -> Tuple:
+        if not self.dir.is_dir():
+            return ()
+        return tuple((p.name, p.stat().st_mtime_ns, p.stat().st_size) for p in sorted(self.dir.glob("*.txt")))
+
+    def reload(self, force: bool = False) -> bool:
+        """Rebuild the automaton if a pattern file was added, removed or changed."""
+        with self._lock:
+            if not force and time.monotonic() - self._checked < self.reload_seconds:
+                return False  # another thread just looked
+            stamp = self._files_stamp()
+            self._checked = time.monotonic()
+            if not force and stamp == self._stamp:
+                return False
+            t0 = time.perf_counter()
+            try:
+                patterns = load_patterns(self.dir) if stamp else [("default", p) for p in UNSAFE_KEYWORDS]
+                automaton = Automaton(patterns)
+            except (OSError, UnicodeDecodeError):
+                log.exception("guardrails: reload from %s failed; keeping the previous patterns", self.dir)
+                return False
+            self._automaton, self._stamp = automaton, stamp
+        log.info("guardrails: %d patterns from %s in %.1fms",
+                 automaton.size, self.dir if stamp else "built-in list", (time.perf_counter() - t0) * 1000.0)
+        return True
+
+    def check(self, query: str) -> Optional[Match]:
+        if self.reload_seconds >= 0 and time.monotonic() - self._checked >= self.reload_seconds:
+            self.reload()
+        return self._automaton.search(words(query))
+
+    @property
+    def size(self) -> int:
+        return self._automaton.size
+
+
+_guardrail: Optional[Guardrail] = None
+_init_lock = threading.Lock()
+
+
+def get_guardrail() -> Guardrail:
+    global _guardrail
+    if _guardrail is None:
+        with _init_lock:
+            if _guardrail is None:
+                _guardrail = Guardrail(
+                    os.getenv("GUARDRAIL_PATTERNS_DIR", "data/guardrails"),
+                    float(os.getenv("GUARDRAIL_RELOAD_SECONDS", "5")),
+                )
+    return _guardrail
+
+
+def check_query(query: str) -> Optional[Match]:
+    """The deny pattern a query hits (counted in rag_guardrail_blocks_total), or None."""
+    match = get_guardrail().check(query)
+    if match is not None:
+        inc("rag_guardrail_blocks_total", category=match.category, help="Queries rejected by the guardrail")
+    return match
+
+
+def is_safe(query: str) -> bool:
+    return check_query(query) is None
@@ -1,15 +1,22 @@
 import os
 from functools import lru_cache
-from elasticsearch import Elasticsearch
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from elasticsearch import Elasticsearch
 
 @lru_cache(maxsize=1)
-def get_es() -> Elasticsearch:
-    url = os.getenv("ELASTIC_URL", "http://localhost:9200")
+def get_es() -> "Elasticsearch":
+    from elasticsearch import Elasticsearch  # ~0.2s of imports; only paid once a client is needed
+    # comma-separated nodes: the client round-robins, so a hedged search (es_resilience) lands elsewhere
+    hosts = [u.strip() for u in os.getenv("ELASTIC_URL", "http://localhost:9200").split(",") if u.strip()]
     user = os.getenv("ELASTIC_USERNAME")
     pwd  = os.getenv("ELASTIC_PASSWORD")
     return Elasticsearch(
-        url,
+        hosts,
         basic_auth=(user, pwd) if user and pwd else None,
         request_timeout=60,
         retry_on_timeout=True,
+        # searches are hedged instead of retried serially; more retries only stretch a stall
+        max_retries=int(os.getenv("ES_MAX_RETRIES", "1")),
     )
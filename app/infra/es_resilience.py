@@ -0,0 +1,296 @@
+# app/infra/es_resilience.py
+"""
+Tail-tolerant Elasticsearch searches: hedged requests plus a circuit breaker per query leg.
+
+Hedging. The primary search goes out with no `preference`, so adaptive replica selection picks a
+shard copy. If it hasn't answered after the leg's recent p95 (ES_HEDGE_MIN_MS..ES_HEDGE_MAX_MS,
+ES_HEDGE_DEFAULT_MS until ES_HEDGE_WARMUP samples exist), the same search is sent again with a
+random custom `preference`, which routes it to a copy chosen by hash. With several hosts in
+ELASTIC_URL the client's round-robin also sends it to another node. The first successful
+response wins. The loser can't be cancelled mid-flight with the sync client, so it finishes in
+the background and its result is dropped.
+
+Hedges are bounded in two ways. At most ES_HEDGE_BUDGET (10%) of recent requests may be hedged,
+so a slow cluster doesn't get double load. A hedge is also skipped when the pool (ES_HEDGE_POOL
+threads, which also run the primaries) has no idle worker. ES_HEDGE=0 calls ES inline as before.
+A request that is being profiled (app.utils.profiling.active()) also calls ES inline, unhedged:
+the profiler only sees the request's own thread, and the client, transport and JSON-decode time
+is what the profile is for.
+
+Circuit breaker. Each leg records its outcomes over the last ES_BREAKER_WINDOW_SECONDS. Only
+cluster-side failures count (is_cluster_error: 5xx, transport errors, timeouts); 4xx responses
+are the query's fault, and any other exception is a bug in our code. When at least ES_BREAKER_MIN_REQUESTS
+outcomes exist and ES_BREAKER_ERROR_RATE of them failed, the breaker opens and calls raise
+CircuitOpen immediately. After ES_BREAKER_COOLDOWN_SECONDS it lets one probe through
+(half-open): a success closes it, a failure opens it again. Only that probe's outcome counts
+there; requests that were already in flight when the breaker opened finish without moving it. The searcher catches CircuitOpen and
+cluster errors and degrades to a BM25-only query (see app.retrieval.searcher); everything else
+propagates.
+
+Metrics:
+  - rag_es_attempt_seconds{leg,attempt}: per-attempt latency (attempt is primary or hedge)
+  - rag_es_hedges_total{leg,result}: result is won, lost or skipped
+  - rag_es_breaker_state{leg}: 0 closed, 1 half-open, 2 open
+  - rag_es_breaker_rejections_total{leg}
+  - The end-to-end time stays in rag_stage_seconds{stage="es"}; compare its p99 with hedging on
+    and off (scripts/bench_hedging.py).
+"""
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+from app.utils import metrics, profiling
+from app.utils.logging import get_logger
+from app.utils.metrics import inc
+
+log = get_logger(__name__)
+
+HEDGE_ENABLED = os.getenv("ES_HEDGE", "1") == "1"
+HEDGE_MIN = float(os.getenv("ES_HEDGE_MIN_MS", "20")) / 1000.0
+HEDGE_MAX = float(os.getenv("ES_HEDGE_MAX_MS", "1000")) / 1000.0
+HEDGE_DEFAULT = float(os.getenv("ES_HEDGE_DEFAULT_MS", "200")) / 1000.0
+HEDGE_WARMUP = int(os.getenv("ES_HEDGE_WARMUP", "20"))
+HEDGE_BUDGET = float(os.getenv("ES_HEDGE_BUDGET", "0.1"))
+HEDGE_POOL = int(os.getenv("ES_HEDGE_POOL", "64"))
+SEARCH_TIMEOUT = float(os.getenv("ES_SEARCH_TIMEOUT_SECONDS", "10"))
+
+BREAKER_WINDOW = float(os.getenv("ES_BREAKER_WINDOW_SECONDS", "30"))
+BREAKER_MIN_REQUESTS = int(os.getenv("ES_BREAKER_MIN_REQUESTS", "10"))
+BREAKER_ERROR_RATE = float(os.getenv("ES_BREAKER_ERROR_RATE", "0.5"))
+BREAKER_COOLDOWN = float(os.getenv("ES_BREAKER_COOLDOWN_SECONDS", "15"))
+
+ATTEMPT_SECONDS = metrics.histogram("rag_es_attempt_seconds", "Latency of individual ES search attempts")
+BREAKER_STATE = metrics.gauge("rag_es_breaker_state", "ES circuit breaker per leg: 0 closed, 1 half-open, 2 open")
+
+CLOSED, HALF_OPEN, OPEN = 0, 1, 2
+_ADMITTED = object()  # allow() token for requests let through by a closed breaker
+
+
+class CircuitOpen(Exception):
+    """Raised instead of calling ES while a leg's breaker is open."""
+
+
+def is_cluster_error(exc: BaseException) -> bool:
+    """
+    Failures the cluster is to blame for: 5xx responses, transport errors (connection refused,
+    connection timeout), our own deadline and an open breaker. Not 4xx (bad query, missing
+    index) and not exceptions from our own code.
+    """
+    if isinstance(exc, (CircuitOpen, TimeoutError)):
+        return True
+    try:
+        from elasticsearch import ApiError, TransportError
+    except ImportError:
+        return False
+    if isinstance(exc, TransportError):
+        return True
+    if isinstance(exc, ApiError):
+        status = getattr(getattr(exc, "meta", None), "status", None) or getattr(exc, "status_code", None)
+        return isinstance(status, int) and status >= 500
+    return False
+
+
+class LatencyWindow:
+    """The last `size` latencies of a leg, for the hedge delay."""
+
+    def __init__(self, size: int = 256):
+        self._data: Deque[float] = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float) -> None:
+        with self._lock:
+            self._data.append(seconds)
+
+    def quantile(self, q: float) -> Optional[float]:
+        with self._lock:
+            data = sorted(self._data)
+        if len(data) < HEDGE_WARMUP:
+            return None
+        return data[min(len(data) - 1, int(q * len(data)))]
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, window: float = BREAKER_WINDOW, min_requests: int = BREAKER_MIN_REQUESTS,
+                 error_rate: float = BREAKER_ERROR_RATE, cooldown: float = BREAKER_COOLDOWN):
+        self.name = name
+        self.window, self.min_requests, self.error_rate, self.cooldown = window, min_requests, error_rate, cooldown
+        self.state = CLOSED
+        self._outcomes: Deque[Tuple[float, bool]] = deque()  # (monotonic time, ok)
+        self._opened_at = 0.0
+        self._probe: Optional[object] = None  # token of the half-open probe in flight
+        self._lock = threading.Lock()
+        BREAKER_STATE.set(CLOSED, leg=name)
+
+    def _set(self, state: int) -> None:
+        if state != self.state:
+            log.warning("ES breaker %s: %s -> %s", self.name, _STATE_NAMES[self.state], _STATE_NAMES[state])
+            inc("rag_es_breaker_transitions_total", help="ES circuit breaker state changes",
+                leg=self.name, to=_STATE_NAMES[state])
+        self.state = state
+        BREAKER_STATE.set(state, leg=self.name)
+
+    def allow(self) -> Optional[object]:
+        """
+        May a request go out now? None if not, else a token to pass back to record(). In
+        half-open state only one probe at a time is let through.
+        """
+        with self._lock:
+            if self.state == CLOSED:
+                return _ADMITTED
+            if self.state == OPEN and time.monotonic() - self._opened_at >= self.cooldown:
+                self._set(HALF_OPEN)
+            if self.state == HALF_OPEN and self._probe is None:
+                self._probe = object()
+                return self._probe
+            return None
+
+    def record(self, ok: bool, token: Optional[object] = _ADMITTED) -> None:
+        now = time.monotonic()
+        with self._lock:
+            if self.state == HALF_OPEN:
+                if token is not self._probe:
+                    return  # admitted before the breaker opened; only the probe decides
+                self._probe = None
+                if ok:
+                    self._outcomes.clear()
+                    self._set(CLOSED)
+                else:
+                    self._opened_at = now
+                    self._set(OPEN)
+                return
+            self._outcomes.append((now, ok))
+            while self._outcomes and now - self._outcomes[0][0] > self.window:
+                self._outcomes.popleft()
+            n = len(self._outcomes)
+            failed = sum(1 for _, good in self._outcomes if not good)
+            if self.state == CLOSED and n >= self.min_requests and failed >= self.error_rate * n:
+                self._opened_at = now
+                self._set(OPEN)
+
+
+_STATE_NAMES = {CLOSED: "closed", HALF_OPEN: "half_open", OPEN: "open"}
+
+
+class HedgedSearch:
+    """Runs `search_fn(preference)` with a hedge after the leg's p95 and a breaker around it."""
+
+    def __init__(self, pool_size: int = HEDGE_POOL, hedge: bool = HEDGE_ENABLED,
+                 breaker_opts: Optional[Dict[str, Any]] = None):
+        self.hedge = hedge
+        self.breaker_opts = breaker_opts or {}
+        self._pool = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="es-hedge")
+        self._pool_size = pool_size
+        self._busy = 0
+        self._latency: Dict[str, LatencyWindow] = {}
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._recent: Deque[bool] = deque(maxlen=200)  # was each recent request hedged?
+        self._lock = threading.Lock()
+
+    def breaker(self, leg: str) -> CircuitBreaker:
+        with self._lock:
+            b = self._breakers.get(leg)
+            if b is None:
+                b = self._breakers[leg] = CircuitBreaker(leg, **self.breaker_opts)
+            return b
+
+    def delay(self, leg: str) -> float:
+        with self._lock:
+            w = self._latency.setdefault(leg, LatencyWindow())
+        p95 = w.quantile(0.95)
+        return HEDGE_DEFAULT if p95 is None else min(HEDGE_MAX, max(HEDGE_MIN, p95))
+
+    def _may_hedge(self) -> bool:
+        with self._lock:
+            # one hedge of slack, so the first slow requests after start-up can be hedged too
+            return self._busy < self._pool_size and sum(self._recent) < HEDGE_BUDGET * len(self._recent) + 1
+
+    def _submit(self, leg: str, attempt: str, fn: Callable[[Optional[str]], Any], preference: Optional[str]) -> Future:
+        def run():
+            t0 = time.perf_counter()
+            try:
+                return fn(preference)
+            finally:
+                dt = time.perf_counter() - t0
+                ATTEMPT_SECONDS.observe(dt, leg=leg, attempt=attempt)
+                with self._lock:
+                    self._busy -= 1
+                    w = self._latency.setdefault(leg, LatencyWindow())
+                w.add(dt)
+
+        with self._lock:
+            self._busy += 1
+        return self._pool.submit(run)
+
+    def __call__(self, leg: str, fn: Callable[[Optional[str]], Any], timeout: Optional[float] = None) -> Any:
+        """fn(preference) -> response, within `timeout` (ES_SEARCH_TIMEOUT_SECONDS) overall."""
+        timeout = SEARCH_TIMEOUT if timeout is None else timeout
+        breaker = self.breaker(leg)
+        token = breaker.allow()
+        if token is None:
+            inc("rag_es_breaker_rejections_total", help="ES searches failed fast by an open breaker", leg=leg)
+            raise CircuitOpen(f"ES breaker for {leg} is open")
+        try:
+            result = self._run(leg, fn, timeout)
+        except Exception as e:
+            breaker.record(not is_cluster_error(e), token)
+            raise
+        breaker.record(True, token)
+        return result
+
+    def _run(self, leg: str, fn: Callable[[Optional[str]], Any], timeout: float) -> Any:
+        if not self.hedge or profiling.active():
+            t0 = time.perf_counter()
+            try:
+                return fn(None)
+            finally:
+                ATTEMPT_SECONDS.observe(time.perf_counter() - t0, leg=leg, attempt="primary")
+        deadline = time.monotonic() + timeout
+        primary = self._submit(leg, "primary", fn, None)
+        hedged = False
+        done, _ = wait([primary], timeout=self.delay(leg))
+        if not done:
+            if self._may_hedge():
+                hedged = True
+            else:
+                inc("rag_es_hedges_total", help="Hedged ES searches", leg=leg, result="skipped")
+        with self._lock:
+            self._recent.append(hedged)
+        if not hedged:
+            return primary.result(timeout=max(0.0, deadline - time.monotonic()))
+
+        hedge = self._submit(leg, "hedge", fn, f"hedge-{uuid.uuid4().hex[:8]}")
+        pending = {primary, hedge}
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = wait(pending, timeout=max(0.0, deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for fut in done:
+                if fut.exception() is None:
+                    inc("rag_es_hedges_total", help="Hedged ES searches", leg=leg,
+                        result="won" if fut is hedge else "lost")
+                    return fut.result()
+                error = fut.exception()
+        if error is not None:
+            raise error
+        raise TimeoutError(f"ES {leg} search: no response within {timeout:.0f}s")
+
+    def states(self) -> Dict[str, str]:
+        with self._lock:
+            return {leg: _STATE_NAMES[b.state] for leg, b in self._breakers.items()}
+
+
+_executor: Optional[HedgedSearch] = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> HedgedSearch:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = HedgedSearch()
+        return _executor
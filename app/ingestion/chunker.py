@@ -1,12 +1,97 @@
 # app/ingestion/chunker.py
-from typing import List, Tuple
-from app.ingestion.models import PageText, Chunk
+import re
+from typing import List, NamedTuple, Optional, Tuple
+import numpy as np
+
+from app.ingestion.models import PageText, Chunk, ChunkBatch
+from app.ingestion.tokenizer import token_budget, token_lengths, token_offsets
 from app.utils.settings import settings
 
 def _tokenize(text: str) -> List[str]:
     # Lightweight tokenization; good enough for chunk sizing.
     return text.split()
 
+def _resolve_sizes(chunk_size: int | None, overlap: int | None) -> Tuple[int, int]:
+    chunk_size = chunk_size or settings.chunk_size_tokens
+    overlap = overlap or settings.chunk_overlap_tokens
+    assert chunk_size > 0 and overlap >= 0 and overlap < chunk_size
+    return chunk_size, overlap
+
+def _space_positions(doc: str) -> np.ndarray:
+    """Character offsets of every ' ' in doc, without creating a Python object per match."""
+    if doc.isascii():
+        buf = np.frombuffer(doc.encode("ascii"), dtype=np.uint8)
+    else:
+        buf = np.frombuffer(doc.encode("utf-32-le"), dtype=np.uint32)
+    return np.flatnonzero(buf == 32)
+
+class _Doc(NamedTuple):
+    """Whitespace-normalised pages joined by single spaces, plus word/page boundary indexes."""
+    text: str
+    tok_start: np.ndarray       # word i spans text[tok_start[i]:tok_end[i]]
+    tok_end: np.ndarray
+    page_first_tok: np.ndarray  # first word index of each (non-empty) page
+    page_nums: List[int]
+    page_char_start: List[int]  # offset of each page inside text
+
+def _build_doc(pages: List[PageText]) -> Optional[_Doc]:
+    # One normalised string per non-empty page (a no-op for pdf_extractor output)
+    texts: List[str] = []
+    page_nums: List[int] = []
+    tok_counts: List[int] = []
+    for p in pages:
+        t = " ".join(p.text.split())
+        if t:
+            texts.append(t)
+            page_nums.append(p.page_number)
+            tok_counts.append(t.count(" ") + 1)
+    if not texts:
+        return None
+
+    doc = " ".join(texts)
+    spaces = _space_positions(doc)
+    page_char_start, pos = [], 0
+    for t in texts:
+        page_char_start.append(pos)
+        pos += len(t) + 1
+    return _Doc(
+        text=doc,
+        tok_start=np.concatenate(([0], spaces + 1)),
+        tok_end=np.concatenate((spaces, [len(doc)])),
+        page_first_tok=np.concatenate(([0], np.cumsum(tok_counts)[:-1])),
+        page_nums=page_nums,
+        page_char_start=page_char_start,
+    )
+
+def _windows_to_batch(
+    d: _Doc, w_start: np.ndarray, w_end: np.ndarray, file_id: str, filename: str, drive_url: str
+) -> ChunkBatch:
+    """Turn [w_start, w_end) word windows into a ChunkBatch: one string slice each, vectorised page lookup."""
+    c_start = d.tok_start[w_start]
+    c_end = d.tok_end[w_end - 1]
+    p_first = np.searchsorted(d.page_first_tok, w_start, side="right") - 1
+    p_last = np.searchsorted(d.page_first_tok, w_end - 1, side="right") - 1
+
+    page_arr = np.asarray(d.page_nums)
+    if bool(np.all(np.diff(page_arr) >= 0)):
+        page_start, page_end = page_arr[p_first], page_arr[p_last]
+    else:
+        spans = [page_arr[pa:pb + 1] for pa, pb in zip(p_first.tolist(), p_last.tolist())]
+        page_start = [int(s.min()) for s in spans]
+        page_end = [int(s.max()) for s in spans]
+    text = d.text
+    return ChunkBatch(
+        file_id=file_id,
+        filename=filename,
+        drive_url=drive_url,
+        texts=[text[a:b] for a, b in zip(c_start.tolist(), c_end.tolist())],
+        page_start=page_start,
+        page_end=page_end,
+    )
+
+def _empty_batch(file_id: str, filename: str, drive_url: str) -> ChunkBatch:
+    return ChunkBatch(file_id=file_id, filename=filename, drive_url=drive_url, texts=[], page_start=[], page_end=[])
+
 def chunk_pages(
     pages: List[PageText],
     chunk_size: int | None = None,
@@ -14,14 +99,201 @@ def chunk_pages(
     file_id: str = "",
     filename: str = "",
     drive_url: str = "",
+    mode: str | None = None,
 ) -> List[Chunk]:
+    """chunk_pages_batch() as Pydantic Chunk models (for API responses and one-off callers)."""
+    return chunk_pages_batch(pages, chunk_size, overlap, file_id, filename, drive_url, mode).to_chunks()
+
+def chunk_pages_batch(
+    pages: List[PageText],
+    chunk_size: int | None = None,
+    overlap: int | None = None,
+    file_id: str = "",
+    filename: str = "",
+    drive_url: str = "",
+    mode: str | None = None,
+) -> ChunkBatch:
     """
     Greedy chunking across page boundaries.
     Keeps track of page_start/page_end for each chunk.
+
+    mode (default settings.chunk_mode):
+      - "words":     chunk_size/overlap count whitespace words (the original behaviour)
+      - "tokens":    windows sized in embedding-model tokens, never above the model limit
+      - "structure": packs PDF blocks (paragraphs), then sentences, up to the model limit
+
+    Works on character offsets: pages are whitespace-normalised and joined into one string,
+    token boundaries live in numpy arrays and each chunk is a single slice of that string.
+    In "words" mode output is identical to chunk_pages_reference().
+    Returns one ChunkBatch for the document (file metadata stored once).
     """
-    chunk_size = chunk_size or settings.chunk_size_tokens
-    overlap = overlap or settings.chunk_overlap_tokens
-    assert chunk_size > 0 and overlap >= 0 and overlap < chunk_size
+    mode = (mode or settings.chunk_mode).lower()
+    if mode == "tokens":
+        return chunk_pages_by_model_tokens(pages, chunk_size, overlap, file_id, filename, drive_url)
+    if mode == "structure":
+        return chunk_pages_by_structure(pages, chunk_size, overlap, file_id, filename, drive_url)
+    if mode != "words":
+        raise ValueError(f"unknown chunk mode {mode!r} (words | tokens | structure)")
+
+    chunk_size, overlap = _resolve_sizes(chunk_size, overlap)
+    d = _build_doc(pages)
+    if d is None:
+        return _empty_batch(file_id, filename, drive_url)
+
+    n = len(d.tok_start)
+    step = chunk_size - overlap
+    n_windows = 1 if n <= chunk_size else 1 + -(-(n - chunk_size) // step)
+    w_start = np.arange(n_windows) * step
+    w_end = np.minimum(w_start + chunk_size, n)
+    return _windows_to_batch(d, w_start, w_end, file_id, filename, drive_url)
+
+def _model_sizes(chunk_size: int | None, overlap: int | None) -> Tuple[int, int]:
+    """Window/overlap in model tokens: chunk_size is capped at the model budget."""
+    chunk_size, overlap = _resolve_sizes(chunk_size, overlap)
+    size = min(chunk_size, token_budget())
+    return size, min(overlap, size // 2)
+
+def chunk_pages_by_model_tokens(
+    pages: List[PageText],
+    chunk_size: int | None = None,
+    overlap: int | None = None,
+    file_id: str = "",
+    filename: str = "",
+    drive_url: str = "",
+) -> ChunkBatch:
+    """
+    Word-aligned windows whose embedding-model token count stays within the model limit.
+    Pages are tokenized in one batched call; each model token is attributed to the word it
+    starts in, giving a per-word cost and a prefix sum that windows are cut from.
+    """
+    size, overlap = _model_sizes(chunk_size, overlap)
+    d = _build_doc(pages)
+    if d is None:
+        return _empty_batch(file_id, filename, drive_url)
+
+    page_texts = [d.text[a:a + n] for a, n in zip(d.page_char_start, _page_lengths(d))]
+    starts = [
+        np.asarray(offs, dtype=np.int64).reshape(-1, 2)[:, 0] + base
+        for offs, base in zip(token_offsets(page_texts), d.page_char_start)
+    ]
+    tok_char_start = np.concatenate(starts) if starts else np.zeros(0, dtype=np.int64)
+
+    n = len(d.tok_start)
+    word_of_tok = np.searchsorted(d.tok_start, tok_char_start, side="right") - 1
+    cost = np.bincount(word_of_tok, minlength=n)
+    prefix = np.concatenate(([0], np.cumsum(cost)))  # prefix[i] = model tokens in words [0, i)
+
+    w_start, w_end = [], []
+    s = 0
+    while True:
+        # furthest e with prefix[e] - prefix[s] <= size (at least one word, even if oversized)
+        e = max(s + 1, int(np.searchsorted(prefix, prefix[s] + size, side="right")) - 1)
+        e = min(e, n)
+        w_start.append(s)
+        w_end.append(e)
+        if e >= n:
+            break
+        # earliest s' whose tail [s', e) is within the overlap budget
+        s = max(s + 1, int(np.searchsorted(prefix, prefix[e] - overlap, side="left")))
+    return _windows_to_batch(d, np.asarray(w_start), np.asarray(w_end), file_id, filename, drive_url)
+
+def _page_lengths(d: _Doc) -> List[int]:
+    ends = d.page_char_start[1:] + [len(d.text) + 1]
+    return [e - s - 1 for s, e in zip(d.page_char_start, ends)]
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+(?=[\"'(\[A-Z0-9])")
+
+def _structure_units(pages: List[PageText], budget: int) -> List[Tuple[str, int, int]]:
+    """
+    (text, page_number, model_tokens) units: PDF blocks, with over-budget blocks split into
+    sentences and over-budget sentences split into word runs. Lengths come from batched calls.
+    """
+    blocks: List[Tuple[str, int]] = []
+    for p in pages:
+        for b in (p.blocks if p.blocks is not None else [p.text]):
+            b = " ".join(b.split())
+            if b:
+                blocks.append((b, p.page_number))
+
+    units: List[Tuple[str, int, int]] = []
+    lengths = token_lengths([b for b, _ in blocks])
+    for (text, page), n in zip(blocks, lengths):
+        if n <= budget:
+            units.append((text, page, n))
+            continue
+        sents = [s for s in _SENTENCE_END.split(text) if s]
+        for sent, m in zip(sents, token_lengths(sents)):
+            if m <= budget:
+                units.append((sent, page, m))
+                continue
+            words = sent.split(" ")
+            run, run_len = [], 0
+            for w, k in zip(words, token_lengths(words)):
+                if run and run_len + k > budget:
+                    units.append((" ".join(run), page, run_len))
+                    run, run_len = [], 0
+                run.append(w)
+                run_len += k
+            if run:
+                units.append((" ".join(run), page, run_len))
+    return units
+
+def chunk_pages_by_structure(
+    pages: List[PageText],
+    chunk_size: int | None = None,
+    overlap: int | None = None,
+    file_id: str = "",
+    filename: str = "",
+    drive_url: str = "",
+) -> ChunkBatch:
+    """
+    Packs paragraph/sentence units greedily up to the model token budget, so chunks break on
+    block or sentence boundaries. Overlap repeats trailing units (up to `overlap` tokens).
+    Uses PageText.blocks when present (extract_pages_from_pdf_bytes(with_blocks=True)).
+    """
+    size, overlap = _model_sizes(chunk_size, overlap)
+    units = _structure_units(pages, size)
+
+    texts: List[str] = []
+    page_start: List[int] = []
+    page_end: List[int] = []
+    i, n = 0, len(units)
+    while i < n:
+        j, total = i, 0
+        while j < n and (j == i or total + units[j][2] <= size):
+            total += units[j][2]
+            j += 1
+        window = units[i:j]
+        unit_pages = [pg for _, pg, _ in window]
+        texts.append(" ".join(t for t, _, _ in window))
+        page_start.append(min(unit_pages))
+        page_end.append(max(unit_pages))
+        if j >= n:
+            break
+        # step back over trailing units that fit in the overlap, but always move forward
+        k, carried = j, 0
+        while k - 1 > i and carried + units[k - 1][2] <= overlap:
+            k -= 1
+            carried += units[k][2]
+        i = k
+    return ChunkBatch(
+        file_id=file_id, filename=filename, drive_url=drive_url,
+        texts=texts, page_start=page_start, page_end=page_end,
+    )
+
+def chunk_pages_reference(
+    pages: List[PageText],
+    chunk_size: int | None = None,
+    overlap: int | None = None,
+    file_id: str = "",
+    filename: str = "",
+    drive_url: str = "",
+) -> List[Chunk]:
+    """
+    Reference implementation (one (token, page) tuple per word, " ".join per window).
+    Kept for equivalence checks and scripts/bench_chunker.py.
+    """
+    chunk_size, overlap = _resolve_sizes(chunk_size, overlap)
 
     # Flatten tokens while remembering their originating page
     tokens_with_pages: List[Tuple[str, int]] = []
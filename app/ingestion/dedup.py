@@ -0,0 +1,190 @@
+# app/ingestion/dedup.py
+"""
+Near-duplicate chunk detection with MinHash + LSH banding.
+
+Each chunk becomes a 64-value MinHash signature over word 3-gram shingles; signatures are split
+into 8 bands of 8 rows and bucketed, so only chunks sharing a band are compared. A candidate is
+a duplicate when its estimated Jaccard similarity is >= threshold (default 0.85).
+
+The index (signatures + chunk ids + file ids) is persisted as a compressed .npz so incremental
+runs dedup against everything ingested before. A chunk is never deduped against chunks of its own
+file, and remove() drops a file's signatures when it is changed or deleted, so a re-ingested file
+doesn't match its previous version.
+
+The index also remembers which files had chunks dropped or linked as duplicates of another file's
+chunks (dependents). When that other file changes or is deleted, its chunks go, and the
+dependents have to be re-ingested: in drop mode their copy of the content was never indexed, and
+in link mode their duplicate_of ids would point at deleted chunks.
+"""
+import json
+import re
+import zlib
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from app.ingestion.models import ChunkBatch
+from app.utils.settings import settings
+
+NUM_PERM = 64
+BANDS = 8
+ROWS = NUM_PERM // BANDS
+SHINGLE = 3
+
+_PRIME = np.uint64(4294967291)  # largest prime < 2**32, keeps signatures in uint32
+_rng = np.random.RandomState(1_234_567)  # fixed: signatures must be stable across runs
+_A = _rng.randint(1, 2**31 - 1, size=(NUM_PERM, 1)).astype(np.uint64)
+_B = _rng.randint(0, 2**31 - 1, size=(NUM_PERM, 1)).astype(np.uint64)
+_WORD = re.compile(r"\w+")
+
+
+def minhash(text: str) -> np.ndarray:
+    """64 x uint32 MinHash signature of the text's word 3-gram shingles."""
+    words = _WORD.findall(text.lower())
+    if not words:
+        return np.full(NUM_PERM, np.iinfo(np.uint32).max, dtype=np.uint32)
+    h = np.fromiter((zlib.crc32(w.encode("utf-8")) for w in words), dtype=np.uint64, count=len(words))
+    if len(h) >= SHINGLE:
+        # combine consecutive word hashes into shingle hashes (mod 2**32, stays exact in uint64)
+        mask = np.uint64(0xFFFFFFFF)
+        sh = h[:-2] * np.uint64(0x01000193)
+        sh = ((sh & mask) ^ h[1:-1]) * np.uint64(0x01000193)
+        sh = (sh & mask) ^ h[2:]
+    else:
+        sh = h
+    sh = np.unique(sh)
+    return ((_A * sh[None, :] + _B) % _PRIME).min(axis=1).astype(np.uint32)
+
+
+def index_path(collection: Optional[str] = None) -> str:
+    """Per-collection index file, so tenants are never deduped (or linked) against each other."""
+    base = Path(settings.dedup_index_path)
+    if not collection:
+        return str(base)
+    safe = re.sub(r"[^A-Za-z0-9_.-]+", "_", collection)
+    return str(base.with_name(f"{base.stem}.{safe}{base.suffix}"))
+
+
+class DedupIndex:
+    """In-memory LSH index over MinHash signatures, persisted to an .npz file."""
+
+    def __init__(self, path: Optional[str] = None, threshold: Optional[float] = None):
+        self.path = Path(path or settings.dedup_index_path)
+        self.threshold = threshold if threshold is not None else settings.dedup_threshold
+        self.ids: List[str] = []
+        self.file_ids: List[str] = []
+        self._sigs: List[np.ndarray] = []
+        self._buckets: Dict[Tuple[int, bytes], List[int]] = {}
+        self._dependents: Dict[str, Set[str]] = {}  # file_id -> files with duplicates of its chunks
+
+    @classmethod
+    def load(cls, path: Optional[str] = None, threshold: Optional[float] = None) -> "DedupIndex":
+        idx = cls(path, threshold)
+        if idx.path.exists():
+            with np.load(idx.path) as data:
+                sigs = data["signatures"]
+                ids = json.loads(bytes(data["ids"]).decode("utf-8"))
+                # indexes written before file ids were stored: "" never equals a real file id
+                file_ids = json.loads(bytes(data["file_ids"]).decode("utf-8")) if "file_ids" in data else [""] * len(ids)
+                dependents = json.loads(bytes(data["dependents"]).decode("utf-8")) if "dependents" in data else {}
+            for cid, fid, sig in zip(ids, file_ids, sigs):
+                idx._add(cid, sig, fid)
+            idx._dependents = {fid: set(deps) for fid, deps in dependents.items()}
+        return idx
+
+    def save(self) -> str:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        sigs = np.stack(self._sigs) if self._sigs else np.zeros((0, NUM_PERM), dtype=np.uint32)
+        ids = np.frombuffer(json.dumps(self.ids).encode("utf-8"), dtype=np.uint8)
+        file_ids = np.frombuffer(json.dumps(self.file_ids).encode("utf-8"), dtype=np.uint8)
+        dependents = {fid: sorted(deps) for fid, deps in self._dependents.items()}
+        dependents = np.frombuffer(json.dumps(dependents).encode("utf-8"), dtype=np.uint8)
+        with open(self.path, "wb") as f:
+            np.savez_compressed(f, signatures=sigs, ids=ids, file_ids=file_ids, dependents=dependents)
+        return str(self.path.resolve())
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _add(self, chunk_id: str, sig: np.ndarray, file_id: str = "") -> None:
+        pos = len(self.ids)
+        self.ids.append(chunk_id)
+        self.file_ids.append(file_id)
+        self._sigs.append(sig)
+        for b in range(BANDS):
+            self._buckets.setdefault((b, sig[b * ROWS:(b + 1) * ROWS].tobytes()), []).append(pos)
+
+    def remove(self, file_ids: Iterable[str]) -> int:
+        """Drop the signatures of these files (changed or deleted); returns how many were removed."""
+        drop = set(file_ids)
+        self._dependents = {fid: deps - drop for fid, deps in self._dependents.items() if fid not in drop}
+        keep = [i for i, fid in enumerate(self.file_ids) if fid not in drop]
+        removed = len(self.ids) - len(keep)
+        if removed:
+            entries = [(self.ids[i], self._sigs[i], self.file_ids[i]) for i in keep]
+            self.ids, self.file_ids, self._sigs, self._buckets = [], [], [], {}
+            for cid, sig, fid in entries:
+                self._add(cid, sig, fid)
+        return removed
+
+    def dependents(self, file_ids: Iterable[str]) -> Set[str]:
+        """
+        Files that had chunks deduped against these files' chunks, and transitively against those
+        files' chunks. They lose their canonical copies when these files are removed.
+        """
+        todo = list(file_ids)
+        seen, out = set(todo), set()
+        while todo:
+            for dep in self._dependents.get(todo.pop(), ()):
+                if dep not in seen:
+                    seen.add(dep)
+                    out.add(dep)
+                    todo.append(dep)
+        return out
+
+    def find(self, sig: np.ndarray, file_id: Optional[str] = None) -> Optional[str]:
+        """chunk_id of an indexed near-duplicate of `sig` from another file than `file_id`, or None."""
+        pos = self._find(sig, file_id)
+        return None if pos is None else self.ids[pos]
+
+    def _find(self, sig: np.ndarray, file_id: Optional[str]) -> Optional[int]:
+        seen = set()
+        for b in range(BANDS):
+            for pos in self._buckets.get((b, sig[b * ROWS:(b + 1) * ROWS].tobytes()), ()):
+                if pos in seen:
+                    continue
+                seen.add(pos)
+                if file_id is not None and self.file_ids[pos] == file_id:
+                    continue
+                if float(np.mean(self._sigs[pos] == sig)) >= self.threshold:
+                    return pos
+        return None
+
+    def check_and_add(self, chunk_id: str, text: str, file_id: str = "") -> Optional[str]:
+        """Return the canonical chunk_id if `text` is a near-duplicate, else index it and return None."""
+        sig = minhash(text)
+        pos = self._find(sig, file_id)
+        if pos is None:
+            self._add(chunk_id, sig, file_id)
+            return None
+        self._dependents.setdefault(self.file_ids[pos], set()).add(file_id)
+        return self.ids[pos]
+
+
+def dedup_chunks(batch: ChunkBatch, index: DedupIndex, mode: Optional[str] = None) -> Tuple[ChunkBatch, int]:
+    """
+    mode "drop": near-duplicates are removed.
+    mode "link": near-duplicates are kept with duplicate_of=<canonical chunk_id>; index_chunks
+                 stores them as metadata-only docs (no text/vector), so they never fill top-k.
+    Returns (batch of chunks to keep, number of duplicates found).
+    """
+    mode = (mode or settings.dedup_mode).lower()
+    canonical = [index.check_and_add(cid, text, batch.file_id) for cid, text in zip(batch.chunk_ids, batch.texts)]
+    dups = sum(1 for c in canonical if c is not None)
+    if not dups:
+        return batch, 0
+    if mode == "link":
+        batch.duplicate_of = canonical
+        return batch, dups
+    return batch.take([i for i, c in enumerate(canonical) if c is None]), dups
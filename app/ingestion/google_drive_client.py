@@ -15,6 +15,8 @@ class DriveClient:
         self.folder_id = folder_id or settings.gdrive_folder_id
         if not self.folder_id:
             raise ValueError("GDRIVE_FOLDER_ID is not set (env or argument).")
+        if not settings.gdrive_sa_json_path:
+            raise ValueError("GDRIVE_SERVICE_ACCOUNT_JSON_PATH is not set.")
 
         creds = service_account.Credentials.from_service_account_file(
             settings.gdrive_sa_json_path, scopes=SCOPES
@@ -9,48 +9,107 @@ from tqdm import tqdm
 from elasticsearch import helpers
 
 from app.ingestion.google_drive_client import DriveClient
-from app.ingestion.pdf_extractor import extract_pages_from_pdf_bytes
-from app.ingestion.chunker import chunk_pages
-from app.ingestion.models import Chunk
+from app.ingestion.pdf_extractor import extract_pages_from_pdf_bytes, PdfSkipped
+from app.ingestion.chunker import chunk_pages_batch
+from app.ingestion.dedup import DedupIndex, dedup_chunks, index_path
+from app.ingestion.tokenizer import chunk_token_lengths, summarize_token_lengths
+from app.ingestion.models import ChunkBatch, DriveFile
+from app.ingestion.sources import PdfSource
 from app.storage.elastic_client import make_es
+from app.storage.collections import default_index, index_for
+from app.storage.index_mapping import rag_index_mapping
 from app.retrieval.dense import embed_texts
+from app.retrieval.expansion import ExpansionError, expand_texts, ingest_mode
+from app.utils.logging import get_logger
 from app.utils.settings import settings
+from app.utils.metrics import span, inc
+
+log = get_logger(__name__)
 
 
 def run_ingestion(
     folder_id: Optional[str] = None,
     limit_files: Optional[int] = None,
-) -> tuple[Dict[str, Any], List[Chunk]]:
+    dedup: Optional[DedupIndex] = None,
+    source: Optional[PdfSource] = None,
+    files: Optional[List[DriveFile]] = None,
+    collection: Optional[str] = None,
+) -> tuple[Dict[str, Any], List[ChunkBatch]]:
     """
-    Drive folder -> download PDFs -> extract page text -> chunk (~300 tokens, overlap).
-    Returns a (report, chunks) tuple. Does NOT index to Elasticsearch.
+    Drive folder -> download PDFs -> extract page text -> chunk (~300 tokens, overlap) -> dedup.
+    Returns a (report, batches) tuple, one ChunkBatch per file. Does NOT index to Elasticsearch.
+
+    `source` defaults to DriveClient(folder_id); pass a LocalDirClient to ingest a directory.
+    `files` restricts the run to those entries (incremental / watch mode) instead of listing.
+    Every chunk is tagged with `collection` (default: the Drive folder id / local directory name).
+
+    With DEDUP_MODE != "off", near-duplicate chunks are dropped/linked against `dedup`
+    (default: the persisted index, loaded read-only; the caller saves it after indexing).
     """
-    dc = DriveClient(folder_id)
-    files = dc.list_pdfs(page_size=100)
+    dc = source or DriveClient(folder_id)
+    collection = collection or default_collection(dc)
+    dedup_on = settings.dedup_mode.lower() != "off"
+    if dedup_on and dedup is None:
+        dedup = DedupIndex.load(index_path(collection))
+    if files is None:
+        files = dc.list_pdfs(page_size=100)
     if limit_files:
         files = files[:limit_files]
 
-    out_chunks: List[Chunk] = []
+    batches: List[ChunkBatch] = []
+    chunks_total = 0
     file_summaries: List[Dict[str, Any]] = []
+    with_blocks = settings.chunk_mode == "structure"
+    all_lengths: Optional[List[int]] = []
+    chunks_before_dedup = 0
+    duplicates = 0
 
     for f in tqdm(files, desc="Ingesting PDFs", unit="file"):
         try:
-            pdf_bytes = dc.download_pdf_bytes(f.file_id)
-            pages = extract_pages_from_pdf_bytes(pdf_bytes)
-            chunks = chunk_pages(
-                pages,
-                file_id=f.file_id,
-                filename=f.filename,
-                drive_url=f.drive_url,
-            )
-            out_chunks.extend(chunks)
+            with span("download"):
+                pdf_bytes = dc.download_pdf_bytes(f.file_id)
+            with span("extract"):
+                pages = extract_pages_from_pdf_bytes(pdf_bytes, with_blocks=with_blocks)
+            with span("chunk"):
+                batch = chunk_pages_batch(
+                    pages,
+                    file_id=f.file_id,
+                    filename=f.filename,
+                    drive_url=f.drive_url,
+                )
+            batch.collection = collection
+            chunks_before_dedup += len(batch)
+            file_dups = 0
+            if dedup_on:
+                with span("dedup"):
+                    batch, file_dups = dedup_chunks(batch, dedup)
+                duplicates += file_dups
+            if len(batch):
+                batches.append(batch)
+            chunks_total += len(batch)
+            lengths = chunk_token_lengths(batch.texts)
+            if lengths is None:
+                all_lengths = None  # stats off (words mode) or no tokenizer: skip token stats entirely
+            elif all_lengths is not None:
+                all_lengths.extend(lengths)
             file_summaries.append(
                 {
                     "file_id": f.file_id,
                     "filename": f.filename,
                     "drive_url": f.drive_url,
                     "pages": len(pages),
-                    "chunks": len(chunks),
+                    "chunks": len(batch),
+                    "duplicates": file_dups,
+                    "truncated": summarize_token_lengths(lengths)["truncated"] if lengths is not None else None,
+                }
+            )
+        except PdfSkipped as e:
+            file_summaries.append(
+                {
+                    "file_id": f.file_id,
+                    "filename": f.filename,
+                    "drive_url": f.drive_url,
+                    "skipped": str(e),
                 }
             )
         except Exception as e:
@@ -65,12 +124,34 @@ def run_ingestion(
 
     report = {
         "ingested_at": datetime.now(timezone.utc).isoformat(),
-        "folder_id": folder_id or settings.gdrive_folder_id,
+        "folder_id": folder_id or getattr(dc, "folder_id", None) or str(getattr(dc, "root", "")),
+        "collection": collection,
+        "index": index_for(collection),
         "files_seen": len(files),
-        "chunks_total": len(out_chunks),
+        "files_skipped": sum(1 for s in file_summaries if "skipped" in s),
+        "chunks_total": chunks_total,
+        "chunk_mode": settings.chunk_mode,
+        # token_limit / max_tokens / mean_tokens / truncated (chunks the embedder would cut off)
+        "chunk_tokens": summarize_token_lengths(all_lengths) if all_lengths is not None else None,
+        "dedup": {
+            "mode": settings.dedup_mode,
+            "chunks_checked": chunks_before_dedup,
+            "duplicates": duplicates,
+            "removed_pct": round(100.0 * duplicates / chunks_before_dedup, 2) if chunks_before_dedup else 0.0,
+            "index_size": len(dedup) if dedup is not None else 0,
+        } if dedup_on else None,
         "files": file_summaries,
     }
-    return report, out_chunks
+    return report, batches
+
+
+def default_collection(source) -> Optional[str]:
+    """Drive folder id for DriveClient, directory name for LocalDirClient."""
+    folder = getattr(source, "folder_id", None)
+    if folder:
+        return folder
+    root = getattr(source, "root", None)
+    return root.name if root is not None else None
 
 
 def write_report(report: Dict[str, Any], path: str = "./tmp/ingestion_report.json") -> str:
@@ -80,52 +161,105 @@ def write_report(report: Dict[str, Any], path: str = "./tmp/ingestion_report.jso
     return str(p.resolve())
 
 
-def index_chunks(chunks: List[Chunk]) -> Dict[str, Any]:
+def delete_file_chunks(file_ids: List[str], collection: Optional[str] = None) -> int:
+    """Remove every chunk of the given files (before re-indexing a changed file, or after a delete)."""
+    if not file_ids:
+        return 0
+    es = make_es()
+    query: Dict[str, Any] = {"terms": {"file_id": list(file_ids)}}
+    if collection:
+        query = {"bool": {"filter": [query, {"term": {"collection": collection}}]}}
+    with span("delete_by_query"):
+        resp = es.delete_by_query(
+            index=index_for(collection),
+            query=query,
+            conflicts="proceed",
+            refresh=True,
+        )
+    return int(resp.get("deleted", 0))
+
+
+def index_chunks(batches: List[ChunkBatch]) -> Dict[str, Any]:
     """
-    Bulk-index chunks into Elasticsearch using the ELSER ingest pipeline.
+    Bulk-index chunk batches into Elasticsearch using the ELSER ingest pipeline.
     Populates:
       - text (BM25)
       - vector (dense: MiniLM)
-      - ml.tokens (ELSER via ingest pipeline)
+      - ml.tokens (ELSER: the ingest pipeline by default; batched _infer calls with
+        ELSER_INGEST_MODE=client, falling back to the pipeline when the endpoint fails)
+    Bulk actions are generated lazily, one per chunk, straight from the batch columns.
+    Each batch goes to its collection's index (created with rag_index_mapping() if it's a new
+    dedicated index; the shared one comes from scripts/bootstrap_elastic.sh).
     """
-    if not chunks:
+    batches = [b for b in batches if len(b)]
+    if not batches:
         return {"indexed": 0}
 
     es = make_es()
-    index = os.getenv("ELASTIC_INDEX_NAME", "rag_documents_v1")
+    for index in {index_for(b.collection) for b in batches} - {default_index()}:
+        if not es.indices.exists(index=index):
+            es.indices.create(index=index, body=rag_index_mapping())
     pipeline = os.getenv("ELSER_PIPELINE_ID", "elser_v2_pipeline")
 
-    dense = embed_texts([c.text for c in chunks])  # batch embed
-
-    actions = []
-    for c, v in zip(chunks, dense):
-        doc = {
-            "text": c.text,
-            "vector": v,
-            "file_id": c.file_id,
-            "filename": c.filename,
-            "drive_url": c.drive_url,
-            "chunk_id": c.chunk_id,
-            "page_start": c.page_start,
-            "page_end": c.page_end,
-            "ingested_at": c.ingested_at,
-        }
-        actions.append(
-            {
-                "_op_type": "index",
-                "_index": index,
-              #  "pipeline": pipeline,
-                "_id": c.chunk_id,
-                "_source": doc,
-            }
-        )
+    # Linked near-duplicates are stored as metadata-only docs: no text, no vector, no embedding cost
+    unique = [
+        t for b in batches
+        for t, dup in zip(b.texts, b.duplicate_of or [None] * len(b))
+        if not dup
+    ]
+    with span("embed_batch"):
+        dense = iter(embed_texts(unique)) if unique else iter(())  # batch embed
+    elser = ingest_mode()
+    sparse = iter(())
+    if elser == "client":
+        try:
+            sparse = iter(expand_texts(unique))
+        except ExpansionError as e:
+            log.warning("%s; using the %s ingest pipeline for this batch", e, pipeline)
+            inc("rag_elser_ingest_fallbacks_total", help="Ingest batches expanded by the pipeline after _infer failed")
+            elser = "pipeline"
 
-    ok, resp = helpers.bulk(
-        es,
-        actions,
-        request_timeout=600,  # more generous for first run
-        chunk_size=50  # smaller batches avoid long single waits
-    )
+    def actions():
+        for b in batches:
+            index = index_for(b.collection)
+            dups = b.duplicate_of or [None] * len(b)
+            for cid, text, ps, pe, dup in zip(b.chunk_ids, b.texts, b.page_start.tolist(), b.page_end.tolist(), dups):
+                doc = {
+                    "file_id": b.file_id,
+                    "filename": b.filename,
+                    "drive_url": b.drive_url,
+                    "chunk_id": cid,
+                    "page_start": ps,
+                    "page_end": pe,
+                    "ingested_at": b.ingested_at,
+                }
+                if b.collection:
+                    doc["collection"] = b.collection
+                if dup:
+                    doc["duplicate_of"] = dup
+                else:
+                    doc["text"] = text
+                    doc["vector"] = next(dense)
+                    if elser == "client":
+                        doc["ml"] = {"tokens": next(sparse)}
+                action = {
+                    "_op_type": "index",
+                    "_index": index,
+                    "_id": cid,
+                    "_source": doc,
+                }
+                if elser == "pipeline" and not dup:
+                    action["pipeline"] = pipeline
+                yield action
+
+    with span("bulk_index"):
+        ok, resp = helpers.bulk(
+            es,
+            actions(),
+            request_timeout=600,  # more generous for first run
+            chunk_size=50  # smaller batches avoid long single waits
+        )
+    inc("rag_indexed_chunks_total", ok, help="Chunks written by bulk indexing")
     # helpers.bulk returns (success_count, details). On some versions resp isn't a dict; handle safely.
     took = resp.get("took") if isinstance(resp, dict) else None
     return {"indexed": ok, "took": took}
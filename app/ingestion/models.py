@@ -1,9 +1,12 @@
 # app/ingestion/models.py
+from dataclasses import dataclass, field
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import List, Optional, Sequence
 from datetime import datetime
 from uuid import uuid4
 
+import numpy as np
+
 class DriveFile(BaseModel):
     file_id: str
     filename: str
@@ -13,6 +16,7 @@ class DriveFile(BaseModel):
 class PageText(BaseModel):
     page_number: int  # 1-indexed
     text: str
+    blocks: Optional[List[str]] = None  # PyMuPDF text blocks (paragraph-ish), only for structure chunking
 
 class Chunk(BaseModel):
     chunk_id: str = Field(default_factory=lambda: str(uuid4()))
@@ -23,3 +27,93 @@ class Chunk(BaseModel):
     page_end: int
     ingested_at: str = Field(default_factory=lambda: datetime.utcnow().isoformat() + "Z")
     text: str
+    duplicate_of: Optional[str] = None  # canonical chunk_id when DEDUP_MODE=link flagged this as a near-duplicate
+    collection: Optional[str] = None    # tenant / document set (see app.storage.collections)
+
+def _utc_now() -> str:
+    return datetime.utcnow().isoformat() + "Z"
+
+@dataclass(slots=True)
+class ChunkBatch:
+    """
+    All chunks of one document, struct-of-arrays: file metadata and ingested_at are stored once,
+    per-chunk fields are parallel lists / int32 arrays. This is what the ingest pipeline passes
+    around; to_chunks() builds Pydantic Chunk models for API boundaries only.
+    """
+    file_id: str
+    filename: str
+    drive_url: str
+    texts: List[str]
+    page_start: np.ndarray  # int32, one per chunk
+    page_end: np.ndarray
+    chunk_ids: List[str] = field(default_factory=list)  # generated (uuid4) when left empty
+    duplicate_of: Optional[List[Optional[str]]] = None  # set by dedup in DEDUP_MODE=link
+    ingested_at: str = field(default_factory=_utc_now)
+    collection: Optional[str] = None
+
+    def __post_init__(self) -> None:
+        self.page_start = np.asarray(self.page_start, dtype=np.int32)
+        self.page_end = np.asarray(self.page_end, dtype=np.int32)
+        if not self.chunk_ids:
+            self.chunk_ids = [str(uuid4()) for _ in range(len(self.texts))]
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def take(self, idx: Sequence[int]) -> "ChunkBatch":
+        """Sub-batch with the chunks at positions `idx` (same file metadata and ingested_at)."""
+        idx = list(idx)
+        return ChunkBatch(
+            file_id=self.file_id,
+            filename=self.filename,
+            drive_url=self.drive_url,
+            texts=[self.texts[i] for i in idx],
+            page_start=self.page_start[idx],
+            page_end=self.page_end[idx],
+            chunk_ids=[self.chunk_ids[i] for i in idx],
+            duplicate_of=[self.duplicate_of[i] for i in idx] if self.duplicate_of is not None else None,
+            ingested_at=self.ingested_at,
+            collection=self.collection,
+        )
+
+    def to_chunks(self) -> List[Chunk]:
+        dups = self.duplicate_of or [None] * len(self.texts)
+        return [
+            Chunk(
+                chunk_id=cid,
+                file_id=self.file_id,
+                filename=self.filename,
+                drive_url=self.drive_url,
+                page_start=ps,
+                page_end=pe,
+                ingested_at=self.ingested_at,
+                text=text,
+                duplicate_of=dup,
+                collection=self.collection,
+            )
+            for cid, text, ps, pe, dup in zip(
+                self.chunk_ids, self.texts, self.page_start.tolist(), self.page_end.tolist(), dups
+            )
+        ]
+
+    @classmethod
+    def from_chunks(cls, chunks: List[Chunk]) -> "ChunkBatch":
+        """Inverse of to_chunks(); all chunks must come from the same file."""
+        if not chunks:
+            raise ValueError("from_chunks needs at least one chunk")
+        first = chunks[0]
+        if any(c.file_id != first.file_id or c.collection != first.collection for c in chunks):
+            raise ValueError("from_chunks: chunks span more than one file_id / collection")
+        dups = [c.duplicate_of for c in chunks]
+        return cls(
+            file_id=first.file_id,
+            filename=first.filename,
+            drive_url=first.drive_url,
+            texts=[c.text for c in chunks],
+            page_start=[c.page_start for c in chunks],
+            page_end=[c.page_end for c in chunks],
+            chunk_ids=[c.chunk_id for c in chunks],
+            duplicate_of=dups if any(dups) else None,
+            ingested_at=first.ingested_at,
+            collection=first.collection,
+        )
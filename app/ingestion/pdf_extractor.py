@@ -1,16 +1,169 @@
 # app/ingestion/pdf_extractor.py
-from typing import List
+import atexit
+import multiprocessing
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Optional, Tuple
 import fitz  # PyMuPDF
 
 from app.ingestion.models import PageText
+from app.utils.settings import settings
 
-def extract_pages_from_pdf_bytes(pdf_bytes: bytes) -> List[PageText]:
+# Opt-in (PDF_FAST_TEXT=1): no ligature/whitespace preservation, no images, no layout dict —
+# the cheapest extraction PyMuPDF offers. Ligatures stay as single glyphs ("ﬁ"), so the text
+# differs from the default flags. Never OCRs.
+FAST_TEXT_FLAGS = fitz.TEXT_MEDIABOX_CLIP
+
+class PdfSkipped(ValueError):
+    """Raised when a PDF exceeds the configured size/page caps; str(e) is the skip reason."""
+
+def _page_text(page, with_blocks: bool, fast: bool) -> Tuple[str, Optional[List[str]]]:
+    # "text" gives reading-order text; "blocks" can be used if you need structure later
+    txt = page.get_text("text", flags=FAST_TEXT_FLAGS) if fast else page.get_text("text")
+    # normalize whitespace a bit
+    cleaned = " ".join((txt or "").split())
+    blocks = None
+    if with_blocks:
+        # (x0, y0, x1, y1, text, block_no, block_type); type 0 = text, 1 = image
+        blocks = [
+            " ".join(b[4].split())
+            for b in page.get_text("blocks", sort=True)
+            if b[6] == 0 and b[4].strip()
+        ]
+    return cleaned, blocks
+
+# ---------- process-pool workers ----------
+# One pool for the life of the process. Workers start with forkserver (spawn where that's not
+# available), never fork: the ingest process already runs threads (tqdm, the ES hedging pool,
+# the watch-mode observer) whose locks a forked child could inherit held. A large document is
+# spilled to a temp file once; tasks carry its path and a page range, and each worker keeps the
+# document open between its ranges. The parent unlinks the temp file when it's done, but the disk
+# space is only freed once every worker has closed it, so a worker closes its document after
+# WORKER_IDLE_CLOSE seconds without a task (and at once when a task names another file).
+WORKER_IDLE_CLOSE = 0.5
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_size = 0
+_pool_lock = threading.Lock()
+_worker_doc: Optional[Tuple[str, "fitz.Document"]] = None
+_worker_lock = threading.Lock()
+_worker_timer: Optional[threading.Timer] = None
+
+def _mp_context():
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    """The shared extraction pool, grown (replaced) if more workers are asked for than it has."""
+    global _pool, _pool_size
+    with _pool_lock:
+        if _pool is None or _pool_size < workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=_mp_context())
+            _pool_size = workers
+        return _pool
+
+@atexit.register
+def shutdown_pool() -> None:
+    global _pool, _pool_size
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True, cancel_futures=True)
+        _pool, _pool_size = None, 0
+
+def _worker_close() -> None:
+    global _worker_doc
+    with _worker_lock:
+        if _worker_doc is not None:
+            _worker_doc[1].close()
+            _worker_doc = None
+
+def _worker_open(path: str):
+    global _worker_doc
+    if _worker_doc is not None and _worker_doc[0] != path:
+        _worker_doc[1].close()
+        _worker_doc = None
+    if _worker_doc is None:
+        _worker_doc = (path, fitz.open(path))
+    return _worker_doc[1]
+
+def _extract_range(args: Tuple[str, int, int, bool, bool]) -> List[Tuple[int, str, Optional[List[str]]]]:
+    global _worker_timer
+    path, start, end, with_blocks, fast = args
+    with _worker_lock:
+        if _worker_timer is not None:
+            _worker_timer.cancel()
+        doc = _worker_open(path)
+        out = []
+        for i in range(start, end):
+            text, blocks = _page_text(doc[i], with_blocks, fast)
+            out.append((i + 1, text, blocks))
+        _worker_timer = threading.Timer(WORKER_IDLE_CLOSE, _worker_close)
+        _worker_timer.daemon = True
+        _worker_timer.start()
+    return out
+
+def iter_pages_from_pdf_bytes(
+    pdf_bytes: bytes,
+    with_blocks: bool = False,
+    workers: Optional[int] = None,
+    max_pages: Optional[int] = None,
+    max_bytes: Optional[int] = None,
+    fast: Optional[bool] = None,
+) -> Iterator[PageText]:
+    """
+    Stream PageText objects in page order.
+
+    Documents with at least settings.pdf_parallel_min_pages pages are split into page ranges
+    (settings.pdf_pages_per_task) extracted across the shared process pool; smaller ones are read
+    inline. Raises PdfSkipped before any extraction if the file breaks the byte or page cap.
+    """
+    max_bytes = settings.pdf_max_bytes if max_bytes is None else max_bytes
+    max_pages = settings.pdf_max_pages if max_pages is None else max_pages
+    fast = settings.pdf_fast_text if fast is None else fast
+    workers = workers or settings.pdf_workers or os.cpu_count() or 1
+
+    if max_bytes and len(pdf_bytes) > max_bytes:
+        raise PdfSkipped(f"file too large: {len(pdf_bytes)} bytes > cap {max_bytes}")
+
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+        n = doc.page_count
+        if max_pages and n > max_pages:
+            raise PdfSkipped(f"too many pages: {n} > cap {max_pages}")
+
+        if workers <= 1 or n < settings.pdf_parallel_min_pages:
+            for i, page in enumerate(doc):
+                text, blocks = _page_text(page, with_blocks, fast)
+                yield PageText(page_number=i + 1, text=text, blocks=blocks)
+            return
+
+    with tempfile.NamedTemporaryFile(prefix="rag-pdf-", suffix=".pdf", delete=False) as f:
+        f.write(pdf_bytes)
+    try:
+        step = max(1, settings.pdf_pages_per_task)
+        ranges = [(f.name, s, min(s + step, n), with_blocks, fast) for s in range(0, n, step)]
+        pool = _get_pool(workers)
+        # map() yields in submission order, so pages come out in order as ranges finish
+        for batch in pool.map(_extract_range, ranges):
+            for page_number, text, blocks in batch:
+                yield PageText(page_number=page_number, text=text, blocks=blocks)
+    finally:
+        os.unlink(f.name)
+
+def extract_pages_from_pdf_bytes(pdf_bytes: bytes, with_blocks: bool = False) -> List[PageText]:
+    return list(iter_pages_from_pdf_bytes(pdf_bytes, with_blocks=with_blocks))
+
+def extract_pages_reference(pdf_bytes: bytes) -> List[PageText]:
+    """
+    Original serial extractor (default get_text flags, whole list in memory).
+    Kept as the baseline for scripts/bench_pdf_extract.py.
+    """
     pages: List[PageText] = []
     with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
         for i, page in enumerate(doc):
-            # "text" gives reading-order text; "blocks" can be used if you need structure later
             txt = page.get_text("text") or ""
-            # normalize whitespace a bit
             cleaned = " ".join(txt.split())
             pages.append(PageText(page_number=i + 1, text=cleaned))
     return pages
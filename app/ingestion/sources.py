@@ -0,0 +1,144 @@
+# app/ingestion/sources.py
+"""
+Where PDFs come from. run_ingestion() works with anything shaped like PdfSource:
+DriveClient (Google Drive) or LocalDirClient (a local / synced directory).
+"""
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Protocol, Tuple
+
+from app.ingestion.models import DriveFile
+from app.utils.logging import get_logger
+
+log = get_logger(__name__)
+
+class PdfSource(Protocol):
+    def list_pdfs(self, page_size: int = 100) -> List[DriveFile]: ...
+    def download_pdf_bytes(self, file_id: str) -> bytes: ...
+
+class LocalDirClient:
+    """
+    PDFs under a local directory. file_id is the path relative to the root, drive_url a file:// URI.
+    Files are read whole: they are often rewritten by a sync client mid-ingest, and a
+    memory map over a file that is truncated underneath it dies with SIGBUS.
+    """
+
+    def __init__(self, root: str, recursive: bool = True):
+        self.root = Path(root).expanduser().resolve()
+        if not self.root.is_dir():
+            raise ValueError(f"Local source directory not found: {self.root}")
+        self.recursive = recursive
+
+    def _paths(self) -> List[Path]:
+        pattern = "**/*" if self.recursive else "*"
+        return [p for p in self.root.glob(pattern) if p.is_file() and p.suffix.lower() == ".pdf"]
+
+    def describe(self, path: Path) -> DriveFile:
+        st = path.stat()
+        return DriveFile(
+            file_id=path.relative_to(self.root).as_posix(),
+            filename=path.name,
+            drive_url=path.as_uri(),
+            modified_time=datetime.fromtimestamp(st.st_mtime, tz=timezone.utc).isoformat(),
+        )
+
+    def list_pdfs(self, page_size: int | None = None) -> List[DriveFile]:
+        """All PDFs, newest first (page_size is accepted for DriveClient compatibility and ignored)."""
+        paths = sorted(self._paths(), key=lambda p: p.stat().st_mtime, reverse=True)
+        return [self.describe(p) for p in paths]
+
+    def download_pdf_bytes(self, file_id: str) -> bytes:
+        return (self.root / file_id).read_bytes()
+
+    def snapshot(self) -> Dict[str, Tuple[int, int]]:
+        """file_id -> (mtime_ns, size), used by watch_directory to detect changes."""
+        out = {}
+        for p in self._paths():
+            try:
+                st = p.stat()
+            except FileNotFoundError:
+                continue
+            out[p.relative_to(self.root).as_posix()] = (st.st_mtime_ns, st.st_size)
+        return out
+
+def watch_directory(
+    source: LocalDirClient,
+    on_change: Callable[[List[DriveFile], List[str]], None],
+    interval: float = 1.0,
+    settle: float = 1.0,
+    stop: Optional[threading.Event] = None,
+    baseline: Optional[Dict[str, Tuple[int, int]]] = None,
+) -> None:
+    """
+    Call on_change(changed_files, removed_file_ids) whenever PDFs land, change or disappear.
+
+    Uses watchdog (inotify / FSEvents / ReadDirectoryChangesW) to wake up immediately when it is
+    installed, and plain polling every `interval` seconds otherwise. A file is only reported once
+    its (mtime, size) has been stable for `settle` seconds, so half-synced files aren't ingested.
+    `baseline` is the snapshot to diff against (default: the directory as it is now).
+    """
+    stop = stop or threading.Event()
+    wake = threading.Event()
+    observer = _start_observer(source, wake)
+
+    known = dict(baseline) if baseline is not None else source.snapshot()
+    pending: Dict[str, Tuple[Tuple[int, int], float]] = {}  # file_id -> (signature, first seen)
+    try:
+        while not stop.is_set():
+            # while something is settling, re-check sooner than the idle interval
+            wake.wait(min(interval, settle) if pending else interval)
+            wake.clear()
+            now = time.monotonic()
+            current = source.snapshot()
+
+            for fid, sig in current.items():
+                if known.get(fid) == sig:
+                    pending.pop(fid, None)
+                    continue
+                seen = pending.get(fid)
+                if seen is None or seen[0] != sig:
+                    pending[fid] = (sig, now)
+
+            ready = [fid for fid, (sig, t0) in pending.items() if now - t0 >= settle]
+            removed = [fid for fid in known if fid not in current]
+            if not ready and not removed:
+                continue
+
+            changed = []
+            for fid in ready:
+                known[fid] = pending.pop(fid)[0]
+                path = source.root / fid
+                if path.exists():
+                    changed.append(source.describe(path))
+            for fid in removed:
+                known.pop(fid, None)
+                pending.pop(fid, None)
+
+            try:
+                on_change(changed, removed)
+            except Exception:
+                log.exception("watch: ingest of %d changed / %d removed files failed", len(changed), len(removed))
+    finally:
+        if observer is not None:
+            observer.stop()
+            observer.join()
+
+def _start_observer(source: LocalDirClient, wake: threading.Event):
+    try:
+        from watchdog.events import FileSystemEventHandler
+        from watchdog.observers import Observer
+    except ImportError:
+        log.info("watch: watchdog not installed, polling %s", source.root)
+        return None
+
+    class _Wake(FileSystemEventHandler):
+        def on_any_event(self, event):
+            wake.set()
+
+    observer = Observer()
+    observer.schedule(_Wake(), str(source.root), recursive=source.recursive)
+    observer.start()
+    log.info("watch: watching %s for PDF changes", source.root)
+    return observer
@@ -0,0 +1,82 @@
+# app/ingestion/tokenizer.py
+import os
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+from app.utils.settings import settings
+
+@lru_cache(maxsize=1)
+def get_tokenizer():
+    """
+    Fast (Rust) HF tokenizer of the embedding model, used to size chunks in model tokens.
+    Returns None when transformers isn't installed or the tokenizer can't be loaded. With
+    HF_HUB_OFFLINE set it only looks in the local cache instead of retrying the Hub.
+    """
+    offline = os.getenv("HF_HUB_OFFLINE", "").lower() in ("1", "true", "yes", "on")
+    try:
+        from transformers import AutoTokenizer
+        tok = AutoTokenizer.from_pretrained(settings.chunk_tokenizer, use_fast=True, local_files_only=offline)
+    except Exception:
+        return None
+    # We tokenize whole pages on purpose; silence the "sequence longer than max" warning
+    tok.model_max_length = int(1e9)
+    return tok
+
+def token_budget(limit: Optional[int] = None) -> int:
+    """
+    Content tokens that fit in one model input: the model limit minus [CLS]/[SEP]-style specials.
+    MiniLM-L6 truncates at 256 wordpieces, ELSER at 512, so the default limit (256) fits both.
+    """
+    limit = limit or settings.chunk_max_model_tokens
+    tok = get_tokenizer()
+    specials = tok.num_special_tokens_to_add(pair=False) if tok is not None else 2
+    return max(1, limit - specials)
+
+def token_lengths(texts: List[str]) -> List[int]:
+    """Content-token count per text, in one batched tokenizer call."""
+    if not texts:
+        return []
+    tok = get_tokenizer()
+    if tok is None:
+        raise RuntimeError(f"tokenizer {settings.chunk_tokenizer!r} unavailable (pip install transformers)")
+    enc = tok(texts, add_special_tokens=False, return_attention_mask=False, return_token_type_ids=False)
+    return [len(ids) for ids in enc["input_ids"]]
+
+def token_offsets(texts: List[str]) -> List[List[tuple]]:
+    """(start, end) character offsets of every model token, per text, in one batched call."""
+    tok = get_tokenizer()
+    if tok is None:
+        raise RuntimeError(f"tokenizer {settings.chunk_tokenizer!r} unavailable (pip install transformers)")
+    enc = tok(
+        texts,
+        add_special_tokens=False,
+        return_offsets_mapping=True,
+        return_attention_mask=False,
+        return_token_type_ids=False,
+    )
+    return enc["offset_mapping"]
+
+def token_stats_enabled() -> bool:
+    """Token stats cost a tokenizer load and a pass over every chunk; "words" mode skips them by default."""
+    return settings.chunk_token_stats or settings.chunk_mode in ("tokens", "structure")
+
+def chunk_token_lengths(texts: List[str]) -> Optional[List[int]]:
+    """Model-token length of each chunk, or None when stats are off or no tokenizer is available."""
+    if not token_stats_enabled() or get_tokenizer() is None:
+        return None
+    return token_lengths(texts)
+
+def summarize_token_lengths(lengths: List[int], limit: Optional[int] = None) -> Dict[str, Any]:
+    """
+    How the chunks look to the embedding model: max/mean length and how many would be
+    silently truncated (plus how many tokens that throws away).
+    """
+    budget = token_budget(limit)
+    over = [n - budget for n in lengths if n > budget]
+    return {
+        "token_limit": budget,
+        "max_tokens": max(lengths, default=0),
+        "mean_tokens": round(sum(lengths) / len(lengths), 1) if lengths else 0.0,
+        "truncated": len(over),
+        "truncated_tokens": sum(over),
+    }
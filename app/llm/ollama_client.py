@@ -0,0 +1,203 @@
+# app/llm/ollama_client.py
+"""
+Ollama /api/generate for a Prompt (app.llm.prompts), with prefix-friendly settings:
+
+  - the fixed instructions go in `system`, the per-request part in `prompt`
+  - `keep_alive` (OLLAMA_KEEP_ALIVE, default 30m) keeps the model, and with it the KV cache of
+    the last prompt, loaded between requests instead of the 5 minute default
+  - sessions: pass a session id and the `context` token array Ollama returns is sent back on the
+    next turn, so the earlier turns aren't re-tokenised or re-prefilled. Follow-up prompts then
+    carry only new passages and the question. A session restarts once its context passes
+    OLLAMA_SESSION_MAX_TOKENS, before Ollama would start truncating it. Turns of one session
+    run one at a time (Session.lock), since each builds on the previous turn's context.
+  - answer_stream() is the streaming form (the API's /query/stream)
+"""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Set
+
+import requests
+
+from app.llm.prompts import Prompt, build_prompt
+from app.utils.metrics import span, observe, inc
+
+DEFAULT_MODEL = "phi3:mini"
+KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+SESSION_MAX_TOKENS = int(os.getenv("OLLAMA_SESSION_MAX_TOKENS", "1536"))
+SESSION_TTL = float(os.getenv("OLLAMA_SESSION_TTL_SECONDS", "1800"))
+MAX_SESSIONS = int(os.getenv("OLLAMA_MAX_SESSIONS", "256"))
+
+
+def base_url() -> str:
+    """OLLAMA_BASE_URL, else OLLAMA_HOST (with or without scheme) + OLLAMA_PORT."""
+    url = os.getenv("OLLAMA_BASE_URL")
+    if url:
+        return url.rstrip("/")
+    host = os.getenv("OLLAMA_HOST", "127.0.0.1").rstrip("/")
+    if "://" in host:
+        return host
+    return f"http://{host}:{os.getenv('OLLAMA_PORT', '11434')}"
+
+
+def record_ollama_stats(data: Dict[str, Any]) -> None:
+    """
+    Split Ollama's own timings (nanoseconds) into prefill (prompt eval) and decoding stages.
+    """
+    if data.get("prompt_eval_duration") is not None:
+        observe("llm_prefill", data["prompt_eval_duration"] / 1e9)
+    if data.get("eval_duration") is not None:
+        observe("llm_decode", data["eval_duration"] / 1e9)
+    if data.get("load_duration") is not None:
+        observe("llm_load", data["load_duration"] / 1e9)
+    inc("rag_llm_prompt_tokens_total", data.get("prompt_eval_count") or 0, help="Prompt tokens evaluated by the LLM")
+    inc("rag_llm_completion_tokens_total", data.get("eval_count") or 0, help="Tokens generated by the LLM")
+
+
+# ---------- sessions ----------
+@dataclass
+class Session:
+    context: List[int] = field(default_factory=list)
+    seen: Set[str] = field(default_factory=set)   # chunk ids already in the context
+    touched: float = field(default_factory=time.monotonic)
+    # held from reading context to storing the new one; a plain Lock, because a streamed turn
+    # may release it from another thread than the one that acquired it
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+
+class _Sessions:
+    def __init__(self, size: int, ttl: float):
+        self.size, self.ttl = size, ttl
+        self._data: "OrderedDict[str, Session]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, sid: str) -> Session:
+        now = time.monotonic()
+        with self._lock:
+            s = self._data.get(sid)
+            if s is None or now - s.touched > self.ttl:
+                s = self._data[sid] = Session()
+            s.touched = now
+            self._data.move_to_end(sid)
+            while len(self._data) > self.size:
+                self._data.popitem(last=False)
+            return s
+
+    def drop(self, sid: str) -> None:
+        with self._lock:
+            self._data.pop(sid, None)
+
+
+sessions = _Sessions(MAX_SESSIONS, SESSION_TTL)
+
+
+# ---------- generate ----------
+def _body(p: Prompt, model: Optional[str], options: Optional[Dict[str, Any]], context: Optional[List[int]],
+          stream: bool) -> Dict[str, Any]:
+    body: Dict[str, Any] = {
+        "model": model or os.getenv("OLLAMA_MODEL", DEFAULT_MODEL),
+        "prompt": p.prompt,
+        "stream": stream,
+        "keep_alive": KEEP_ALIVE,
+        "options": options or {},
+    }
+    if context:
+        body["context"] = context  # already starts with the system prompt; don't template it twice
+    else:
+        body["system"] = p.system
+    return body
+
+
+def generate(p: Prompt, model: Optional[str] = None, options: Optional[Dict[str, Any]] = None,
+             context: Optional[List[int]] = None, timeout: float = 120) -> Dict[str, Any]:
+    """One non-streaming /api/generate call; returns Ollama's JSON (response, context, timings)."""
+    body = _body(p, model, options, context, stream=False)
+    with span("llm", backend="ollama"):
+        r = requests.post(f"{base_url()}/api/generate", json=body, timeout=timeout)
+    r.raise_for_status()
+    data = r.json()
+    record_ollama_stats(data)
+    return data
+
+
+def answer(question: str, hits: List[Dict[str, Any]], session_id: Optional[str] = None,
+           model: Optional[str] = None, options: Optional[Dict[str, Any]] = None,
+           timeout: float = 120) -> Dict[str, Any]:
+    """
+    Build the prompt and generate. Returns Ollama's JSON plus "chunk_ids", the passages the model
+    has seen for this answer (this turn's and, in a session, the earlier turns').
+    """
+    if not session_id:
+        p = build_prompt(question, hits)
+        data = generate(p, model, options, timeout=timeout)
+        return {**data, "chunk_ids": list(p.chunk_ids)}
+
+    s = sessions.get(session_id)
+    with s.lock:
+        if len(s.context) > SESSION_MAX_TOKENS:
+            inc("rag_llm_session_resets_total", help="Conversation contexts restarted at OLLAMA_SESSION_MAX_TOKENS")
+            s.context, s.seen = [], set()
+        p = build_prompt(question, hits, seen=s.seen if s.context else ())
+        data = generate(p, model, options, context=s.context or None, timeout=timeout)
+        s.context = data.get("context") or []
+        s.seen |= set(p.chunk_ids)
+        return {**data, "chunk_ids": sorted(s.seen)}
+
+
+def generate_stream(p: Prompt, model: Optional[str] = None, options: Optional[Dict[str, Any]] = None,
+                    context: Optional[List[int]] = None, timeout: float = 120) -> Iterator[Dict[str, Any]]:
+    """
+    Streaming /api/generate: yields Ollama's NDJSON objects as they arrive, one per token and a
+    final one with done=True (context, timings). `timeout` applies per read, so it bounds the gap
+    between tokens rather than the whole answer.
+    """
+    body = _body(p, model, options, context, stream=True)
+    # timed by hand: a generator may be resumed in another thread/context, which a span can't span
+    t0 = time.perf_counter()
+    first = True
+    with requests.post(f"{base_url()}/api/generate", json=body, stream=True, timeout=timeout) as r:
+        r.raise_for_status()
+        for line in r.iter_lines():
+            if not line:
+                continue
+            data = json.loads(line)
+            if data.get("error"):
+                raise RuntimeError(f"Ollama error: {data['error']}")
+            if first:
+                observe("llm_first_token", time.perf_counter() - t0, backend="ollama")
+                first = False
+            if data.get("done"):
+                observe("llm", time.perf_counter() - t0, backend="ollama")
+                record_ollama_stats(data)
+            yield data
+
+
+def answer_stream(question: str, hits: List[Dict[str, Any]], session_id: Optional[str] = None,
+                  model: Optional[str] = None, options: Optional[Dict[str, Any]] = None,
+                  timeout: float = 120) -> Iterator[str]:
+    """
+    answer() that yields the response text piece by piece; the session is updated at the end. The
+    session's lock is held until the stream finishes or is closed (client gone).
+    """
+    if not session_id:
+        p = build_prompt(question, hits)
+        for data in generate_stream(p, model, options, timeout=timeout):
+            if data.get("response"):
+                yield data["response"]
+        return
+
+    s = sessions.get(session_id)
+    with s.lock:
+        if len(s.context) > SESSION_MAX_TOKENS:
+            inc("rag_llm_session_resets_total", help="Conversation contexts restarted at OLLAMA_SESSION_MAX_TOKENS")
+            s.context, s.seen = [], set()
+        p = build_prompt(question, hits, seen=s.seen if s.context else ())
+        for data in generate_stream(p, model, options, context=s.context or None, timeout=timeout):
+            if data.get("response"):
+                yield data["response"]
+            if data.get("done"):
+                s.context = data.get("context") or []
+                s.seen |= set(p.chunk_ids)
@@ -0,0 +1,62 @@
+# app/llm/prompts.py
+"""
+Prompt assembly shared by the API and the generator.
+
+Content is ordered from most to least stable, so consecutive requests share the longest possible
+token prefix and Ollama (llama.cpp keeps the last prompt's KV cache per slot) only prefills what
+changed:
+
+    system   SYSTEM_PROMPT, identical for every request (sent as Ollama's `system` field)
+    prompt   CONTEXT (chunks in rank order, each headed by its chunk id) -> QUESTION -> ANSWER:
+
+With the question last, a follow-up that retrieves the same chunks reuses the whole context
+prefill. In a session (see app.llm.ollama_client) chunks the model has already seen are left out
+of later turns.
+"""
+from typing import Any, Dict, Iterable, List, NamedTuple, Tuple
+
+from app.utils.metrics import timed
+
+REFUSAL = "I don't know."
+MAX_CONTEXT_HITS = 10
+
+SYSTEM_PROMPT = f"""You are a helpful RAG assistant.
+Use only the CONTEXT passages to answer the QUESTION. If the answer isn't clearly supported by them, reply exactly: {REFUSAL}
+Each passage starts with its id in square brackets. Cite the passages you use with those ids, e.g. [chunk_id].
+Be concise."""
+
+
+class Prompt(NamedTuple):
+    system: str
+    prompt: str
+    chunk_ids: Tuple[str, ...]  # passages included in this prompt, in order
+
+    def flat(self) -> str:
+        """Single-string form, for backends without a system field and for logging."""
+        return f"{self.system}\n\n{self.prompt}"
+
+
+def _chunk_id(h: Dict[str, Any]) -> str:
+    return h.get("chunk_id") or h.get("_id") or "chunk"
+
+
+def _passage(h: Dict[str, Any]) -> str:
+    p0, p1 = (h.get("page_range") or [h.get("page_start"), h.get("page_end")])
+    header = f"[{_chunk_id(h)}] {h.get('filename') or 'doc'} (p.{p0}-{p1})"
+    text = (h.get("text") or h.get("snippet") or h.get("_source", {}).get("text") or "").strip()
+    return f"{header}\n{text}".strip()
+
+
+@timed("prompt_build")
+def build_prompt(question: str, hits: List[Dict[str, Any]], seen: Iterable[str] = ()) -> Prompt:
+    """System + context-then-question prompt; passages whose ids are in `seen` are skipped."""
+    seen = set(seen)
+    picked = [h for h in hits[:MAX_CONTEXT_HITS] if _chunk_id(h) not in seen]
+    parts = []
+    if picked:
+        parts.append("CONTEXT:\n" + "\n\n---\n\n".join(_passage(h) for h in picked))
+    elif seen:
+        parts.append("CONTEXT: (the passages above)")
+    parts.append(f"QUESTION:\n{question.strip()}")
+    parts.append("ANSWER:")
+    return Prompt(SYSTEM_PROMPT, "\n\n".join(parts), tuple(_chunk_id(h) for h in picked))
@@ -2,12 +2,12 @@
 from functools import lru_cache
 from typing import List
 import numpy as np
-from sentence_transformers import SentenceTransformer
 
 MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
 
 @lru_cache(maxsize=1)
 def _model():
+    from sentence_transformers import SentenceTransformer  # pulls in torch; load on first use
     return SentenceTransformer(MODEL_NAME)
 
 def embed_texts(texts: List[str]) -> List[List[float]]:
@@ -2,6 +2,9 @@
 from functools import lru_cache
 from typing import List
 import os
+import threading
+
+from app.utils.metrics import span
 
 # We use all-MiniLM-L6-v2 (384 dims) to match your index mapping
 DEFAULT_MODEL = os.getenv("EMBED_MODEL_NAME", "sentence-transformers/all-MiniLM-L6-v2")
@@ -12,16 +15,54 @@ def _get_model():
     # Let ST/torch pick CPU automatically; works on any machine
     return SentenceTransformer(DEFAULT_MODEL)
 
+# Micro-batching of concurrent embed_query calls (API server only, see start_batching)
+BATCH_MAX = int(os.getenv("EMBED_BATCH_MAX", "32"))
+BATCH_WAIT_MS = float(os.getenv("EMBED_BATCH_WAIT_MS", "2"))
+_batcher = None
+_batcher_lock = threading.Lock()
+
+def _encode_batch(texts: List[str]) -> List[List[float]]:
+    # normalize_embeddings=True gives cosine-normalized vectors (what ES expects for cosine similarity)
+    return _get_model().encode(texts, normalize_embeddings=True, batch_size=len(texts)).tolist()
+
+def start_batching(max_batch: int | None = None, max_wait_ms: float | None = None) -> None:
+    """Route embed_query through one MicroBatcher, so concurrent queries share a forward pass."""
+    global _batcher
+    from app.utils.batching import MicroBatcher
+    with _batcher_lock:
+        if _batcher is None:
+            _batcher = MicroBatcher(
+                _encode_batch,
+                max_batch=max_batch or BATCH_MAX,
+                max_wait_ms=BATCH_WAIT_MS if max_wait_ms is None else max_wait_ms,
+                name="embed",
+            )
+
+def stop_batching() -> None:
+    global _batcher
+    with _batcher_lock:
+        if _batcher is not None:
+            _batcher.close()
+            _batcher = None
+
 def embed_query(text: str) -> List[float]:
     """
     Returns a single normalized embedding (list of floats) for the query string.
     """
-    model = _get_model()
-    # normalize_embeddings=True gives cosine-normalized vectors (what ES expects for cosine similarity)
-    vec = model.encode([text], normalize_embeddings=True)[0]
-    return vec.tolist()
+    with span("embed"):
+        if _batcher is not None:
+            return _batcher(text)
+        return _encode_batch([text])[0]
 
 # Optional helper if you ever need batch embedding later
 def embed_texts(texts: List[str]) -> List[List[float]]:
     model = _get_model()
     return model.encode(texts, normalize_embeddings=True).tolist()
+
+def load() -> None:
+    """Load the weights only (no encode); see app.api.server.preload_models."""
+    _get_model()
+
+def warm_up() -> None:
+    """Load the model and run one encode, so the first query doesn't pay for either."""
+    _get_model().encode(["warm up"], normalize_embeddings=True)
@@ -0,0 +1,155 @@
+# app/retrieval/expansion.py
+"""
+ELSER expansion as an explicit, client-driven stage.
+
+Ingest: with ELSER_INGEST_MODE=client, expand_texts() sends chunk texts through the _inference
+API in batches with bounded concurrency and index_chunks() stores the token weights in ml.tokens
+directly. That needs the ELSER_ENDPOINT_ID endpoint too, so the default stays the
+elser_v2_pipeline ingest pipeline, and a failed expansion (ExpansionError) falls back to it.
+
+Query: with ELSER_QUERY_MODE=cached, expand_query() caches token weights per normalised query
+and the searcher sends them as a plain sparse_vector query, so a repeated question costs no
+ML-node inference at all. It needs the ELSER_ENDPOINT_ID endpoint (scripts/bootstrap_elastic.sh
+creates it), so the default stays server-side text_expansion. A failed expansion raises
+ExpansionError, which the searcher treats like a failed search: it degrades to BM25.
+
+Inference goes through one function that can be swapped with set_infer(), e.g. a stub returning
+fixed weights in benchmarks or tests: fn(texts) -> [{token: weight}, ...].
+"""
+import os
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from app.infra.es_client import get_es
+from app.utils.metrics import span, inc
+
+ENDPOINT_ID = os.getenv("ELSER_ENDPOINT_ID", "elser_v2_endpoint")
+BATCH_SIZE = int(os.getenv("ELSER_BATCH_SIZE", "16"))
+CONCURRENCY = int(os.getenv("ELSER_CONCURRENCY", "2"))   # in-flight _infer calls during ingest
+CACHE_SIZE = int(os.getenv("ELSER_QUERY_CACHE_SIZE", "2048"))
+
+Tokens = Dict[str, float]
+InferFn = Callable[[List[str]], List[Tokens]]
+
+class ExpansionError(RuntimeError):
+    """Texts couldn't be expanded: no such endpoint, model not deployed, ML node down."""
+
+def query_mode() -> str:
+    """"cached": client-side expansion + sparse_vector; "inference": server-side text_expansion."""
+    return os.getenv("ELSER_QUERY_MODE", "inference").lower()
+
+def ingest_mode() -> str:
+    """"client": batch _infer from index_chunks; "pipeline": ES ingest pipeline; "off": no ml.tokens."""
+    return os.getenv("ELSER_INGEST_MODE", "pipeline").lower()
+
+def es_infer(texts: List[str], es=None) -> List[Tokens]:
+    """One _inference/sparse_embedding call; returns a token->weight dict per input text."""
+    es = es or get_es()
+    resp = es.options(request_timeout=120).inference.inference(
+        inference_id=ENDPOINT_ID, task_type="sparse_embedding", input=texts
+    )
+    body = getattr(resp, "body", resp)
+    return [r["embedding"] for r in body["sparse_embedding"]]
+
+_infer: InferFn = es_infer
+
+def set_infer(fn: Optional[InferFn]) -> None:
+    """Replace the inference call (None restores the ES endpoint) and drop cached expansions."""
+    global _infer
+    _infer = fn or es_infer
+    _cache.clear()
+
+# ---------- ingest ----------
+def expand_texts(texts: List[str], batch_size: Optional[int] = None, concurrency: Optional[int] = None) -> List[Tokens]:
+    """Expand many texts, `batch_size` per request and at most `concurrency` requests in flight."""
+    if not texts:
+        return []
+    batch_size = max(1, batch_size or BATCH_SIZE)
+    batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+    with span("elser_expand", side="ingest") as sp:
+        sp.set("batches", len(batches))
+        workers = max(1, min(concurrency or CONCURRENCY, len(batches)))
+        try:
+            if workers == 1:
+                results = [_infer(b) for b in batches]
+            else:
+                with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="elser") as pool:
+                    results = list(pool.map(_infer, batches))  # map() keeps input order
+        except Exception as e:
+            if not _es_failure(e):
+                raise
+            raise ExpansionError(f"ELSER expansion via {ENDPOINT_ID} failed: {e}") from e
+    inc("rag_elser_expanded_texts_total", len(texts), help="Texts expanded with ELSER via _infer")
+    return [tokens for batch in results for tokens in batch]
+
+# ---------- query ----------
+def _es_failure(exc: BaseException) -> bool:
+    """Any ES error (4xx here means a missing endpoint or undeployed model), not a bug of ours."""
+    from app.infra.es_resilience import is_cluster_error
+    if is_cluster_error(exc):
+        return True
+    try:
+        from elasticsearch import ApiError
+    except ImportError:
+        return False
+    return isinstance(exc, ApiError)
+
+class _LRU:
+    def __init__(self, size: int):
+        self.size = size
+        self._data: "OrderedDict[str, Tokens]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Tokens]:
+        with self._lock:
+            val = self._data.get(key)
+            if val is not None:
+                self._data.move_to_end(key)
+            return val
+
+    def put(self, key: str, val: Tokens) -> None:
+        with self._lock:
+            self._data[key] = val
+            self._data.move_to_end(key)
+            while len(self._data) > self.size:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+_cache = _LRU(CACHE_SIZE)
+_SPACES = re.compile(r"\s+")
+
+def normalize_query(q: str) -> str:
+    return _SPACES.sub(" ", q.strip().lower())
+
+def expand_query(q: str) -> Tokens:
+    """ELSER token weights for a query, served from the LRU cache when seen before."""
+    key = normalize_query(q)
+    tokens = _cache.get(key)
+    if tokens is not None:
+        inc("rag_elser_query_cache_total", result="hit", help="ELSER query expansion cache lookups")
+        return tokens
+    inc("rag_elser_query_cache_total", result="miss", help="ELSER query expansion cache lookups")
+    try:
+        with span("elser_expand", side="query"):
+            tokens = _infer([key])[0]
+    except Exception as e:
+        if not _es_failure(e):
+            raise
+        raise ExpansionError(f"ELSER expansion via {ENDPOINT_ID} failed: {e}") from e
+    _cache.put(key, tokens)
+    return tokens
+
+def elser_query(q: str, field: str = "ml.tokens", model_id: str = ".elser_model_2") -> Dict:
+    """The ELSER leg of a search: sparse_vector with cached weights, or server-side text_expansion."""
+    if query_mode() == "cached":
+        return {"sparse_vector": {"field": field, "query_vector": expand_query(q)}}
+    return {"text_expansion": {field: {"model_id": model_id, "model_text": q}}}
@@ -0,0 +1,59 @@
+# app/retrieval/knn_tuning.py
+"""
+How many HNSW candidates to visit per kNN query.
+
+num_candidates trades recall for latency. scripts/calibrate_knn.py measures recall@k against an
+exact script_score baseline for a grid of num_candidates and writes KNN_CALIBRATION_PATH; the
+query side then picks the smallest num_candidates / k ratio that met KNN_TARGET_RECALL. Without
+a calibration file it falls back to the old hard-coded max(100, 2 x k): KNN_CANDIDATE_RATIO x k
+with a floor of KNN_MIN_CANDIDATES (default 100). A KNN_MIN_CANDIDATES set explicitly also
+applies to calibrated values.
+"""
+import json
+import math
+import os
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from app.utils.logging import get_logger
+
+log = get_logger(__name__)
+
+MAX_NUM_CANDIDATES = 10_000  # ES hard limit
+
+def target_recall() -> float:
+    return float(os.getenv("KNN_TARGET_RECALL", "0.95"))
+
+@lru_cache(maxsize=4)
+def _load(path: str) -> Optional[Dict[str, Any]]:
+    p = Path(path)
+    if not p.exists():
+        return None
+    try:
+        return json.loads(p.read_text())
+    except (OSError, ValueError):
+        log.warning("knn: ignoring unreadable calibration file %s", p)
+        return None
+
+def calibrated_ratio(points: List[Dict[str, Any]], k: int, target: float) -> Optional[float]:
+    """Smallest num_candidates/k whose measured recall reached `target` (None if none did)."""
+    ok = [p for p in points if p.get("recall", 0.0) >= target]
+    if not ok:
+        return None
+    best = min(ok, key=lambda p: p["num_candidates"])
+    return best["num_candidates"] / max(1, k)
+
+def num_candidates(k: int) -> int:
+    """num_candidates for a kNN leg returning k neighbours."""
+    ratio = None
+    cal = _load(os.getenv("KNN_CALIBRATION_PATH", "./tmp/knn_calibration.json"))
+    if cal:
+        ratio = calibrated_ratio(cal.get("points", []), int(cal.get("k", 10)), target_recall())
+    floor = os.getenv("KNN_MIN_CANDIDATES")
+    if ratio is None:
+        ratio = float(os.getenv("KNN_CANDIDATE_RATIO", "2.0"))
+        floor = floor or "100"  # uncalibrated: same as the previous max(100, k * 2)
+    floor = int(floor or 0)
+    n = max(k, floor, math.ceil(k * ratio))
+    return min(n, MAX_NUM_CANDIDATES)
@@ -0,0 +1,114 @@
+# app/retrieval/reranker.py
+import os
+import time
+from functools import lru_cache
+from typing import Any, Dict, List
+
+from app.utils.logging import get_logger
+from app.utils.metrics import span, inc
+
+log = get_logger(__name__)
+
+# Small MS MARCO cross-encoder; ~22M params, fine on CPU for a few dozen pairs
+RERANK_MODEL_NAME = os.getenv("RERANK_MODEL_NAME", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANK_BACKEND = os.getenv("RERANK_BACKEND", "torch").lower()   # "torch" | "onnx"
+RERANK_INT8 = os.getenv("RERANK_INT8", "0") == "1"
+RERANK_ONNX_FILE = os.getenv("RERANK_ONNX_FILE", "model_quantized.onnx" if RERANK_INT8 else "model.onnx")
+RERANK_MAX_LENGTH = int(os.getenv("RERANK_MAX_LENGTH", "256"))
+
+
+def rerank_enabled(flag: bool | None = None) -> bool:
+    """Explicit flag wins; otherwise fall back to RERANK_ENABLED (default off)."""
+    if flag is not None:
+        return bool(flag)
+    return os.getenv("RERANK_ENABLED", "0") == "1"
+
+
+def candidate_window(k: int) -> int:
+    """
+    How many fused hits to pull from ES before re-ranking.
+    Capped by RERANK_CANDIDATES so a large k can't blow up the CPU batch.
+    """
+    cap = int(os.getenv("RERANK_CANDIDATES", "30"))
+    return max(k, min(cap, k * 4))
+
+
+class _TorchScorer:
+    def __init__(self):
+        from sentence_transformers import CrossEncoder
+        self.model = CrossEncoder(RERANK_MODEL_NAME, device="cpu", max_length=RERANK_MAX_LENGTH)
+        if RERANK_INT8:
+            import torch
+            # Dynamic int8 quantization of the Linear layers; no calibration needed
+            self.model.model = torch.quantization.quantize_dynamic(
+                self.model.model, {torch.nn.Linear}, dtype=torch.qint8
+            )
+
+    def score(self, pairs: List[List[str]]) -> List[float]:
+        # batch_size=len(pairs) -> a single forward pass for the whole window
+        scores = self.model.predict(pairs, batch_size=len(pairs), show_progress_bar=False)
+        return [float(s) for s in scores]
+
+
+class _OnnxScorer:
+    def __init__(self):
+        from optimum.onnxruntime import ORTModelForSequenceClassification
+        from transformers import AutoTokenizer
+        self.tokenizer = AutoTokenizer.from_pretrained(RERANK_MODEL_NAME)
+        self.model = ORTModelForSequenceClassification.from_pretrained(
+            RERANK_MODEL_NAME, file_name=RERANK_ONNX_FILE, export=not os.path.isdir(RERANK_MODEL_NAME)
+        )
+
+    def score(self, pairs: List[List[str]]) -> List[float]:
+        enc = self.tokenizer(
+            [p[0] for p in pairs],
+            [p[1] for p in pairs],
+            padding=True,
+            truncation=True,
+            max_length=RERANK_MAX_LENGTH,
+            return_tensors="pt",
+        )
+        logits = self.model(**enc).logits
+        return [float(x) for x in logits[:, 0].tolist()]
+
+
+@lru_cache(maxsize=1)
+def _get_scorer():
+    if RERANK_BACKEND == "onnx":
+        return _OnnxScorer()
+    return _TorchScorer()
+
+
+def rerank(query: str, hits: List[Dict[str, Any]], top_k: int) -> List[Dict[str, Any]]:
+    """
+    Score (query, chunk text) pairs with the cross-encoder in one batch and keep the top_k.
+    Hits must carry the full chunk in "text" (see format_hits(keep_text=True)).
+    Each returned hit gets a "rerank_score"; the original ES score is left untouched.
+    """
+    if not hits:
+        return hits
+
+    pairs = [[query, h.get("text") or h.get("snippet") or ""] for h in hits]
+
+    t0 = time.perf_counter()
+    with span("rerank", backend=RERANK_BACKEND) as sp:
+        scores = _get_scorer().score(pairs)
+        sp.set("batch", len(pairs))
+    took_ms = (time.perf_counter() - t0) * 1000.0
+    inc("rag_rerank_pairs_total", len(pairs), help="Query/chunk pairs scored by the cross-encoder")
+    log.info("rerank batch=%d took_ms=%.1f backend=%s", len(pairs), took_ms, RERANK_BACKEND)
+
+    for h, s in zip(hits, scores):
+        h["rerank_score"] = s
+    ranked = sorted(hits, key=lambda h: h["rerank_score"], reverse=True)
+    return ranked[:top_k]
+
+
+def load() -> None:
+    """Load the cross-encoder weights without scoring anything (safe to do before fork)."""
+    _get_scorer()
+
+
+def warm_up() -> None:
+    """Load the cross-encoder (and run one pair through it) ahead of the first re-ranked query."""
+    _get_scorer().score([["warm up", "warm up"]])
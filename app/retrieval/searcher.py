@@ -1,10 +1,18 @@
-from typing import List, Dict, Any
+from typing import Callable, List, Dict, Any
 from app.storage.elastic_client import make_es
 import os
 from app.infra.es_client import get_es
 from app.retrieval.embedder import embed_query  # we added this earlier
+from app.retrieval.reranker import rerank, rerank_enabled, candidate_window
+from app.retrieval.knn_tuning import num_candidates
+from app.retrieval.expansion import ExpansionError, elser_query
+from app.storage.collections import filter_clauses, search_index
+from app.utils.logging import get_logger
+from app.utils.metrics import span, observe, inc
+from app.utils.snippets import SnippetBuilder, strip_highlight
 
-es = get_es()
+log = get_logger(__name__)
+es = None  # created on first search, so importing this module stays cheap
 INDEX = os.getenv("ELASTIC_INDEX_NAME", "rag_documents_v1")
 
 # INDEX = "rag_documents_v1"
@@ -12,6 +20,45 @@ ELSER_MODEL_ID = ".elser_model_2"
 TEXT_FIELD = "text"           # BM25
 ELSER_FIELD = "ml.tokens"     # ELSER tokens
 VECTOR_FIELD = "vector"       # dense vectors
+RRF_RANK_CONSTANT = 60
+
+# "highlight": ES builds the snippet and only the fragment is shipped (inline for elser_only,
+#              one follow-up ids query for RRF, which can't highlight); "local": ship the chunk
+#              text and build snippets client-side with SnippetBuilder
+SNIPPET_MODE = os.getenv("SNIPPET_MODE", "highlight").lower()
+SNIPPET_CHARS = int(os.getenv("SNIPPET_CHARS", "200"))
+_META_FIELDS = ["filename", "drive_url", "chunk_id", "collection", "page_start", "page_end"]
+
+def _want_cosine(flag: bool | None, mode: str) -> bool:
+    """Per-hit query cosine is only worth its round trip when the evidence gate will read it."""
+    if flag is not None:
+        return flag
+    from app.generation.evidence import needs_cosine
+    return needs_cosine(mode)
+
+def _es():
+    global es
+    if es is None:
+        es = get_es()
+    return es
+
+def _hit_source(use_rerank: bool) -> List[str]:
+    """Chunk text is only fetched when something client-side needs it (cross-encoder, local snippets)."""
+    if use_rerank or SNIPPET_MODE == "local":
+        return _META_FIELDS + [TEXT_FIELD]
+    return _META_FIELDS
+
+def _highlight(q: str) -> Dict[str, Any]:
+    return {
+        "fields": {TEXT_FIELD: {
+            "type": "unified",
+            "fragment_size": SNIPPET_CHARS,
+            "number_of_fragments": 1,
+            "no_match_size": SNIPPET_CHARS,  # still return a lead-in when no term matches
+        }},
+        # highlight on the words themselves, not on ELSER tokens / the kNN leg
+        "highlight_query": {"match": {TEXT_FIELD: q}},
+    }
 
 def _source_filter():
     return ["filename", "drive_url", "chunk_id", "text", "page_start", "page_end"]
@@ -91,38 +138,195 @@ def _format_hits(resp: Dict[str, Any]) -> List[Dict[str, Any]]:
 #     body = build_elser_only_query(question, top_k)
 #     resp = es.search(index=INDEX, body=body, request_timeout=30)
 #     return _format_hits(resp)
-def elser_only(q: str, k: int = 5):
-    body = {
-        "size": k,
-        "query": {
-            "bool": {
-                "should": [
-                    {"multi_match": {"query": q, "fields": ["text^2", "filename"], "type": "best_fields"}},
-                    {"text_expansion": {"ml.tokens": {"model_id": ".elser_model_2", "model_text": q}}},
-                ]
-            }
-        },
-        "_source": ["filename", "drive_url", "chunk_id", "page_start", "page_end", "text"],
-        # (optional) You CAN use highlight here because this is NOT using 'retriever/rank'
-        # "highlight": {"fields": {"text": {}}, "fragment_size": 140, "number_of_fragments": 1}
+def elser_only(q: str, k: int = 5, rerank_hits: bool | None = None, filters: Dict[str, Any] | None = None,
+               cosine: bool | None = None):
+    """
+    BM25 + ELSER in one bool query. `filters` (see app.storage.collections.filter_clauses)
+    are applied as a bool filter, so only the matching document set is scored.
+    """
+    use_rerank = rerank_enabled(rerank_hits)
+    size = candidate_window(k) if use_rerank else k
+
+    def build() -> Dict[str, Any]:
+        body = {
+            "size": size,
+            "query": {
+                "bool": {
+                    "should": [
+                        {"multi_match": {"query": q, "fields": ["text^2", "filename"], "type": "best_fields"}},
+                        elser_query(q),  # cached sparse_vector weights, or text_expansion
+                    ],
+                    # with a filter present, should-clauses become optional unless we say otherwise
+                    "minimum_should_match": 1,
+                    "filter": filter_clauses(filters),
+                    # linked near-duplicates carry only metadata; keep filename matches from surfacing them
+                    "must_not": [{"exists": {"field": "duplicate_of"}}],
+                }
+            },
+            "_source": _hit_source(use_rerank),
+        }
+        if SNIPPET_MODE == "highlight" and not use_rerank:
+            body["highlight"] = _highlight(q)  # allowed here: this is not a retriever/rank query
+        return body
+
+    index = search_index(filters)
+    resp, degraded = _search_or_bm25("elser", build, q, size, filters, use_rerank, index)
+    # no dense leg here: the query is only embedded when the cosine is asked for
+    qvec = embed_query(q) if _want_cosine(cosine, "elser") else None
+    return _finish(q, resp, k, use_rerank, index, qvec, degraded)
+
+def _search(leg: str, body: Dict[str, Any], index: str | None = None):
+    """
+    One ES search, timed client-side (span "es") and server-side (ES "took"). It goes through
+    the hedged executor (app.infra.es_resilience): a duplicate after the leg's p95, and a circuit
+    breaker per leg.
+    """
+    from app.infra.es_resilience import SEARCH_TIMEOUT, get_executor
+
+    def call(preference: str | None):
+        extra = {"preference": preference} if preference else {}
+        # X-Opaque-Id names the leg in ES slow logs and the tasks API
+        return _es().options(opaque_id=f"rag:{leg}", request_timeout=SEARCH_TIMEOUT).search(
+            index=index or INDEX, body=body, **extra)
+
+    with span("es", leg=leg) as sp:
+        resp = get_executor()(leg, call)
+        took = resp.get("took")
+        sp.set("took_ms", took)
+    if took is not None:
+        observe("es_took", took / 1000.0, leg=leg)
+    return resp
+
+def _bm25_body(q: str, size: int, filters: Dict[str, Any] | None, use_rerank: bool) -> Dict[str, Any]:
+    """Lexical-only search: no ML node, no HNSW graph; the degraded mode when the full query fails."""
+    body: Dict[str, Any] = {
+        "size": size,
+        "query": {"bool": {
+            "must": {"multi_match": {"query": q, "fields": ["text^2", "filename"], "type": "best_fields"}},
+            "filter": filter_clauses(filters),
+            "must_not": {"exists": {"field": "duplicate_of"}},
+        }},
+        "_source": _hit_source(use_rerank),
     }
-    resp = es.search(index=INDEX, body=body, request_timeout=30)
-    return format_hits(resp)
+    if SNIPPET_MODE == "highlight" and not use_rerank:
+        body["highlight"] = _highlight(q)
+    return body
 
-def format_hits(resp):
+def _search_or_bm25(leg: str, build: Callable[[], Dict[str, Any]], q: str, size: int,
+                    filters: Dict[str, Any] | None, use_rerank: bool, index: str | None):
+    """
+    (response, degraded): the leg's search, or BM25 only (degraded="bm25") when the leg's breaker
+    is open, the search failed on the cluster side, or the query couldn't be expanded. `build`
+    makes the leg's body, so the ELSER expansion call happens inside this fallback too. 4xx
+    search errors and our own bugs still raise.
+    """
+    from app.infra.es_resilience import is_cluster_error
+    try:
+        return _search(leg, build(), index), None
+    except Exception as e:
+        if not (is_cluster_error(e) or isinstance(e, ExpansionError)):
+            raise
+        log.warning("%s search failed (%s: %s); falling back to BM25", leg, type(e).__name__, e)
+        inc("rag_es_degraded_total", help="Searches answered by the BM25 fallback", leg=leg, reason=type(e).__name__)
+    return _search("bm25", _bm25_body(q, size, filters, use_rerank), index), "bm25"
+
+def format_hits(resp, keep_text: bool = False, q: str | None = None):
+    """
+    ES hits -> result dicts. The snippet is the ES highlight fragment when present, else a
+    query-aware window over the text when it was fetched, else None (see _follow_up).
+    """
     out = []
+    builder = SnippetBuilder(q or "", SNIPPET_CHARS)
     for h in resp["hits"]["hits"]:
         s = h.get("_source", {})
-        out.append({
+        frags = h.get("highlight", {}).get(TEXT_FIELD)
+        text = s.get(TEXT_FIELD)
+        if frags:
+            snippet = strip_highlight(frags[0])
+        elif text is not None:
+            snippet = builder.window(text)
+        else:
+            snippet = None
+        hit = {
             "score": h.get("_score"),
             "filename": s.get("filename"),
             "drive_url": s.get("drive_url"),
             "chunk_id": s.get("chunk_id"),
+            "collection": s.get("collection"),
             "page_range": [s.get("page_start"), s.get("page_end")],
-            "snippet": (s.get("text") or "")[:200],
-        })
+            "snippet": snippet,
+        }
+        if keep_text:
+            hit["text"] = text or ""
+        out.append(hit)
     return out
 
+# cosine(query, chunk) from the stored float vector; qv is unit-length, so dot / |v|
+_COSINE_SCRIPT = """
+if (doc['vector'].size() == 0) { return null; }
+float[] v = doc['vector'].vectorValue;
+double dot = 0;
+for (int i = 0; i < v.length; i++) { dot += v[i] * params.qv[i]; }
+return dot / doc['vector'].magnitude;
+"""
+
+def _follow_up(q: str, hits: List[Dict[str, Any]], index: str | None, qvec: List[float] | None = None) -> None:
+    """
+    One ids query on the final top-k for whatever the main search couldn't return: highlighted
+    snippets (RRF can't highlight) and, when `qvec` is given, query-chunk cosine similarity.
+    """
+    missing = {h["chunk_id"]: h for h in hits if h["snippet"] is None and h.get("chunk_id")}
+    wanted = {h["chunk_id"]: h for h in hits if h.get("chunk_id")} if qvec is not None else missing
+    if wanted:
+        body: Dict[str, Any] = {
+            "size": len(wanted),
+            "_source": False,
+            "query": {"ids": {"values": list(wanted)}},
+        }
+        if missing:
+            body["highlight"] = _highlight(q)
+        if qvec is not None:
+            body["script_fields"] = {"cosine": {"script": {"source": _COSINE_SCRIPT, "params": {"qv": qvec}}}}
+        try:
+            resp = _search("follow_up", body, index)
+        except Exception as e:  # the hits are still usable without snippets / cosine
+            from app.infra.es_resilience import is_cluster_error
+            if not is_cluster_error(e):
+                raise
+            log.warning("follow-up query failed (%s: %s); returning hits without snippets", type(e).__name__, e)
+            resp = {"hits": {"hits": []}}
+        for h in resp["hits"]["hits"]:
+            hit = wanted.get(h["_id"])
+            if hit is None:
+                continue
+            frags = h.get("highlight", {}).get(TEXT_FIELD)
+            if frags and hit["snippet"] is None:
+                hit["snippet"] = strip_highlight(frags[0])
+            if qvec is not None:
+                hit["cosine"] = (h.get("fields", {}).get("cosine") or [None])[0]
+    for h in hits:
+        if h["snippet"] is None:
+            h["snippet"] = ""
+
+def _finish(q: str, resp, k: int, use_rerank: bool, index: str | None = None, qvec: List[float] | None = None,
+            degraded: str | None = None):
+    """
+    Format an ES response; when re-ranking, score the full chunk text and keep the top k.
+    With `qvec`, every hit also gets "cosine" (query-chunk similarity, for the evidence gate).
+    `degraded` ("bm25" after a fallback) is copied onto every hit.
+    """
+    if not use_rerank:
+        hits = format_hits(resp, q=q)
+    else:
+        hits = rerank(q, format_hits(resp, keep_text=True, q=q), k)
+        for h in hits:
+            h.pop("text", None)  # the cross-encoder needed it, callers don't
+    _follow_up(q, hits, index, qvec)
+    if degraded:
+        for h in hits:
+            h["degraded"] = degraded
+    return hits
+
 
 # def hybrid_rrf(query: str, k: int = 5):
 #
@@ -187,30 +391,48 @@ def format_hits(resp):
 #
 #     resp = es.search(index=INDEX, body=body, request_timeout=30)
 #     return format_hits(resp)
-def hybrid_rrf(q: str, k: int = 5):
+def hybrid_rrf(q: str, k: int = 5, rerank_hits: bool | None = None, filters: Dict[str, Any] | None = None,
+               cosine: bool | None = None):
+    """
+    BM25 + ELSER + kNN fused with RRF. `filters` are pre-filters on every leg (bool filter for
+    the two standard retrievers, the knn "filter" clause for dense), so kNN candidates come
+    from the filtered set instead of being post-filtered out of the whole corpus.
+    """
     qvec = embed_query(q)  # 384-dim normalized vector (MiniLM-L6-v2)
+    use_rerank = rerank_enabled(rerank_hits)
+    size = candidate_window(k) if use_rerank else k
+    window = max(50, size)  # rank_window_size must be >= size
+    pre = filter_clauses(filters)
 
-    body = {
-        "size": k,
-        "retriever": {
-            "rrf": {
-                "retrievers": [
-                    {"standard": {"query": {"multi_match": {
-                        "query": q, "fields": ["text^2", "filename"], "type": "best_fields"
-                    }}}},
-                    {"standard": {"query": {"text_expansion": {
-                        "ml.tokens": {"model_id": ".elser_model_2", "model_text": q}
-                    }}}},
-                    {"knn": {"field": "vector", "query_vector": qvec, "k": 50, "num_candidates": 100}}
-                ],
-                "rank_window_size": 50,
-                "rank_constant": 60
-            }
-        },
-        "_source": ["filename", "drive_url", "chunk_id", "page_start", "page_end", "text"]
-        # DO NOT include "highlight" here — ES forbids highlighter with rank/RRF
-    }
-    resp = es.search(index=INDEX, body=body, request_timeout=30)
-    return format_hits(resp)
+    def build() -> Dict[str, Any]:
+        return {
+            "size": size,
+            "retriever": {
+                "rrf": {
+                    "retrievers": [
+                        {"standard": {"query": {"bool": {
+                            "must": {"multi_match": {"query": q, "fields": ["text^2", "filename"], "type": "best_fields"}},
+                            "filter": pre,
+                            "must_not": {"exists": {"field": "duplicate_of"}},
+                        }}}},
+                        {"standard": {"query": {"bool": {
+                            "must": elser_query(q),
+                            "filter": pre,
+                        }}}},
+                        {"knn": {"field": "vector", "query_vector": qvec, "k": window,
+                                 "num_candidates": num_candidates(window), "filter": pre}}
+                    ],
+                    "rank_window_size": window,
+                    "rank_constant": RRF_RANK_CONSTANT
+                }
+            },
+            "_source": _hit_source(use_rerank),
+            # DO NOT include "highlight" here — ES forbids highlighter with rank/RRF; _finish
+            # fetches highlighted snippets for the final top-k instead
+        }
+
+    index = search_index(filters)
+    resp, degraded = _search_or_bm25("hybrid", build, q, size, filters, use_rerank, index)
+    return _finish(q, resp, k, use_rerank, index, qvec if _want_cosine(cosine, "hybrid") else None, degraded)
 
 
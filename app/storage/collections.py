@@ -0,0 +1,76 @@
+# app/storage/collections.py
+"""
+Collections (tenants / document sets) and which index each one lives in.
+
+Every chunk carries a `collection` keyword (Drive folder id, local directory name, or an explicit
+--collection). Small collections share ELASTIC_INDEX_NAME and are separated by a filter; large
+ones can be routed to their own index so their queries never touch the rest of the corpus:
+
+    ELASTIC_COLLECTION_INDEXES="legal=rag_legal_v1,hr=rag_hr_v1"
+"""
+import os
+from typing import Any, Dict, List, Optional
+
+def default_index() -> str:
+    return os.getenv("ELASTIC_INDEX_NAME", "rag_documents_v1")
+
+def collection_indexes() -> Dict[str, str]:
+    """collection -> dedicated index, from ELASTIC_COLLECTION_INDEXES ("name=index,name=index")."""
+    out: Dict[str, str] = {}
+    for item in os.getenv("ELASTIC_COLLECTION_INDEXES", "").split(","):
+        name, sep, index = item.partition("=")
+        if sep and name.strip() and index.strip():
+            out[name.strip()] = index.strip()
+    return out
+
+def index_for(collection: Optional[str]) -> str:
+    """Index a collection's chunks are written to."""
+    if collection:
+        return collection_indexes().get(collection, default_index())
+    return default_index()
+
+def _as_list(value: Any) -> List[str]:
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple, set)):
+        return [str(v) for v in value]
+    return [str(value)]
+
+def search_index(filters: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Index expression to search: only the indexes holding the requested collections, or every
+    known index when the query isn't restricted to a collection.
+    """
+    routed = collection_indexes()
+    wanted = _as_list((filters or {}).get("collection"))
+    indexes = [index_for(c) for c in wanted] if wanted else [default_index(), *routed.values()]
+    return ",".join(dict.fromkeys(indexes))  # de-dupe, keep order
+
+FILTER_KEYS = ("collection", "file_id", "filename", "ingested_after", "ingested_before")
+
+def filter_clauses(filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """
+    Structured filters -> ES filter clauses, shared by the BM25, ELSER and kNN legs.
+      collection / file_id / filename: a value or a list of values (exact keyword match)
+      ingested_after / ingested_before: ISO dates, inclusive
+    """
+    filters = {k: v for k, v in (filters or {}).items() if v not in (None, "", [])}
+    unknown = set(filters) - set(FILTER_KEYS)
+    if unknown:
+        raise ValueError(f"unknown filter(s) {sorted(unknown)}; allowed: {', '.join(FILTER_KEYS)}")
+
+    clauses: List[Dict[str, Any]] = []
+    for field in ("collection", "file_id", "filename"):
+        values = _as_list(filters.get(field))
+        if len(values) == 1:
+            clauses.append({"term": {field: values[0]}})
+        elif values:
+            clauses.append({"terms": {field: values}})
+    date_range = {}
+    if filters.get("ingested_after"):
+        date_range["gte"] = filters["ingested_after"]
+    if filters.get("ingested_before"):
+        date_range["lte"] = filters["ingested_before"]
+    if date_range:
+        clauses.append({"range": {"ingested_at": date_range}})
+    return clauses
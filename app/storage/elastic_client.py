@@ -1,9 +1,12 @@
 # app/storage/elastic_client.py
-from elasticsearch import Elasticsearch
-from typing import Optional
+from typing import Optional, TYPE_CHECKING
 import os
 
-def make_es() -> Elasticsearch:
+if TYPE_CHECKING:
+    from elasticsearch import Elasticsearch
+
+def make_es() -> "Elasticsearch":
+    from elasticsearch import Elasticsearch
     url = os.getenv("ELASTIC_URL", "http://localhost:9200")
     user = os.getenv("ELASTIC_USERNAME", "elastic")
     pwd = os.getenv("ELASTIC_PASSWORD", "changeme")
@@ -1,5 +1,29 @@
 # app/storage/index_mapping.py
-def rag_index_mapping(dims: int = 384) -> dict:
+import os
+from typing import Any, Dict, Optional
+
+# hnsw (float32) | int8_hnsw (ES default since 8.14, ~4x smaller) | int4_hnsw (~8x) |
+# bbq_hnsw (1 bit/dim, ~32x, ES 8.16+) | flat / int8_flat (brute force, for small indexes)
+VECTOR_INDEX_TYPES = ("hnsw", "int8_hnsw", "int4_hnsw", "bbq_hnsw", "flat", "int8_flat", "int4_flat")
+
+def vector_index_options(
+    index_type: Optional[str] = None, m: Optional[int] = None, ef_construction: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    dense_vector index_options from VECTOR_INDEX_TYPE / HNSW_M / HNSW_EF_CONSTRUCTION.
+    Quantized types keep the float vectors on disk for rescoring; only the HNSW graph and the
+    in-memory vector copies shrink.
+    """
+    index_type = (index_type or os.getenv("VECTOR_INDEX_TYPE", "int8_hnsw")).lower()
+    if index_type not in VECTOR_INDEX_TYPES:
+        raise ValueError(f"unknown VECTOR_INDEX_TYPE {index_type!r} ({' | '.join(VECTOR_INDEX_TYPES)})")
+    opts: Dict[str, Any] = {"type": index_type}
+    if index_type.endswith("hnsw"):
+        opts["m"] = m or int(os.getenv("HNSW_M", "16"))
+        opts["ef_construction"] = ef_construction or int(os.getenv("HNSW_EF_CONSTRUCTION", "100"))
+    return opts
+
+def rag_index_mapping(dims: int = 384, index_options: Optional[Dict[str, Any]] = None) -> dict:
     return {
         "mappings": {
             "properties": {
@@ -9,7 +33,8 @@ def rag_index_mapping(dims: int = 384) -> dict:
                     "type": "dense_vector",
                     "dims": dims,
                     "index": True,
-                    "similarity": "cosine"
+                    "similarity": "cosine",
+                    "index_options": index_options or vector_index_options(),
                 },
                 "ml": {                              # ELSER tokens
                     "properties": {
@@ -22,8 +47,10 @@ def rag_index_mapping(dims: int = 384) -> dict:
                 "filename":  {"type": "keyword"},
                 "drive_url": {"type": "keyword"},
                 "chunk_id":  {"type": "keyword"},
+                "collection":{"type": "keyword"},    # tenant / document set, used as a pre-filter
                 "page_start":{"type": "integer"},
                 "page_end":  {"type": "integer"},
+                "duplicate_of": {"type": "keyword"},  # set on linked near-duplicates (metadata only)
                 "ingested_at":{"type": "date"}
             }
         }
@@ -1,21 +1,51 @@
 # ui/streamlit_app.py
+import json
 import os
 import requests
 import textwrap
+import time
+from collections import OrderedDict
+from requests.adapters import HTTPAdapter
 import streamlit as st
 
 st.set_page_config(page_title="Elastic RAG", page_icon="📚", layout="wide")
 
 # ---- Config ----
 DEFAULT_API_BASE = os.getenv("RAG_API_BASE", "http://localhost:8000")
+HEALTH_TTL = float(os.getenv("RAG_UI_HEALTH_TTL", "30"))  # seconds between /healthz probes
+ANSWER_CACHE_SIZE = 50  # (q, mode, k) results kept per browser session
+ANSWER_TTL = float(os.getenv("RAG_UI_ANSWER_TTL", "600"))  # seconds a cached answer is shown before re-asking
+QUERY_TIMEOUT = (5, 120)  # connect, read (for streaming: the longest gap between tokens)
 
 # ---- Helpers ----
 def api_base() -> str:
     return st.session_state.get("api_base", DEFAULT_API_BASE).rstrip("/")
 
-def healthcheck():
+@st.cache_resource
+def http_adapter() -> HTTPAdapter:
+    """One keep-alive connection pool for the whole Streamlit server (shared across reruns and users)."""
+    return HTTPAdapter(pool_connections=4, pool_maxsize=32)
+
+_session = None
+
+def http_session() -> requests.Session:
+    """
+    A Session for this script run, on the shared pool. Sessions (cookie jar, mounted adapters)
+    aren't thread-safe, and every user's reruns run in their own thread; the module is
+    re-executed per run, so this is created once per run.
+    """
+    global _session
+    if _session is None:
+        _session = requests.Session()
+        _session.mount("http://", http_adapter())
+        _session.mount("https://", http_adapter())
+    return _session
+
+@st.cache_data(ttl=HEALTH_TTL, show_spinner=False)
+def healthcheck(base: str):
+    """/healthz probes ES and Ollama; reruns (every widget interaction) reuse it for HEALTH_TTL."""
     try:
-        r = requests.get(f"{api_base()}/healthz", timeout=5)
+        r = http_session().get(f"{base}/healthz", timeout=5)
         r.raise_for_status()
         return r.json()
     except Exception as e:
@@ -23,13 +53,56 @@ def healthcheck():
 
 def call_query(q: str, mode: str, k: int):
     payload = {"q": q, "k": int(k), "mode": mode}
-    r = requests.post(f"{api_base()}/query", json=payload, timeout=120)
+    r = http_session().post(f"{api_base()}/query", json=payload, timeout=QUERY_TIMEOUT)
     r.raise_for_status()
     return r.json()
 
+def stream_query(q: str, mode: str, k: int, out: dict):
+    """
+    Yield answer pieces from /query/stream as they are generated; `out` receives the citations
+    (before the first piece) and the final answer. Falls back to /query on an API without it.
+    """
+    payload = {"q": q, "k": int(k), "mode": mode}
+    with http_session().post(f"{api_base()}/query/stream", json=payload, stream=True, timeout=QUERY_TIMEOUT) as r:
+        if r.status_code == 404:
+            out.update(call_query(q, mode, k))
+            yield out.get("answer", "")
+            return
+        r.raise_for_status()
+        for line in r.iter_lines():
+            if not line:
+                continue
+            msg = json.loads(line)
+            if msg["type"] == "meta":
+                out.update(citations=msg.get("citations", []), degraded=msg.get("degraded"))
+            elif msg["type"] == "token":
+                yield msg["text"]
+            elif msg["type"] == "done":
+                out["answer"] = msg["answer"]
+            elif msg["type"] == "error":
+                raise RuntimeError(msg["message"])
+
+def cached_answer(key):
+    answers = st.session_state.setdefault("answers", OrderedDict())
+    entry = answers.get(key)
+    if entry is None:
+        return None
+    stored_at, out = entry
+    if time.monotonic() - stored_at > ANSWER_TTL:
+        del answers[key]
+        return None
+    return out
+
+def remember_answer(key, out: dict) -> None:
+    answers = st.session_state.setdefault("answers", OrderedDict())
+    answers[key] = (time.monotonic(), out)
+    answers.move_to_end(key)
+    while len(answers) > ANSWER_CACHE_SIZE:
+        answers.popitem(last=False)
+
 def call_ingest(limit: int = 20, reindex: bool = True):
     payload = {"limit": int(limit), "reindex": bool(reindex)}
-    r = requests.post(f"{api_base()}/ingest", json=payload, timeout=3600)
+    r = http_session().post(f"{api_base()}/ingest", json=payload, timeout=3600)
     r.raise_for_status()
     return r.json()
 
@@ -38,6 +111,86 @@ def short_snippet(cite: dict, max_len: int = 240) -> str:
     s = " ".join(s.split())
     return (s[:max_len] + "…") if len(s) > max_len else s
 
+def render_answer(out: dict, answer_slot=None):
+    answer = out.get("answer", "")
+    citations = out.get("citations", [])
+
+    if answer_slot is None:
+        st.markdown("### ✅ Answer")
+        if answer:
+            st.markdown(answer)
+        else:
+            st.info("No answer returned.")
+    if out.get("degraded"):
+        st.caption(f"Search ran in degraded mode ({out['degraded']}); results may be less relevant.")
+
+    # Render citations
+    st.markdown("### 🔗 Citations")
+    if not citations:
+        st.caption("No citations returned.")
+    else:
+        for i, c in enumerate(citations, start=1):
+            title = c.get("filename") or c.get("title") or f"Citation {i}"
+            url = c.get("drive_url") or c.get("url") or c.get("link") or "#"
+            page_range = None
+            ps, pe = (c.get("page_range") or [c.get("page_start"), c.get("page_end")])[:2]
+            if ps and pe:
+                page_range = f"(pp. {ps}–{pe})" if ps != pe else f"(p. {ps})"
+
+            meta_bits = []
+            if page_range: meta_bits.append(page_range)
+            chunk_id = c.get("chunk_id")
+            if chunk_id: meta_bits.append(f"chunk {chunk_id}")
+
+            meta = "  •  ".join(meta_bits) if meta_bits else ""
+            left, right = st.columns([0.75, 0.25])
+
+            with left:
+                st.markdown(f"**[{title}]({url})**  {meta}")
+                snip = short_snippet(c)
+                if snip:
+                    st.markdown("> " + textwrap.fill(snip, 100))
+
+            with right:
+                if url and url != "#":
+                    st.link_button("Open", url)
+
+        with st.expander("Raw response"):
+            st.json(out)
+
+def ask(q: str, mode: str, k: int) -> None:
+    """Stream a new answer into the page, or show the session's cached one for the same (q, mode, k)."""
+    key = (api_base(), q, mode, int(k))
+    st.session_state["last_key"] = key
+    out = cached_answer(key)
+    if out is not None:
+        render_answer(out)
+        return
+
+    st.markdown("### ✅ Answer")
+    slot = st.empty()
+    out = {}
+    text = ""
+    try:
+        with st.spinner("Searching…"):
+            pieces = stream_query(q, mode, k, out)
+            first = next(pieces, "")  # retrieval happens before the first piece
+        text = first
+        slot.markdown(text or "…")
+        for piece in pieces:
+            text += piece
+            slot.markdown(text + " ▌")
+    except requests.HTTPError as e:
+        st.error(f"API error: {e.response.text}")
+        return
+    except Exception as e:
+        st.error(f"Request failed: {e}")
+        return
+    out["answer"] = (out.get("answer") or text).strip()
+    slot.markdown(out["answer"] or "_No answer returned._")
+    remember_answer(key, out)
+    render_answer(out, answer_slot=slot)
+
 # ---- Sidebar ----
 with st.sidebar:
     st.markdown("## ⚙️ Settings")
@@ -48,7 +201,9 @@ with st.sidebar:
 
     st.markdown("---")
     st.markdown("### 🩺 Health")
-    hc = healthcheck()
+    if st.button("Refresh", key="refresh_health"):
+        healthcheck.clear()
+    hc = healthcheck(api_base())
     if "error" in hc:
         st.error(f"API unreachable: {hc['error']}")
     else:
@@ -63,6 +218,9 @@ with st.sidebar:
             with st.spinner("Ingesting…"):
                 try:
                     resp = call_ingest(limit=limit, reindex=do_reindex)
+                    # the index changed, so cached answers may cite stale or missing chunks
+                    st.session_state.pop("answers", None)
+                    st.session_state.pop("last_key", None)
                     st.success("Ingest kicked off / completed")
                     st.json(resp)
                 except requests.HTTPError as e:
@@ -77,60 +235,14 @@ st.caption("Ask a question about your indexed documents. Answers are generated v
 with st.form("ask"):
     q = st.text_area("Your question", height=100, placeholder="e.g. Who are the main characters in Two Little Soldiers?")
     submitted = st.form_submit_button("Ask")
-    if submitted:
-        if not q.strip():
-            st.warning("Please enter a question.")
-        else:
-            with st.spinner("Thinking…"):
-                try:
-                    out = call_query(q=q.strip(), mode=mode, k=k)
-                except requests.HTTPError as e:
-                    st.error(f"API error: {e.response.text}")
-                    st.stop()
-                except Exception as e:
-                    st.error(f"Request failed: {e}")
-                    st.stop()
-
-            # Render answer
-            answer = out.get("answer", "")
-            citations = out.get("citations", [])
-
-            st.markdown("### ✅ Answer")
-            if answer:
-                st.markdown(answer)
-            else:
-                st.info("No answer returned.")
-
-            # Render citations
-            st.markdown("### 🔗 Citations")
-            if not citations:
-                st.caption("No citations returned.")
-            else:
-                for i, c in enumerate(citations, start=1):
-                    title = c.get("filename") or c.get("title") or f"Citation {i}"
-                    url = c.get("drive_url") or c.get("url") or c.get("link") or "#"
-                    page_range = None
-                    ps, pe = c.get("page_start"), c.get("page_end")
-                    if ps and pe:
-                        page_range = f"(pp. {ps}–{pe})" if ps != pe else f"(p. {ps})"
-
-                    meta_bits = []
-                    if page_range: meta_bits.append(page_range)
-                    chunk_id = c.get("chunk_id")
-                    if chunk_id: meta_bits.append(f"chunk {chunk_id}")
-
-                    meta = "  •  ".join(meta_bits) if meta_bits else ""
-                    left, right = st.columns([0.75, 0.25])
-
-                    with left:
-                        st.markdown(f"**[{title}]({url})**  {meta}")
-                        snip = short_snippet(c)
-                        if snip:
-                            st.markdown("> " + textwrap.fill(snip, 100))
-
-                    with right:
-                        if url and url != "#":
-                            st.link_button("Open", url)
-
-                with st.expander("Raw response"):
-                    st.json(out)
+
+if submitted:
+    if not q.strip():
+        st.warning("Please enter a question.")
+    else:
+        ask(q.strip(), mode, k)
+elif st.session_state.get("last_key"):
+    # any other widget interaction reruns the script; keep showing the last answer without a request
+    last = cached_answer(st.session_state["last_key"])
+    if last is not None:
+        render_answer(last)
@@ -0,0 +1,105 @@
+# app/utils/batching.py
+"""
+Dynamic micro-batching for a function that is much cheaper per item in bulk (a model forward pass).
+
+Callers submit one item and block on a Future; a single worker thread takes the first waiting
+item, keeps collecting for up to `max_wait_ms` or until `max_batch` items are queued, runs
+fn(items) once and resolves every caller's future with its own result. Items that arrive while a
+batch is running are picked up by the next one without waiting again. The wait window is only
+opened when the previous batch had company, so a lone caller on an idle server runs immediately.
+
+    batcher = MicroBatcher(model_encode, max_batch=32, max_wait_ms=2, name="embed")
+    vec = batcher.submit("query text").result()
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, List, Sequence, Tuple
+
+from app.utils import metrics
+from app.utils.logging import get_logger
+from app.utils.metrics import observe, span
+
+log = get_logger(__name__)
+
+BATCH_SIZE = metrics.histogram(
+    "rag_batch_size", "Items per micro-batch", buckets=(1, 2, 4, 8, 16, 32, 64, 128),
+)
+
+_STOP = object()
+
+
+class MicroBatcher:
+    def __init__(self, fn: Callable[[List[Any]], Sequence[Any]], max_batch: int = 32,
+                 max_wait_ms: float = 2.0, name: str = "batch"):
+        self.fn = fn
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.name = name
+        self._q: "queue.Queue[Any]" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name=f"{name}-batcher", daemon=True)
+        self._closed = False
+        self._last_size = 0
+        self._thread.start()
+
+    def submit(self, item: Any) -> Future:
+        if self._closed:
+            raise RuntimeError(f"{self.name} batcher is closed")
+        fut: Future = Future()
+        self._q.put((item, fut, time.perf_counter()))
+        return fut
+
+    def __call__(self, item: Any, timeout: float | None = None) -> Any:
+        return self.submit(item).result(timeout)
+
+    def close(self) -> None:
+        """Stop the worker after the items already queued have been served."""
+        if not self._closed:
+            self._closed = True
+            self._q.put(_STOP)
+            self._thread.join(timeout=5)
+
+    # ---------- worker ----------
+    def _collect(self, first) -> Tuple[List[Any], bool]:
+        batch, stop = [first], False
+        wait = self.max_wait if self._last_size > 1 else 0.0
+        deadline = time.perf_counter() + wait
+        while len(batch) < self.max_batch:
+            try:
+                # whatever is already queued is taken without waiting
+                nxt = self._q.get_nowait() if self._q.qsize() else \
+                    self._q.get(timeout=max(0.0, deadline - time.perf_counter()))
+            except queue.Empty:
+                break
+            if nxt is _STOP:
+                stop = True
+                break
+            batch.append(nxt)
+        return batch, stop
+
+    def _run(self) -> None:
+        while True:
+            first = self._q.get()
+            if first is _STOP:
+                return
+            batch, stop = self._collect(first)
+            self._last_size = len(batch)
+            started = time.perf_counter()
+            for _, _, enqueued in batch:
+                observe(f"{self.name}_queue", started - enqueued)
+            BATCH_SIZE.observe(len(batch), batcher=self.name)
+            try:
+                with span(f"{self.name}_batch"):
+                    results = self.fn([item for item, _, _ in batch])
+                if len(results) != len(batch):
+                    raise RuntimeError(f"{self.name}: {len(results)} results for {len(batch)} items")
+            except BaseException as e:  # every waiting caller gets the error, the worker lives on
+                log.exception("%s batch of %d failed", self.name, len(batch))
+                for _, fut, _ in batch:
+                    fut.set_exception(e)
+            else:
+                for (_, fut, _), res in zip(batch, results):
+                    fut.set_result(res)
+            if stop:
+                return
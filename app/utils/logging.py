@@ -0,0 +1,17 @@
+# app/utils/logging.py
+import logging
+import os
+
+_configured = False
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Module logger; configures the root handler once from LOG_LEVEL (default INFO)."""
+    global _configured
+    if not _configured:
+        logging.basicConfig(
+            level=os.getenv("LOG_LEVEL", "INFO").upper(),
+            format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+        )
+        _configured = True
+    return logging.getLogger(name)
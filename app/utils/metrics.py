@@ -0,0 +1,281 @@
+# app/utils/metrics.py
+"""
+Tiny in-process instrumentation: span/timer context managers + Prometheus text exposition.
+
+    with span("embed"):                       # times the block into rag_stage_seconds{stage="embed"}
+        vec = embed_query(q)
+
+    @timed("prompt_build")                    # same thing as a decorator
+    def make_prompt(...): ...
+
+    observe("llm_prefill", 0.84)              # a duration measured elsewhere (e.g. Ollama's own timings)
+    inc("rag_queries_total", mode="hybrid")   # counters
+
+Spans nest (parent/child via contextvars) and, inside trace_request(), are collected per request
+so the API can report them (Server-Timing header). With METRICS_ENABLED=0 every helper returns a
+shared no-op object, so the disabled cost is one attribute lookup and a branch.
+"""
+import bisect
+import contextvars
+import functools
+import os
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from app.utils.logging import get_logger
+
+ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+
+# Prometheus-style latency buckets (seconds), 1ms .. 2min
+DEFAULT_BUCKETS: Tuple[float, ...] = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0,
+)
+
+log = get_logger("app.trace")
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _fmt_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    items = list(key) + ([extra] if extra else [])
+    if not items:
+        return ""
+    body = ",".join('%s="%s"' % (k, v.replace("\\", "\\\\").replace('"', '\\"')) for k, v in items)
+    return "{" + body + "}"
+
+
+def _fmt_num(x: float) -> str:
+    if x == float("inf"):
+        return "+Inf"
+    return repr(float(x)) if not float(x).is_integer() else str(int(x))
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        # label key -> [bucket counts..., +Inf count], sum
+        self._series: Dict[LabelKey, List[Any]] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = _label_key(labels)
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            s = self._series.get(key)
+            if s is None:
+                s = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            s[0][idx] += 1
+            s[1] += value
+
+    def snapshot(self) -> Dict[LabelKey, Tuple[List[int], float]]:
+        with self._lock:
+            return {k: (list(v[0]), v[1]) for k, v in self._series.items()}
+
+    def render(self) -> List[str]:
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total) in sorted(self.snapshot().items()):
+            cum = 0
+            for le, c in zip(self.buckets + (float("inf"),), counts):
+                cum += c
+                out.append(f"{self.name}_bucket{_fmt_labels(key, ('le', _fmt_num(le)))} {cum}")
+            out.append(f"{self.name}_sum{_fmt_labels(key)} {total}")
+            out.append(f"{self.name}_count{_fmt_labels(key)} {cum}")
+        return out
+
+
+class Counter:
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._lock = threading.Lock()
+        self._series: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0.0) + amount
+
+    def value(self, **labels: Any) -> float:
+        return self._series.get(_label_key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._series.items())
+        out.extend(f"{self.name}{_fmt_labels(k)} {_fmt_num(v)}" for k, v in items)
+        return out
+
+
+class Gauge(Counter):
+    def set(self, value: float, **labels: Any) -> None:
+        with self._lock:
+            self._series[_label_key(labels)] = value
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        lines[1] = f"# TYPE {self.name} gauge"
+        return lines
+
+
+_registry: Dict[str, Any] = {}
+_registry_lock = threading.Lock()
+
+
+def _get_or_create(cls, name: str, help: str, **kw):
+    with _registry_lock:
+        m = _registry.get(name)
+        if m is None:
+            m = _registry[name] = cls(name, help, **kw)
+        return m
+
+
+def histogram(name: str, help: str = "", buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+    return _get_or_create(Histogram, name, help, buckets=buckets)
+
+
+def counter(name: str, help: str = "") -> Counter:
+    return _get_or_create(Counter, name, help)
+
+
+def gauge(name: str, help: str = "") -> Gauge:
+    return _get_or_create(Gauge, name, help)
+
+
+def render_prometheus() -> str:
+    with _registry_lock:
+        metrics = list(_registry.values())
+    lines: List[str] = []
+    for m in sorted(metrics, key=lambda m: m.name):
+        lines.extend(m.render())
+    return "\n".join(lines) + "\n"
+
+
+STAGE_SECONDS = histogram("rag_stage_seconds", "Wall time per pipeline stage")
+
+# ---------- spans ----------
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("rag_span", default=None)
+_current_trace: contextvars.ContextVar[Optional[List[Dict[str, Any]]]] = contextvars.ContextVar("rag_trace", default=None)
+
+
+class Span:
+    """OpenTelemetry-shaped span: name, attributes, trace/span/parent ids, start + duration."""
+
+    __slots__ = ("name", "labels", "attrs", "trace_id", "span_id", "parent_id", "start", "duration", "_t0", "_token")
+
+    def __init__(self, name: str, **labels: Any):
+        self.name = name
+        self.labels = labels
+        self.attrs: Dict[str, Any] = {}
+
+    def set(self, key: str, value: Any) -> None:
+        self.attrs[key] = value
+
+    def __enter__(self) -> "Span":
+        parent = _current_span.get()
+        self.parent_id = parent.span_id if parent else None
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex
+        self.span_id = uuid.uuid4().hex[:16]
+        self.start = time.time()
+        self._token = _current_span.set(self)
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.duration = time.perf_counter() - self._t0
+        _current_span.reset(self._token)
+        STAGE_SECONDS.observe(self.duration, stage=self.name, **self.labels)
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.append(self.to_dict())
+        log.debug("span %s %.2fms %s", self.name, self.duration * 1000.0, self.attrs or "")
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start": self.start,
+            "duration_ms": round(self.duration * 1000.0, 3),
+            "attributes": {**self.labels, **self.attrs},
+        }
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def set(self, key: str, value: Any) -> None:
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+def span(name: str, **labels: Any):
+    """Time a block as stage `name`; labels become Prometheus labels and span attributes."""
+    if not ENABLED:
+        return _NOOP
+    return Span(name, **labels)
+
+
+def timed(name: str, **labels: Any):
+    """Decorator form of span()."""
+    def deco(fn):
+        if not ENABLED:
+            return fn
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with Span(name, **labels):
+                return fn(*args, **kwargs)
+        return wrapper
+    return deco
+
+
+def observe(name: str, seconds: float, **labels: Any) -> None:
+    """Record an externally measured stage duration."""
+    if ENABLED:
+        STAGE_SECONDS.observe(seconds, stage=name, **labels)
+
+
+def inc(name: str, amount: float = 1.0, help: str = "", **labels: Any) -> None:
+    if ENABLED:
+        counter(name, help).inc(amount, **labels)
+
+
+class trace_request:
+    """Collects every span finished inside the block; `.spans` is the list afterwards."""
+
+    def __init__(self):
+        self.spans: List[Dict[str, Any]] = []
+        self._token = None
+
+    def __enter__(self) -> "trace_request":
+        self._token = _current_trace.set(self.spans)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        _current_trace.reset(self._token)
+
+    def server_timing(self) -> str:
+        """Server-Timing header value summing durations per stage name."""
+        totals: Dict[str, float] = {}
+        for s in self.spans:
+            totals[s["name"]] = totals.get(s["name"], 0.0) + s["duration_ms"]
+        return ", ".join(f"{name};dur={ms:.1f}" for name, ms in totals.items())
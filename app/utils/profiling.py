@@ -0,0 +1,309 @@
+# app/utils/profiling.py
+"""
+Opt-in profiling for the API, switchable at runtime without a redeploy.
+
+Per-request profiles. A request is profiled when:
+  - it carries `X-Profile: <PROFILE_TOKEN>` (the header is ignored while PROFILE_TOKEN is unset:
+    a profiled request holds the process-wide profiler and costs cProfile overhead), or
+  - it is picked by PROFILE_SAMPLE_RATE (default 0, e.g. 0.01 profiles 1% of requests).
+
+The endpoint body runs under cProfile, or pyinstrument when it is installed and
+PROFILE_BACKEND=pyinstrument. The profile is kept in a ring of the last PROFILE_KEEP (default 50)
+and its id is returned in the X-Profile-Id header. Only one request is profiled at a time, since
+the profiler hooks are process-wide state; a request that arrives while another is profiled runs
+normally.
+
+    with profiling.request_scope(request.headers, path) as scope:   # middleware: decides
+        response = await call_next(request)
+
+    @profiling.profiled                                          # endpoint: profiles its thread
+    def query(body: QueryIn): ...
+
+Continuous sampling. A daemon thread reads sys._current_frames() every PROFILE_SAMPLER_INTERVAL_MS
+(default 10) and counts collapsed stacks ("module:function;module:function;..."). It runs when
+the API starts with PROFILE_SAMPLER=1, or after sampler.start(). Idle threads are left out: pool
+workers waiting for work, and the event loop in select(). Threads blocked in socket reads inside
+app code are kept, so I/O waits show up next to Python time. The cost is one frame walk per thread per tick, about
+1% of a core at 100 Hz. collapsed() output loads into speedscope or flamegraph.pl.
+"""
+import cProfile
+import contextvars
+import functools
+import hmac
+import io
+import itertools
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+from collections import Counter, deque
+from typing import Any, Deque, Dict, List, Mapping, Optional
+
+from app.utils.logging import get_logger
+from app.utils.metrics import inc
+
+log = get_logger(__name__)
+
+SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+KEEP = int(os.getenv("PROFILE_KEEP", "50"))
+BACKEND = os.getenv("PROFILE_BACKEND", "cprofile").lower()
+SAMPLER_INTERVAL = float(os.getenv("PROFILE_SAMPLER_INTERVAL_MS", "10")) / 1000.0
+TOP_N = 30
+
+_IDLE_LEAVES = frozenset({"wait", "select", "poll", "_wait_for_tstate_lock", "_worker", "worker"})
+
+
+# ---------- per-request profiles ----------
+class Scope:
+    """One request's profiling decision; the endpoint fills in `profile_id` if it ran profiled."""
+
+    __slots__ = ("path", "trigger", "profile_id", "running")
+
+    def __init__(self, path: str, trigger: Optional[str]):
+        self.path = path
+        self.trigger = trigger
+        self.profile_id: Optional[str] = None
+        self.running = False  # the endpoint is under the profiler right now
+
+
+_scope: contextvars.ContextVar[Optional[Scope]] = contextvars.ContextVar("rag_profile_scope", default=None)
+_profiles: Deque[Dict[str, Any]] = deque(maxlen=KEEP)
+_profiles_lock = threading.Lock()
+_active = threading.Lock()  # one profiled request at a time
+_ids = itertools.count(1)
+
+
+def _trigger(headers: Mapping[str, str]) -> Optional[str]:
+    value = headers.get("x-profile")
+    token = os.getenv("PROFILE_TOKEN")
+    if value and token and hmac.compare_digest(value.encode(), token.encode()):
+        return "header"
+    if SAMPLE_RATE > 0 and random.random() < SAMPLE_RATE:
+        return "sample"
+    return None
+
+
+class request_scope:
+    """Middleware side: decide whether this request is profiled; `.scope.profile_id` afterwards."""
+
+    def __init__(self, headers: Mapping[str, str], path: str):
+        self.scope = Scope(path, _trigger(headers))
+        self._token = None
+
+    def __enter__(self) -> Scope:
+        self._token = _scope.set(self.scope)
+        return self.scope
+
+    def __exit__(self, *exc) -> None:
+        _scope.reset(self._token)
+
+
+def active() -> bool:
+    """
+    Is the calling context's request being profiled right now? The profiler only sees its own
+    thread, so work that would normally be handed to a pool (ES hedging) runs inline instead.
+    """
+    scope = _scope.get()
+    return scope is not None and scope.running
+
+
+def _backend() -> str:
+    if BACKEND == "pyinstrument":
+        try:
+            import pyinstrument  # noqa: F401  (optional dependency)
+            return "pyinstrument"
+        except ImportError:
+            log.warning("PROFILE_BACKEND=pyinstrument but pyinstrument isn't installed; using cProfile")
+    return "cprofile"
+
+
+def _cprofile_report(prof: cProfile.Profile) -> Dict[str, Any]:
+    stats = pstats.Stats(prof)
+    top = []
+    for (filename, line, func), (cc, nc, tt, ct, _) in stats.stats.items():  # type: ignore[attr-defined]
+        top.append({"function": f"{_short(filename)}:{line}({func})", "calls": nc,
+                    "tottime_ms": round(tt * 1000.0, 3), "cumtime_ms": round(ct * 1000.0, 3)})
+    top.sort(key=lambda r: r["tottime_ms"], reverse=True)
+    buf = io.StringIO()
+    pstats.Stats(prof, stream=buf).sort_stats("cumulative").print_stats(TOP_N)
+    return {"top": top[:TOP_N], "text": buf.getvalue(), "pstats": prof}
+
+
+def _run_profiled(backend: str, fn, args, kwargs, report: Dict[str, Any]):
+    """Call fn under the profiler; the report (top functions, text, ...) is written into `report`."""
+    if backend == "pyinstrument":
+        from pyinstrument import Profiler
+        prof = Profiler(interval=0.001, async_mode="disabled")
+        prof.start()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            prof.stop()
+            report.update(text=prof.output_text(unicode=True, color=False), html=prof.output_html())
+    prof = cProfile.Profile()
+    prof.enable()
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        prof.disable()
+        report.update(_cprofile_report(prof))
+
+
+def profiled(fn):
+    """Endpoint decorator: run the (sync) endpoint under the profiler when its request asked for it."""
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        scope = _scope.get()
+        if scope is None or scope.trigger is None:
+            return fn(*args, **kwargs)
+        if not _active.acquire(blocking=False):
+            inc("rag_profiles_skipped_total", help="Profiling requests skipped because another was in progress")
+            return fn(*args, **kwargs)
+        backend = _backend()
+        report: Dict[str, Any] = {}
+        t0, started = time.perf_counter(), time.time()
+        scope.running = True
+        try:
+            return _run_profiled(backend, fn, args, kwargs, report)
+        finally:
+            scope.running = False
+            _active.release()
+            pid = f"p{next(_ids)}"
+            with _profiles_lock:
+                _profiles.append({
+                    "id": pid, "path": scope.path, "trigger": scope.trigger, "backend": backend,
+                    "started": started, "duration_ms": round((time.perf_counter() - t0) * 1000.0, 2),
+                    "thread": threading.current_thread().name, **report,
+                })
+            scope.profile_id = pid
+            inc("rag_profiles_total", help="Requests profiled", trigger=scope.trigger)
+
+    return wrapper
+
+
+def list_profiles() -> List[Dict[str, Any]]:
+    """Summaries, newest first."""
+    with _profiles_lock:
+        items = list(_profiles)
+    return [{k: p[k] for k in ("id", "path", "trigger", "backend", "started", "duration_ms")}
+            | {"top": p.get("top", [])[:5]} for p in reversed(items)]
+
+
+def get_profile(pid: str) -> Optional[Dict[str, Any]]:
+    with _profiles_lock:
+        return next((p for p in _profiles if p["id"] == pid), None)
+
+
+def pstats_bytes(profile: Dict[str, Any]) -> Optional[bytes]:
+    """The raw pstats dump of a cProfile profile (for snakeviz / `python -m pstats`)."""
+    prof = profile.get("pstats")
+    if prof is None:
+        return None
+    import marshal
+    prof.create_stats()
+    return marshal.dumps(prof.stats)
+
+
+# ---------- continuous sampler ----------
+def _short(filename: str) -> str:
+    """app/retrieval/searcher.py instead of the absolute path; site-packages trimmed to the package."""
+    for marker in ("site-packages/", "dist-packages/"):
+        i = filename.rfind(marker)
+        if i >= 0:
+            return filename[i + len(marker):]
+    cwd = os.getcwd() + os.sep
+    return filename[len(cwd):] if filename.startswith(cwd) else os.path.basename(filename)
+
+
+class Sampler:
+    def __init__(self, interval: float = SAMPLER_INTERVAL, max_depth: int = 64):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.started: Optional[float] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._stop.clear()
+        self.started = time.time()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+        self._thread = None
+
+    def reset(self) -> None:
+        with self._lock:
+            self.stacks.clear()
+            self.samples = 0
+            self.started = time.time() if self.running else None
+
+    def _run(self) -> None:
+        me = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            if len(names) != len(frames):
+                names = {t.ident: t.name for t in threading.enumerate()}
+            tick = []
+            for ident, frame in frames.items():
+                if ident == me:
+                    continue
+                stack = self._collapse(frame)
+                if stack:
+                    tick.append(f"{names.get(ident, 'thread')};{stack}")
+            with self._lock:
+                self.samples += 1
+                self.stacks.update(tick)
+
+    def _collapse(self, frame) -> Optional[str]:
+        parts = []
+        in_app = False
+        leaf = frame.f_code.co_name
+        while frame is not None and len(parts) < self.max_depth:
+            code = frame.f_code
+            fname = _short(code.co_filename)
+            in_app = in_app or fname.startswith("app/")
+            parts.append(f"{fname}:{code.co_name}")
+            frame = frame.f_back
+        if leaf in _IDLE_LEAVES and not in_app:
+            return None  # a pool worker waiting for work, or the event loop in select()
+        return ";".join(reversed(parts))
+
+    def top(self, limit: int = 50) -> Dict[str, Any]:
+        """Hottest stacks plus self-time per leaf function, as fractions of all samples."""
+        with self._lock:
+            stacks, samples = self.stacks.copy(), self.samples
+        leaves: Counter = Counter()
+        for s, n in stacks.items():
+            leaves[s.rsplit(";", 1)[-1]] += n
+        scale = 1.0 / samples if samples else 0.0
+        return {
+            "running": self.running, "started": self.started, "samples": samples,
+            "interval_ms": self.interval * 1000.0,
+            "leaves": [{"function": f, "samples": n, "share": round(n * scale, 4)} for f, n in leaves.most_common(limit)],
+            "stacks": [{"stack": s, "samples": n, "share": round(n * scale, 4)} for s, n in stacks.most_common(limit)],
+        }
+
+    def collapsed(self) -> str:
+        """Brendan Gregg's collapsed format: "frame;frame;frame count" per line."""
+        with self._lock:
+            return "".join(f"{s} {n}\n" for s, n in self.stacks.most_common())
+
+
+sampler = Sampler()
@@ -6,11 +6,31 @@ from pydantic import Field
 class Settings(BaseSettings):
     # Google Drive
     gdrive_folder_id: Optional[str] = Field(None, alias="GDRIVE_FOLDER_ID")
-    gdrive_sa_json_path: str = Field(..., alias="GDRIVE_SERVICE_ACCOUNT_JSON_PATH")
+    # only needed by DriveClient; query-only processes and local-dir ingestion run without it
+    gdrive_sa_json_path: Optional[str] = Field(None, alias="GDRIVE_SERVICE_ACCOUNT_JSON_PATH")
 
     # Chunking
     chunk_size_tokens: int = Field(300, alias="CHUNK_SIZE_TOKENS")
     chunk_overlap_tokens: int = Field(60, alias="CHUNK_OVERLAP_TOKENS")
+    # "words" (str.split sizing) | "tokens" (model tokenizer) | "structure" (PDF blocks/sentences)
+    chunk_mode: str = Field("words", alias="CHUNK_MODE")
+    chunk_tokenizer: str = Field("sentence-transformers/all-MiniLM-L6-v2", alias="CHUNK_TOKENIZER")
+    chunk_max_model_tokens: int = Field(256, alias="CHUNK_MAX_MODEL_TOKENS")
+    # model-token stats in the ingestion report; always on in "tokens" / "structure" mode
+    chunk_token_stats: bool = Field(False, alias="CHUNK_TOKEN_STATS")
+
+    # PDF extraction
+    pdf_max_bytes: int = Field(200 * 1024 * 1024, alias="PDF_MAX_BYTES")   # 0 = no cap
+    pdf_max_pages: int = Field(5000, alias="PDF_MAX_PAGES")                # 0 = no cap
+    pdf_workers: int = Field(0, alias="PDF_WORKERS")                       # 0 = os.cpu_count()
+    pdf_parallel_min_pages: int = Field(200, alias="PDF_PARALLEL_MIN_PAGES")
+    pdf_pages_per_task: int = Field(50, alias="PDF_PAGES_PER_TASK")
+    pdf_fast_text: bool = Field(False, alias="PDF_FAST_TEXT")                # opt-in: cheaper flags, text differs
+
+    # Near-duplicate chunks: "off" | "drop" | "link"
+    dedup_mode: str = Field("off", alias="DEDUP_MODE")
+    dedup_threshold: float = Field(0.85, alias="DEDUP_THRESHOLD")
+    dedup_index_path: str = Field("./tmp/dedup_index.npz", alias="DEDUP_INDEX_PATH")
 
     class Config:
         env_file = ".env"
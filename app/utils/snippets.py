@@ -1,15 +1,86 @@
+import bisect
 import re
+from functools import lru_cache
+from typing import List, Optional, Pattern, Tuple
+
+_WORD = re.compile(r"\w+")
+_TAGS = re.compile(r"</?em>")
+# question words / fillers that would otherwise pull the window toward any "the ... and"
+_STOP = frozenset(
+    "the and for was with that this from are were what which who whom whose when where why how "
+    "does did has have had not but you your about into their there them they its can will".split()
+)
+
+@lru_cache(maxsize=1024)
+def _query_terms(query: str) -> Tuple[Tuple[str, ...], Optional[Pattern]]:
+    """Content terms of a query (> 2 chars, no stopwords) and their compiled alternation."""
+    terms = tuple(sorted({t for t in _WORD.findall(query.lower()) if len(t) > 2 and t not in _STOP},
+                         key=len, reverse=True))
+    if not terms:
+        return terms, None
+    return terms, re.compile(r"(?i)\b(?:" + "|".join(map(re.escape, terms)) + r")\b")
+
+def _term_offsets(text: str, terms: Tuple[str, ...], pattern: Pattern) -> List[int]:
+    """Sorted start offsets of whole-word term matches. str.find runs ~4x faster than finditer."""
+    low = text.lower()
+    if len(low) != len(text):  # lower() changed lengths (rare Unicode): offsets wouldn't line up
+        return [m.start() for m in pattern.finditer(text)]
+    n, out = len(low), []
+    for t in terms:
+        i = low.find(t)
+        while i != -1:
+            j = i + len(t)
+            if (i == 0 or not low[i - 1].isalnum()) and (j >= n or not low[j].isalnum()):
+                out.append(i)
+            i = low.find(t, j)
+    out.sort()
+    return out
+
+class SnippetBuilder:
+    """
+    Query-aware snippets for a whole result list: query terms are parsed and compiled once (and
+    cached across requests), and each text gets the `width`-char window holding the most query
+    terms, snapped to word boundaries.
+    """
+
+    def __init__(self, query: str, width: int = 200):
+        self.terms, self.pattern = _query_terms(query)
+        self.width = width
+
+    def window(self, text: str) -> str:
+        w = self.width
+        if len(text) <= w:
+            return text
+        starts = _term_offsets(text, self.terms, self.pattern) if self.pattern else []
+        if not starts:
+            cut = text.rfind(" ", 0, w)
+            return text[:cut if cut > 0 else w]
+        # the match whose window [s, s + w) covers the most matches
+        best = max(range(len(starts)), key=lambda i: bisect.bisect_left(starts, starts[i] + w) - i)
+        first = starts[best]
+        # start a little before the first match so it has some left context
+        start = max(0, min(first - w // 8, len(text) - w))
+        if start:
+            sp = text.find(" ", start)
+            start = sp + 1 if 0 <= sp < first else start
+        end = min(len(text), start + w)
+        if end < len(text):
+            sp = text.rfind(" ", start, end)
+            end = sp if sp > start else end
+        return text[start:end]
+
+    def build(self, texts: List[str]) -> List[str]:
+        return [self.window(t or "") for t in texts]
+
+    def mark(self, snippet: str) -> str:
+        if not self.pattern:
+            return snippet
+        return self.pattern.sub(lambda m: f"<mark>{m.group(0)}</mark>", snippet)
+
+def strip_highlight(fragment: str) -> str:
+    """ES highlight fragment -> plain text (default <em> tags removed)."""
+    return _TAGS.sub("", fragment)
 
 def make_snippet(text: str, query: str, width: int = 140) -> str:
-    tokens = [re.escape(t) for t in re.findall(r"\w+", query.lower()) if len(t) > 2]
-    if not tokens:
-        return text[:width]
-    pattern = re.compile(r"(?i)\b(" + "|".join(tokens) + r")\b")
-    m = pattern.search(text)
-    if not m:
-        return text[:width]
-    start = max(0, m.start() - width // 2)
-    end = min(len(text), start + width)
-    snippet = text[start:end]
-    # optional mark
-    return pattern.sub(lambda mm: f"<mark>{mm.group(0)}</mark>", snippet)
+    b = SnippetBuilder(query, width)
+    return b.mark(b.window(text))
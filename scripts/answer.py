@@ -8,14 +8,19 @@ def main():
     ap.add_argument("--mode", choices=["elser","hybrid"], default="hybrid")
     ap.add_argument("--q", required=True)
     ap.add_argument("--k", type=int, default=5)
+    ap.add_argument("--rerank", action="store_true")
+    ap.add_argument("--collection", action="append", help="restrict to a collection (repeatable)")
+    ap.add_argument("--filename", action="append", help="restrict to a file name (repeatable)")
     args = ap.parse_args()
 
     if not is_safe(args.q):
         print(json.dumps({"answer": REFUSAL, "citations": []}))
         return
 
-    hits = elser_only(args.q, args.k) if args.mode == "elser" else hybrid_rrf(args.q, args.k)
-    out = generate_answer(args.q, hits)
+    search_fn = elser_only if args.mode == "elser" else hybrid_rrf
+    filters = {"collection": args.collection, "filename": args.filename}
+    hits = search_fn(args.q, args.k, rerank_hits=args.rerank or None, filters=filters)
+    out = generate_answer(args.q, hits, mode=args.mode)
     print(json.dumps(out, indent=2, ensure_ascii=False))
 
 if __name__ == "__main__":
@@ -0,0 +1,85 @@
+# scripts/bench_chunker.py
+"""
+Micro-benchmark: offset-based chunking vs the per-token reference implementation, and the
+columnar ChunkBatch output vs one Pydantic Chunk per chunk (time, peak and retained memory).
+
+    python -m scripts.bench_chunker --pages 500 --words-per-page 450 --repeat 3
+"""
+import argparse, json, random, time, tracemalloc
+
+from app.ingestion.chunker import chunk_pages, chunk_pages_batch, chunk_pages_reference
+from app.ingestion.models import PageText
+
+_WORDS = (
+    "the of and to in is was for on that with as by at from soldier village river morning "
+    "letter policy refund contract clause payment notice garden lilac window évening naïve"
+).split()
+
+
+def synthetic_pages(n_pages: int, words_per_page: int, seed: int = 7):
+    rng = random.Random(seed)
+    return [
+        PageText(page_number=i + 1, text=" ".join(rng.choice(_WORDS) for _ in range(words_per_page)))
+        for i in range(n_pages)
+    ]
+
+
+def _measure(fn, pages, repeat: int):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn(pages)
+        best = min(best, time.perf_counter() - t0)
+    del out
+    tracemalloc.start()
+    out = fn(pages)
+    retained, peak = tracemalloc.get_traced_memory()  # retained = what the output keeps alive
+    tracemalloc.stop()
+    return out, best, peak, retained
+
+
+def _key(c):
+    return (c.text, c.page_start, c.page_end)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--pages", type=int, default=500)
+    ap.add_argument("--words-per-page", type=int, default=450)
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    pages = synthetic_pages(args.pages, args.words_per_page)
+    ref, t_ref, m_ref, r_ref = _measure(chunk_pages_reference, pages, args.repeat)
+    new, t_new, m_new, r_new = _measure(chunk_pages, pages, args.repeat)
+    batch, t_batch, m_batch, r_batch = _measure(chunk_pages_batch, pages, args.repeat)
+
+    identical = [_key(c) for c in ref] == [_key(c) for c in new] == [
+        (t, int(a), int(b)) for t, a, b in zip(batch.texts, batch.page_start, batch.page_end)
+    ]
+    mb = lambda n: round(n / 2**20, 2)
+    print(json.dumps({
+        "pages": args.pages,
+        "tokens": args.pages * args.words_per_page,
+        "chunks": len(new),
+        "identical": identical,
+        "reference_s": round(t_ref, 4),
+        "offsets_s": round(t_new, 4),
+        "speedup": round(t_ref / t_new, 2) if t_new else None,
+        "reference_peak_mb": mb(m_ref),
+        "offsets_peak_mb": mb(m_new),
+        # same offsets chunker; Pydantic models vs one columnar ChunkBatch
+        "pydantic_s": round(t_new, 4),
+        "batch_s": round(t_batch, 4),
+        "batch_speedup": round(t_new / t_batch, 2) if t_batch else None,
+        "pydantic_retained_mb": mb(r_new),
+        "batch_retained_mb": mb(r_batch),
+        "pydantic_peak_mb": mb(m_new),
+        "batch_peak_mb": mb(m_batch),
+    }, indent=2))
+    if not identical:
+        raise SystemExit("chunk output differs from the reference implementation")
+
+
+if __name__ == "__main__":
+    main()
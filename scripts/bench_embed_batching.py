@@ -0,0 +1,124 @@
+# scripts/bench_embed_batching.py
+"""
+Load test for query-embedding micro-batching: N client threads call embed_query back to back
+for a fixed time, once with direct batch-of-1 encodes and once through the MicroBatcher, and
+report QPS, latency percentiles and the mean batch size.
+
+    python -m scripts.bench_embed_batching --concurrency 1,8,32 --seconds 10
+    python -m scripts.bench_embed_batching --wait-ms 1,2,5 --max-batch 32
+
+--fake-call-ms / --fake-item-ms replace MiniLM with a sleep of call + n * item ms, which is
+enough to check the scheduler itself on a machine without the model.
+"""
+import argparse, json, random, statistics, threading, time
+from pathlib import Path
+from typing import Any, Dict, List
+
+import numpy as np
+
+from app.retrieval import embedder
+from app.utils.batching import BATCH_SIZE
+from scripts.bench_retrieval import percentile
+
+WORDS = ("refund policy contract clause payment notice warranty period employee leave request "
+         "invoice supplier delivery terms liability insurance claim deadline renewal").split()
+
+
+def _queries(n: int, seed: int) -> List[str]:
+    rng = random.Random(seed)
+    return [" ".join(rng.choice(WORDS) for _ in range(rng.randint(4, 12))) + "?" for _ in range(n)]
+
+
+def _fake_encoder(call_ms: float, item_ms: float):
+    busy = threading.Lock()  # one model saturating the CPU: concurrent encodes queue up
+
+    def encode(texts: List[str]) -> List[List[float]]:
+        with busy:
+            time.sleep((call_ms + item_ms * len(texts)) / 1000.0)
+        return np.zeros((len(texts), 384), dtype=np.float32).tolist()
+    return encode
+
+
+def _batch_stats() -> Dict[str, float]:
+    counts, total = BATCH_SIZE.snapshot().get((("batcher", "embed"),), ([0], 0.0))
+    return {"batches": sum(counts), "items": total}
+
+
+def run_load(queries: List[str], concurrency: int, seconds: float) -> Dict[str, Any]:
+    latencies: List[float] = []
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + seconds
+
+    def client(i: int) -> None:
+        mine, j = [], i
+        while time.perf_counter() < stop_at:
+            t0 = time.perf_counter()
+            embedder.embed_query(queries[j % len(queries)])
+            mine.append((time.perf_counter() - t0) * 1000.0)
+            j += concurrency
+        with lock:
+            latencies.extend(mine)
+
+    before = _batch_stats()
+    t0 = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - t0
+    after = _batch_stats()
+    batches = after["batches"] - before["batches"]
+    return {
+        "requests": len(latencies),
+        "qps": round(len(latencies) / wall, 1),
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "mean_ms": round(statistics.mean(latencies), 2),
+        "mean_batch": round((after["items"] - before["items"]) / batches, 2) if batches else 1.0,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Direct vs micro-batched embed_query under concurrent load.")
+    ap.add_argument("--concurrency", default="1,4,16,32")
+    ap.add_argument("--seconds", type=float, default=5.0)
+    ap.add_argument("--wait-ms", default=str(embedder.BATCH_WAIT_MS), help="comma list of batch wait windows")
+    ap.add_argument("--max-batch", type=int, default=embedder.BATCH_MAX)
+    ap.add_argument("--queries", type=int, default=500)
+    ap.add_argument("--seed", type=int, default=7)
+    ap.add_argument("--fake-call-ms", type=float, default=None, help="simulate the encoder: fixed cost per call")
+    ap.add_argument("--fake-item-ms", type=float, default=0.0, help="simulate the encoder: cost per text")
+    ap.add_argument("--out", default="tmp/bench_embed_batching.json")
+    args = ap.parse_args()
+
+    if args.fake_call_ms is not None:
+        embedder._encode_batch = _fake_encoder(args.fake_call_ms, args.fake_item_ms)
+    else:
+        embedder.warm_up()
+    queries = _queries(args.queries, args.seed)
+    levels = [int(c) for c in args.concurrency.split(",") if c.strip()]
+    waits = [float(w) for w in args.wait_ms.split(",") if w.strip()]
+
+    rows = []
+    for c in levels:
+        embedder.stop_batching()
+        rows.append({"concurrency": c, "mode": "direct", **run_load(queries, c, args.seconds)})
+        for w in waits:
+            embedder.start_batching(max_batch=args.max_batch, max_wait_ms=w)
+            rows.append({"concurrency": c, "mode": f"batched wait={w:g}ms", **run_load(queries, c, args.seconds)})
+            embedder.stop_batching()
+
+    print(f"{'conc':>5} {'mode':<22}{'qps':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'batch':>7}")
+    for r in rows:
+        print(f"{r['concurrency']:>5} {r['mode']:<22}{r['qps']:>9}{r['p50_ms']:>9}{r['p95_ms']:>9}"
+              f"{r['p99_ms']:>9}{r['mean_batch']:>7}")
+    out = Path(args.out)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps({"max_batch": args.max_batch, "results": rows}, indent=2))
+    print(f"Results saved to: {out.resolve()}")
+
+
+if __name__ == "__main__":
+    main()
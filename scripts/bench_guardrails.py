@@ -0,0 +1,99 @@
+# scripts/bench_guardrails.py
+"""
+Guardrail check cost vs number of deny patterns: the old linear `any(bad in q)` scan, one compiled
+regex alternation, and the word-level Aho-Corasick automaton in app.generation.guardrails.
+
+    python -m scripts.bench_guardrails --patterns 10000 --queries 2000
+    python -m scripts.bench_guardrails --patterns 100,1000,10000,50000
+"""
+import argparse, json, random, re, string, time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from app.generation.guardrails import Automaton, UNSAFE_KEYWORDS, words
+
+
+def _word(rng: random.Random) -> str:
+    return "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(3, 9)))
+
+
+def make_patterns(n: int, rng: random.Random) -> List[str]:
+    vocab = [_word(rng) for _ in range(max(50, n // 2))]
+    pats = set(UNSAFE_KEYWORDS)
+    while len(pats) < n:
+        pats.add(" ".join(rng.choice(vocab) for _ in range(rng.randint(1, 4))))
+    return sorted(pats)
+
+
+def make_queries(n: int, patterns: List[str], rng: random.Random, blocked_share: float = 0.05) -> List[str]:
+    filler = "what is the refund policy for cancelled orders in the second quarter of last year".split()
+    out = []
+    for _ in range(n):
+        q = [rng.choice(filler) for _ in range(rng.randint(6, 16))]
+        if rng.random() < blocked_share:
+            q.insert(rng.randrange(len(q)), rng.choice(patterns))
+        out.append(" ".join(q).capitalize() + "?")
+    return out
+
+
+def _linear(patterns: List[str]) -> Callable[[str], bool]:
+    pats = [p.lower() for p in patterns]
+    return lambda q: any(bad in q.lower() for bad in pats)
+
+
+def _regex(patterns: List[str]) -> Callable[[str], bool]:
+    rx = re.compile(r"\b(?:" + "|".join(re.escape(p) for p in sorted(patterns, key=len, reverse=True)) + r")\b",
+                    re.IGNORECASE)
+    return lambda q: rx.search(q) is not None
+
+
+def _automaton(patterns: List[str]) -> Callable[[str], bool]:
+    ac = Automaton(("bench", p) for p in patterns)
+    return lambda q: ac.search(words(q)) is not None
+
+
+ENGINES: Dict[str, Callable[[List[str]], Callable[[str], bool]]] = {
+    "linear": _linear, "regex": _regex, "automaton": _automaton,
+}
+
+
+def bench(n_patterns: int, n_queries: int, seed: int) -> List[Dict]:
+    rng = random.Random(seed)
+    patterns = make_patterns(n_patterns, rng)
+    queries = make_queries(n_queries, patterns, rng)
+    rows = []
+    for name, build in ENGINES.items():
+        t0 = time.perf_counter()
+        check = build(patterns)
+        build_ms = (time.perf_counter() - t0) * 1000.0
+        t0 = time.perf_counter()
+        blocked = sum(check(q) for q in queries)
+        per_us = (time.perf_counter() - t0) / len(queries) * 1e6
+        rows.append({"patterns": n_patterns, "engine": name, "build_ms": round(build_ms, 1),
+                     "us_per_query": round(per_us, 2), "blocked": blocked})
+    return rows
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Guardrail check latency by engine and pattern count.")
+    ap.add_argument("--patterns", default="10000", help="comma list of pattern counts")
+    ap.add_argument("--queries", type=int, default=2000)
+    ap.add_argument("--seed", type=int, default=5)
+    ap.add_argument("--out", default="tmp/bench_guardrails.json")
+    args = ap.parse_args()
+
+    rows = []
+    for n in [int(x) for x in args.patterns.split(",") if x.strip()]:
+        rows += bench(n, args.queries, args.seed)
+
+    print(f"{'patterns':>9} {'engine':<10}{'build ms':>10}{'us/query':>10}{'blocked':>9}")
+    for r in rows:
+        print(f"{r['patterns']:>9} {r['engine']:<10}{r['build_ms']:>10}{r['us_per_query']:>10}{r['blocked']:>9}")
+    out = Path(args.out)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(rows, indent=2))
+    print(f"Results saved to: {out.resolve()}")
+
+
+if __name__ == "__main__":
+    main()
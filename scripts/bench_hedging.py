@@ -0,0 +1,123 @@
+# scripts/bench_hedging.py
+"""
+Tail latency of ES searches with and without hedging and the circuit breaker, against the local
+stand-in (scripts/standin_server) with injected faults. No cluster needed.
+
+  tail     every search gets latency_ms + jitter, and --slow-rate of them stall --slow-ms extra
+           (a GC pause / slow node). Compared: hedging off vs on (ES_HEDGE).
+  outage   the ELSER leg hangs (search:rag:elser hang_rate=1) while BM25 keeps working, as when
+           the ML node is overloaded. Compared: breaker effectively off (min requests = inf) vs on.
+           Queries wait out ES_SEARCH_TIMEOUT_SECONDS and then fall back to BM25 until the breaker
+           opens; after that they fail fast to BM25.
+
+    python -m scripts.bench_hedging --queries 400 --concurrency 4 --slow-rate 0.03 --slow-ms 1000
+    python -m scripts.bench_hedging --scenarios outage --queries 60 --timeout 1
+"""
+import argparse, json, os, statistics, time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List
+
+QUESTIONS = [f"what does the {a} {b} say" for a in ("refund", "notice", "leave", "warranty", "invoice")
+             for b in ("policy", "clause", "period", "schedule", "deadline")]
+
+
+def _pct(xs: List[float], q: float) -> float:
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(q * len(xs)))]
+
+
+def _counter(name: str, **labels: Any) -> float:
+    from app.utils import metrics
+    return metrics.counter(name).value(**labels)
+
+
+def run(label: str, queries: int, concurrency: int, hedge: bool, min_requests: int) -> Dict[str, Any]:
+    from app.infra import es_resilience
+    from app.retrieval import searcher
+    es_resilience._executor = es_resilience.HedgedSearch(hedge=hedge, breaker_opts={"min_requests": min_requests})
+    before = {r: _counter("rag_es_hedges_total", leg="elser", result=r) for r in ("won", "lost", "skipped")}
+
+    def one(i: int):
+        t0 = time.perf_counter()
+        hits = searcher.elser_only(QUESTIONS[i % len(QUESTIONS)], 5, rerank_hits=False, cosine=False)
+        return time.perf_counter() - t0, bool(hits and hits[0].get("degraded"))
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(one, range(queries)))
+    wall = time.perf_counter() - t0
+    lat = [r[0] * 1000.0 for r in results]
+    hedges = {r: int(_counter("rag_es_hedges_total", leg="elser", result=r) - before[r]) for r in before}
+    return {
+        "run": label, "queries": queries, "qps": round(queries / wall, 1),
+        "p50_ms": round(_pct(lat, 0.50), 1), "p95_ms": round(_pct(lat, 0.95), 1),
+        "p99_ms": round(_pct(lat, 0.99), 1), "max_ms": round(max(lat), 1),
+        "mean_ms": round(statistics.mean(lat), 1),
+        "hedged": sum(hedges[r] for r in ("won", "lost")), "hedge_won": hedges["won"],
+        "hedge_skipped": hedges["skipped"], "degraded": sum(1 for r in results if r[1]),
+        "breaker": es_resilience._executor.states().get("elser", "closed"),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Hedged ES requests + circuit breaker vs plain searches.")
+    ap.add_argument("--scenarios", default="tail,outage")
+    ap.add_argument("--queries", type=int, default=400)
+    ap.add_argument("--concurrency", type=int, default=4)
+    ap.add_argument("--docs", type=int, default=300)
+    ap.add_argument("--latency-ms", type=float, default=8.0)
+    ap.add_argument("--jitter-ms", type=float, default=6.0)
+    ap.add_argument("--slow-rate", type=float, default=0.03)
+    ap.add_argument("--slow-ms", type=float, default=1000.0)
+    ap.add_argument("--timeout", type=float, default=1.0, help="ES_SEARCH_TIMEOUT_SECONDS for the outage scenario")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--out", default="tmp/bench_hedging.json")
+    args = ap.parse_args()
+
+    from scripts.standin_es import synthetic_docs
+    from scripts.standin_server import Faults, StandIn, start
+    standin = StandIn(faults=Faults(seed=args.seed))
+    server = start(standin)
+    url = f"http://127.0.0.1:{server.server_port}"
+    os.environ.update(ELASTIC_URL=url, ELSER_QUERY_MODE="cached", SNIPPET_MODE="highlight", RERANK_ENABLED="0")
+    index = os.getenv("ELASTIC_INDEX_NAME", "rag_documents_v1")
+    lines = []
+    for d in synthetic_docs(args.docs, dims=8, seed=args.seed):
+        lines += [{"index": {"_index": index, "_id": d["chunk_id"]}}, d]
+    standin.es.bulk(lines)
+
+    from app.infra import es_resilience
+    rows = []
+    try:
+        if "tail" in args.scenarios:
+            slow = {"latency_ms": args.latency_ms, "jitter_ms": args.jitter_ms,
+                    "slow_rate": args.slow_rate, "slow_ms": args.slow_ms}
+            for hedge in (False, True):
+                standin.reset()
+                standin.faults.update({"search": slow})
+                rows.append(run(f"tail/hedge={'on' if hedge else 'off'}", args.queries, args.concurrency,
+                                hedge, es_resilience.BREAKER_MIN_REQUESTS))
+        if "outage" in args.scenarios:
+            es_resilience.SEARCH_TIMEOUT = args.timeout
+            for breaker in (False, True):
+                standin.reset()
+                standin.faults.update({"search": {"latency_ms": args.latency_ms},
+                                       "search:rag:elser": {"hang_rate": 1.0, "hang_ms": args.timeout * 3000}})
+                rows.append(run(f"outage/breaker={'on' if breaker else 'off'}", args.queries, args.concurrency,
+                                True, es_resilience.BREAKER_MIN_REQUESTS if breaker else 10 ** 9))
+    finally:
+        server.shutdown()
+
+    cols = ("run", "qps", "p50_ms", "p95_ms", "p99_ms", "max_ms", "hedged", "hedge_won", "degraded", "breaker")
+    print("".join(f"{c:>22}" if i == 0 else f"{c:>10}" for i, c in enumerate(cols)))
+    for r in rows:
+        print("".join(f"{r[c]!s:>22}" if i == 0 else f"{r[c]!s:>10}" for i, c in enumerate(cols)))
+    out = Path(args.out)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps({"args": vars(args), "results": rows}, indent=2))
+    print(f"Results saved to: {out.resolve()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+# scripts/bench_ingestion.py
+"""
+Ingestion throughput benchmark on a synthetic, locally generated PDF corpus.
+
+Builds N PDFs with PyMuPDF, drives run_ingestion() through an in-memory Drive client and
+index_chunks() into a fake bulk sink (actions are still serialised to NDJSON, so the
+client-side cost is real), and reports files/pages/chunks per second, embed throughput
+and per-stage wall time + peak RSS. ELSER expansion goes to a stubbed _infer endpoint that
+returns ~100 weighted tokens per chunk, so bulk payload sizes stay realistic.
+
+    python -m scripts.bench_ingestion --files 20 --pages 50 --words-per-page 400
+    python -m scripts.bench_ingestion --files 5 --pages 800 --fake-embed --out tmp/bench_ingest.json
+"""
+import argparse, json, os, random, resource, sys, threading, time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import fitz  # PyMuPDF
+
+from app.ingestion import ingestion_pipeline
+from app.retrieval import expansion
+from app.ingestion.models import DriveFile
+
+STAGES = ("download", "extract", "chunk", "embed", "expand", "index")
+
+_WORDS = (
+    "the of and to in is was for on that with as by at from his her they this which "
+    "soldier village river morning letter policy refund contract clause payment notice "
+    "garden lilac window evening station train officer mother winter road market bridge "
+    "agreement section party shall provide terms within days written request account"
+).split()
+
+
+def make_pdf(n_pages: int, words_per_page: int, rng: random.Random) -> bytes:
+    doc = fitz.open()
+    words_per_line = 12
+    n_lines = max(1, (words_per_page + words_per_line - 1) // words_per_line)
+    for _ in range(n_pages):
+        page = doc.new_page()  # Letter
+        fontsize = min(9.0, max(3.0, (page.rect.height - 72) / (n_lines * 1.2)))
+        y = 36 + fontsize
+        words = [rng.choice(_WORDS) for _ in range(words_per_page)]
+        for i in range(0, len(words), words_per_line):
+            page.insert_text((36, y), " ".join(words[i:i + words_per_line]), fontsize=fontsize)
+            y += fontsize * 1.2
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+def make_corpus(files: int, pages: int, words_per_page: int, seed: int = 7) -> Dict[str, bytes]:
+    rng = random.Random(seed)
+    return {f"synthetic-{i:04d}": make_pdf(pages, words_per_page, rng) for i in range(files)}
+
+
+def _current_rss() -> int:
+    """Resident set size in bytes (psutil if present, /proc on Linux, else peak RSS)."""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+class StageTracker:
+    """Accumulates wall time per stage and samples RSS in the background to get a per-stage peak."""
+
+    def __init__(self, interval: float = 0.01):
+        self.current: Optional[str] = None
+        self.seconds: Dict[str, float] = {s: 0.0 for s in STAGES}
+        self.peak_rss: Dict[str, int] = {s: 0 for s in STAGES}
+        self.counts: Dict[str, int] = {s: 0 for s in STAGES}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, args=(interval,), daemon=True)
+
+    def _sample(self, interval: float) -> None:
+        while not self._stop.wait(interval):
+            stage = self.current
+            if stage:
+                self.peak_rss[stage] = max(self.peak_rss[stage], _current_rss())
+
+    def wrap(self, stage: str, fn, count=lambda args, result: 1):
+        def timed(*args, **kwargs):
+            self.current = stage
+            t0 = time.perf_counter()
+            try:
+                result = fn(*args, **kwargs)
+            finally:
+                self.seconds[stage] += time.perf_counter() - t0
+                self.peak_rss[stage] = max(self.peak_rss[stage], _current_rss())
+                self.current = None
+            self.counts[stage] += count(args, result)
+            return result
+        return timed
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+class FakeDriveClient:
+    """Serves the synthetic corpus through the DriveClient interface used by run_ingestion."""
+
+    def __init__(self, corpus: Dict[str, bytes]):
+        self.corpus = corpus
+
+    def list_pdfs(self, page_size: int = 100) -> List[DriveFile]:
+        return [
+            DriveFile(file_id=fid, filename=f"{fid}.pdf", drive_url=f"file://synthetic/{fid}.pdf")
+            for fid in self.corpus
+        ]
+
+    def download_pdf_bytes(self, file_id: str) -> bytes:
+        return self.corpus[file_id]
+
+
+class _FakeBulkHelpers:
+    """Replacement for elasticsearch.helpers: serialises every action to NDJSON and drops it."""
+
+    def __init__(self):
+        self.bytes_sent = 0
+
+    def bulk(self, es, actions, chunk_size: int = 500, **kwargs):
+        n = 0
+        for a in actions:
+            meta = {a.get("_op_type", "index"): {"_index": a["_index"], "_id": a.get("_id")}}
+            line = json.dumps(meta) + "\n" + json.dumps(a["_source"]) + "\n"
+            self.bytes_sent += len(line.encode("utf-8"))
+            n += 1
+        return n, []
+
+
+def _stub_infer(texts: List[str]) -> List[Dict[str, float]]:
+    return [{w: round(1.0 / (i + 1), 4) for i, w in enumerate(dict.fromkeys(t.split()[:100]))} for t in texts]
+
+
+def run(files: int, pages: int, words_per_page: int, fake_embed: bool, seed: int) -> Dict[str, Any]:
+    t0 = time.perf_counter()
+    corpus = make_corpus(files, pages, words_per_page, seed)
+    gen_s = time.perf_counter() - t0
+    corpus_bytes = sum(len(b) for b in corpus.values())
+
+    tracker = StageTracker()
+    sink = _FakeBulkHelpers()
+    drive = FakeDriveClient(corpus)
+
+    embed = ingestion_pipeline.embed_texts
+    if fake_embed:
+        embed = lambda texts: [[0.0] * 384 for _ in texts]
+
+    drive.download_pdf_bytes = tracker.wrap("download", drive.download_pdf_bytes)
+    ingestion_pipeline.extract_pages_from_pdf_bytes = tracker.wrap(
+        "extract", ingestion_pipeline.extract_pages_from_pdf_bytes, count=lambda a, r: len(r))
+    ingestion_pipeline.chunk_pages_batch = tracker.wrap(
+        "chunk", ingestion_pipeline.chunk_pages_batch, count=lambda a, r: len(r))
+    ingestion_pipeline.embed_texts = tracker.wrap("embed", embed, count=lambda a, r: len(r))
+    expansion.set_infer(_stub_infer)
+    ingestion_pipeline.expand_texts = tracker.wrap(
+        "expand", ingestion_pipeline.expand_texts, count=lambda a, r: len(r))
+    sink.bulk = tracker.wrap("index", sink.bulk, count=lambda a, r: r[0])
+    ingestion_pipeline.helpers = sink
+    ingestion_pipeline.make_es = lambda: None
+
+    with tracker:
+        t0 = time.perf_counter()
+        report, batches = ingestion_pipeline.run_ingestion(folder_id="synthetic", source=drive)
+        ingest_s = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        ingestion_pipeline.index_chunks(batches)
+        index_s = time.perf_counter() - t0
+
+    total_s = ingest_s + index_s
+    pages_total = tracker.counts["extract"]
+    errors = [f for f in report["files"] if "error" in f]
+    n_chunks = sum(len(b) for b in batches)
+
+    def rate(n, s):
+        return round(n / s, 2) if s > 0 else None
+
+    return {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "config": {"files": files, "pages_per_file": pages, "words_per_page": words_per_page,
+                   "fake_embed": fake_embed, "seed": seed},
+        "corpus": {"bytes": corpus_bytes, "generate_s": round(gen_s, 3)},
+        "totals": {"files": files, "pages": pages_total, "chunks": n_chunks,
+                   "errors": len(errors), "bulk_bytes": sink.bytes_sent},
+        "wall_s": {"extract_chunk": round(ingest_s, 3), "embed_index": round(index_s, 3), "total": round(total_s, 3)},
+        "throughput": {
+            "files_per_s": rate(files, total_s),
+            "pages_per_s": rate(pages_total, total_s),
+            "chunks_per_s": rate(n_chunks, total_s),
+            "embed_texts_per_s": rate(tracker.counts["embed"], tracker.seconds["embed"]),
+            "index_docs_per_s": rate(tracker.counts["index"], tracker.seconds["index"]),
+        },
+        "stages": {
+            s: {"seconds": round(tracker.seconds[s], 3), "items": tracker.counts[s],
+                "items_per_s": rate(tracker.counts[s], tracker.seconds[s]),
+                "peak_rss_mb": round(tracker.peak_rss[s] / 2**20, 1)}
+            for s in STAGES
+        },
+        "sample_errors": [e["error"] for e in errors[:5]],
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark the ingestion pipeline on synthetic PDFs.")
+    ap.add_argument("--files", type=int, default=10)
+    ap.add_argument("--pages", type=int, default=20, help="pages per file")
+    ap.add_argument("--words-per-page", type=int, default=350)
+    ap.add_argument("--fake-embed", action="store_true", help="skip MiniLM; return zero vectors")
+    ap.add_argument("--seed", type=int, default=7)
+    ap.add_argument("--out", type=str, default="./tmp/bench_ingestion.json")
+    args = ap.parse_args()
+
+    res = run(args.files, args.pages, args.words_per_page, args.fake_embed, args.seed)
+
+    out = Path(args.out)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(res, indent=2))
+
+    t = res["throughput"]
+    print(f"\nfiles={res['totals']['files']} pages={res['totals']['pages']} chunks={res['totals']['chunks']} "
+          f"errors={res['totals']['errors']} total={res['wall_s']['total']}s")
+    print(f"files/s={t['files_per_s']} pages/s={t['pages_per_s']} chunks/s={t['chunks_per_s']} "
+          f"embed/s={t['embed_texts_per_s']} index/s={t['index_docs_per_s']}")
+    print(f"{'stage':<10}{'seconds':>10}{'items':>10}{'items/s':>12}{'peak MB':>10}")
+    for s, v in res["stages"].items():
+        print(f"{s:<10}{v['seconds']:>10}{v['items']:>10}{str(v['items_per_s']):>12}{v['peak_rss_mb']:>10}")
+    print(f"Results saved to: {out.resolve()}")
+
+
+if __name__ == "__main__":
+    main()
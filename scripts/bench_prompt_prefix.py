@@ -0,0 +1,142 @@
+# scripts/bench_prompt_prefix.py
+"""
+Prefill saved by prefix-stable prompts, measured against scripts/fake_ollama (which, like
+llama.cpp, only counts prompt tokens after the prefix already in a KV-cache slot).
+
+Conversations of --turns questions are replayed over a synthetic corpus. Follow-up turns retrieve
+mostly the same chunks as the first one. --users conversations are interleaved round-robin over
+--slots KV-cache slots (OLLAMA_NUM_PARALLEL); session reuse needs a slot per active conversation.
+Three ways of prompting:
+
+  legacy    the old server prompt: preamble, QUESTION, then CONTEXT, all in `prompt`
+  stable    app.llm.prompts: `system`, then CONTEXT, then QUESTION
+  session   stable + session_id: follow-ups send Ollama's `context` back and only new chunks
+
+    python -m scripts.bench_prompt_prefix --conversations 20 --turns 3
+    python -m scripts.bench_prompt_prefix --users 4 --slots 4 --prefill-ms 5
+"""
+import argparse, json, os, random, statistics
+from pathlib import Path
+from typing import Any, Dict, List
+
+import requests
+
+from scripts.fake_ollama import FakeOllama, start
+
+WORDS = ("contract refund payment clause notice period employee leave policy warranty supplier invoice "
+         "delivery liability insurance claim renewal deadline termination schedule budget audit").split()
+
+
+def _legacy_prompt(question: str, hits: List[Dict[str, Any]]) -> str:
+    """app/api/server.make_prompt before the prompt layer: the question precedes the context."""
+    parts = []
+    for i, h in enumerate(hits, start=1):
+        p0, p1 = h["page_range"]
+        parts.append(f"[{i}] {h['filename']} p.{p0}-{p1} {h['drive_url']}".strip() + "\n" + h["snippet"])
+    context = "\n\n".join(parts[:10])
+    return f"""You are a helpful assistant. Answer the QUESTION using only the CONTEXT.
+If the answer cannot be found, say "I don't know." Be concise.
+
+QUESTION:
+{question}
+
+CONTEXT:
+{context}
+
+Answer:"""
+
+
+def corpus(n: int, rng: random.Random) -> List[Dict[str, Any]]:
+    return [{
+        "chunk_id": f"chunk{i:05d}",
+        "filename": f"doc{i // 8}.pdf",
+        "drive_url": f"file:///docs/doc{i // 8}.pdf",
+        "page_range": [i % 8 + 1, i % 8 + 1],
+        "snippet": " ".join(rng.choice(WORDS) for _ in range(40)) + ".",
+    } for i in range(n)]
+
+
+def conversations(n: int, turns: int, k: int, chunks: List[Dict[str, Any]], rng: random.Random) -> List[List[Dict]]:
+    out = []
+    for c in range(n):
+        pool = rng.sample(chunks, k + 3)
+        convo = []
+        for t in range(turns):
+            # follow-ups: mostly the same top chunks, one or two swapped in from the topic
+            hits = pool[:k] if t == 0 else pool[:k - 2] + rng.sample(pool[k - 2:], 2)
+            q = f"Turn {t + 1}: what does the {rng.choice(WORDS)} {rng.choice(WORDS)} say?"
+            convo.append({"session": f"s{c}", "q": q, "hits": hits})
+        out.append(convo)
+    return out
+
+
+def _interleave(convos: List[List[Dict]], users: int) -> List[Dict]:
+    order = []
+    for g in range(0, len(convos), users):
+        group = convos[g:g + users]
+        for t in range(max(len(c) for c in group)):
+            order += [c[t] for c in group if t < len(c)]
+    return order
+
+
+def run(mode: str, turns: List[Dict], url: str) -> Dict[str, Any]:
+    from app.llm import ollama_client
+    ollama_client.sessions = ollama_client._Sessions(10_000, 3600)  # fresh sessions per mode
+    evaluated, cached, prefill_ms = [], [], []
+    for tr in turns:
+        if mode == "legacy":
+            data = requests.post(f"{url}/api/generate", json={
+                "model": "fake", "prompt": _legacy_prompt(tr["q"], tr["hits"]), "stream": False,
+            }, timeout=30).json()
+        else:
+            data = ollama_client.answer(tr["q"], tr["hits"], session_id=tr["session"] if mode == "session" else None)
+        evaluated.append(data["prompt_eval_count"])
+        cached.append(data["prompt_cached_tokens"])
+        prefill_ms.append(data["prompt_eval_duration"] / 1e6)
+    return {
+        "mode": mode,
+        "requests": len(turns),
+        "prompt_eval_tokens": round(statistics.mean(evaluated), 1),
+        "cached_tokens": round(statistics.mean(cached), 1),
+        "prefill_ms": round(statistics.mean(prefill_ms), 1),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Prompt-prefix reuse: legacy vs stable vs session prompts.")
+    ap.add_argument("--conversations", type=int, default=20)
+    ap.add_argument("--turns", type=int, default=3)
+    ap.add_argument("--users", type=int, default=1, help="conversations interleaved round-robin")
+    ap.add_argument("--slots", type=int, default=1, help="fake Ollama KV-cache slots (OLLAMA_NUM_PARALLEL)")
+    ap.add_argument("--k", type=int, default=5)
+    ap.add_argument("--prefill-ms", type=float, default=2.0, help="fake prefill cost per evaluated token")
+    ap.add_argument("--seed", type=int, default=3)
+    ap.add_argument("--out", default="tmp/bench_prompt_prefix.json")
+    args = ap.parse_args()
+
+    rng = random.Random(args.seed)
+    chunks = corpus(400, rng)
+    turns = _interleave(conversations(args.conversations, args.turns, args.k, chunks, rng), args.users)
+
+    server = start(FakeOllama(prefill_ms=args.prefill_ms, slots=args.slots))
+    url = f"http://127.0.0.1:{server.server_port}"
+    os.environ["OLLAMA_BASE_URL"] = url
+    try:
+        rows = [run(m, turns, url) for m in ("legacy", "stable", "session")]
+    finally:
+        server.shutdown()
+
+    base = rows[0]["prefill_ms"] or 1.0
+    print(f"{'mode':<9}{'requests':>9}{'eval tok':>10}{'cached tok':>12}{'prefill ms':>12}{'saved':>8}")
+    for r in rows:
+        r["saved_pct"] = round(100.0 * (1 - r["prefill_ms"] / base), 1)
+        print(f"{r['mode']:<9}{r['requests']:>9}{r['prompt_eval_tokens']:>10}{r['cached_tokens']:>12}"
+              f"{r['prefill_ms']:>12}{r['saved_pct']:>7}%")
+    out = Path(args.out)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps({"args": vars(args), "results": rows}, indent=2))
+    print(f"Results saved to: {out.resolve()}")
+
+
+if __name__ == "__main__":
+    main()
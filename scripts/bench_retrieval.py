@@ -0,0 +1,315 @@
+# scripts/bench_retrieval.py
+"""
+Retrieval/QA load benchmark built on top of scripts/eval.py.
+
+Replays data/eval/qa.jsonl (or a synthetic query set) at a given concurrency against
+one or more modes and reports latency percentiles, QPS, a per-stage breakdown
+(embed / expand / es / rerank / generate) and hit@k / MRR side by side.
+
+Live run, recording every ES / Ollama / embedding response to a cassette:
+    python -m scripts.bench_retrieval --modes elser,hybrid --concurrency 4 --record tmp/bench_cassette.json
+
+Offline replay of that cassette (no ES, no Ollama, no model download):
+    python -m scripts.bench_retrieval --modes elser,hybrid --replay tmp/bench_cassette.json --replay-latency
+"""
+import argparse, hashlib, json, random, statistics, sys, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from app.retrieval import expansion, searcher
+from app.generation import generator
+from scripts.eval import is_hit
+
+STAGES = ("embed", "expand", "es", "rerank", "generate")
+
+_local = threading.local()
+
+
+def _stage_times() -> Dict[str, float]:
+    if not hasattr(_local, "stages"):
+        _local.stages = {}
+    return _local.stages
+
+
+def _add_stage(name: str, ms: float) -> None:
+    st = _stage_times()
+    st[name] = st.get(name, 0.0) + ms
+
+
+def percentile(values: List[float], p: float) -> Optional[float]:
+    """Linear-interpolated percentile (p in 0..100); None for an empty list."""
+    if not values:
+        return None
+    xs = sorted(values)
+    if len(xs) == 1:
+        return xs[0]
+    pos = (len(xs) - 1) * p / 100.0
+    lo = int(pos)
+    hi = min(lo + 1, len(xs) - 1)
+    return xs[lo] + (xs[hi] - xs[lo]) * (pos - lo)
+
+
+def _key(*parts: Any) -> str:
+    raw = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+class Cassette:
+    """
+    Recorded ES / ELSER expansion / Ollama / embedding responses keyed by request content.
+    Each entry keeps the live elapsed_ms so replays can optionally reproduce it.
+    """
+
+    def __init__(self, path: str, mode: str, replay_latency: bool = False):
+        self.path = Path(path)
+        self.mode = mode  # "record" | "replay"
+        self.replay_latency = replay_latency
+        self.lock = threading.Lock()
+        self.data: Dict[str, Dict[str, Any]] = {"es": {}, "infer": {}, "ollama": {}, "embed": {}}
+        if mode == "replay":
+            self.data.update(json.loads(self.path.read_text()))
+
+    def call(self, kind: str, key: str, fn):
+        if self.mode == "replay":
+            entry = self.data[kind].get(key)
+            if entry is None:
+                raise KeyError(f"no recorded {kind} response for key {key[:12]}… (re-record the cassette)")
+            if self.replay_latency:
+                time.sleep(entry.get("elapsed_ms", 0.0) / 1000.0)
+            return entry["response"]
+
+        t0 = time.perf_counter()
+        resp = fn()
+        elapsed = (time.perf_counter() - t0) * 1000.0
+        body = resp.body if hasattr(resp, "body") else resp
+        with self.lock:
+            self.data[kind][key] = {"response": body, "elapsed_ms": round(elapsed, 3)}
+        return body
+
+    def save(self) -> str:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.path.write_text(json.dumps(self.data, ensure_ascii=False))
+        return str(self.path.resolve())
+
+
+class _CassetteES:
+    """Stands in for searcher.es: routes each search through the cassette."""
+
+    def __init__(self, real, cassette: Optional[Cassette]):
+        self.real = real
+        self.cassette = cassette
+
+    def options(self, **kw) -> "_CassetteES":
+        # searcher._search tags every request with es.options(opaque_id=...)
+        return _CassetteES(self.real.options(**kw) if self.real is not None else None, self.cassette)
+
+    def search(self, index=None, body=None, **kw):
+        if self.cassette is None:
+            return self.real.search(index=index, body=body, **kw)
+        # keyed without `preference`, so a hedged duplicate replays the same response
+        return self.cassette.call("es", _key(index, body), lambda: self.real.search(index=index, body=body, **kw))
+
+
+def install_hooks(cassette: Optional[Cassette]) -> None:
+    """Wrap the search/generation entry points so each stage is timed (and recorded/replayed)."""
+    real_embed = searcher.embed_query
+    real_rerank = searcher.rerank
+    real_ask = generator._ask_ollama
+    real_search = searcher._search
+    real_infer = expansion._infer
+    real_es = None if (cassette and cassette.mode == "replay") else searcher._es()
+
+    def embed(text: str):
+        t0 = time.perf_counter()
+        try:
+            if cassette is None:
+                return real_embed(text)
+            return cassette.call("embed", _key(text), lambda: real_embed(text))
+        finally:
+            _add_stage("embed", (time.perf_counter() - t0) * 1000.0)
+
+    def infer(texts):
+        # ELSER_QUERY_MODE=cached expands the query through _inference before the search
+        t0 = time.perf_counter()
+        try:
+            if cassette is None:
+                return real_infer(texts)
+            return cassette.call("infer", _key(texts), lambda: real_infer(texts))
+        finally:
+            _add_stage("expand", (time.perf_counter() - t0) * 1000.0)
+
+    def rerank(q, hits, k):
+        t0 = time.perf_counter()
+        try:
+            return real_rerank(q, hits, k)
+        finally:
+            _add_stage("rerank", (time.perf_counter() - t0) * 1000.0)
+
+    def ask(question: str, hits, session_id=None) -> str:
+        t0 = time.perf_counter()
+        try:
+            if cassette is None:
+                return real_ask(question, hits, session_id)
+            key = _key(question, [h.get("chunk_id") for h in hits])
+            return cassette.call("ollama", key, lambda: real_ask(question, hits, session_id))
+        finally:
+            _add_stage("generate", (time.perf_counter() - t0) * 1000.0)
+
+    def search(leg, body, index=None):
+        # timed here, in the query's thread: the ES call itself runs on the hedging pool
+        t0 = time.perf_counter()
+        try:
+            return real_search(leg, body, index)
+        finally:
+            _add_stage("es", (time.perf_counter() - t0) * 1000.0)
+
+    searcher.es = _CassetteES(real_es, cassette)
+    searcher._search = search
+    expansion.set_infer(infer)
+    searcher.embed_query = embed
+    searcher.rerank = rerank
+    generator._ask_ollama = ask
+
+
+def load_queries(file: str, synthetic: int = 0, seed: int = 13) -> List[Dict[str, Any]]:
+    """Eval items from the JSONL file, or `synthetic` random word-salad queries drawn from its vocabulary."""
+    items = [json.loads(l) for l in Path(file).read_text().splitlines() if l.strip()]
+    if not synthetic:
+        return items
+    vocab = sorted({w.strip("?.,!").lower() for it in items for w in it["q"].split() if len(w) > 2})
+    rng = random.Random(seed)
+    return [{"q": " ".join(rng.sample(vocab, min(len(vocab), rng.randint(3, 8)))), "gold": None}
+            for _ in range(synthetic)]
+
+
+def _parse_mode(mode: str):
+    base, _, extra = mode.partition("+")
+    if base not in ("elser", "hybrid"):
+        raise SystemExit(f"unknown mode {mode!r} (expected elser|hybrid, optionally +rerank)")
+    fn = searcher.elser_only if base == "elser" else searcher.hybrid_rrf
+    return fn, extra == "rerank"
+
+
+def run_one(mode: str, item: Dict[str, Any], k: int, generate: bool) -> Dict[str, Any]:
+    search_fn, use_rerank = _parse_mode(mode)
+    _local.stages = {}
+    t0 = time.perf_counter()
+    error = None
+    hits: List[Dict[str, Any]] = []
+    try:
+        hits = search_fn(item["q"], k, rerank_hits=use_rerank)
+        if generate:
+            generator.generate_answer(item["q"], hits, mode=mode.partition("+")[0])
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    total = (time.perf_counter() - t0) * 1000.0
+
+    ok, rr = (False, None)
+    if item.get("gold") and not error:
+        ok, rr = is_hit(hits, item["gold"])
+    return {"total_ms": total, "stages": dict(_stage_times()), "hit": ok, "rr": rr,
+            "graded": bool(item.get("gold")), "error": error}
+
+
+def bench_mode(mode: str, items: List[Dict[str, Any]], k: int, concurrency: int,
+               generate: bool, warmup: int) -> Dict[str, Any]:
+    for item in items[:warmup]:
+        run_one(mode, item, k, generate)
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda it: run_one(mode, it, k, generate), items))
+    wall = time.perf_counter() - t0
+
+    ok_runs = [r for r in results if not r["error"]]
+    lat = [r["total_ms"] for r in ok_runs]
+    graded = [r for r in ok_runs if r["graded"]]
+
+    stages = {}
+    for name in STAGES:
+        vals = [r["stages"][name] for r in ok_runs if name in r["stages"]]
+        if vals:
+            stages[name] = {"mean_ms": round(statistics.fmean(vals), 3),
+                            "p50_ms": round(percentile(vals, 50), 3),
+                            "p95_ms": round(percentile(vals, 95), 3)}
+
+    def _r(x):
+        return None if x is None else round(x, 3)
+
+    return {
+        "mode": mode,
+        "k": k,
+        "concurrency": concurrency,
+        "n": len(results),
+        "errors": len(results) - len(ok_runs),
+        "wall_s": round(wall, 3),
+        "qps": round(len(ok_runs) / wall, 3) if wall > 0 else None,
+        "latency_ms": {"p50": _r(percentile(lat, 50)), "p95": _r(percentile(lat, 95)),
+                       "p99": _r(percentile(lat, 99)), "mean": _r(statistics.fmean(lat) if lat else None)},
+        "stages": stages,
+        "quality": {
+            "graded": len(graded),
+            "hit@k": round(sum(r["hit"] for r in graded) / len(graded), 4) if graded else None,
+            "mrr@k": round(statistics.fmean([1.0 / r["rr"] if r["rr"] else 0.0 for r in graded]), 4) if graded else None,
+        },
+        "sample_errors": [r["error"] for r in results if r["error"]][:5],
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark retrieval latency/QPS/quality per mode.")
+    ap.add_argument("--modes", default="elser,hybrid", help="comma list: elser, hybrid, elser+rerank, hybrid+rerank")
+    ap.add_argument("--k", type=int, default=5)
+    ap.add_argument("--file", default="data/eval/qa.jsonl")
+    ap.add_argument("--synthetic", type=int, default=0, help="use N synthetic queries instead of the eval file")
+    ap.add_argument("--repeat", type=int, default=1, help="replay the query set this many times")
+    ap.add_argument("--concurrency", type=int, default=1)
+    ap.add_argument("--warmup", type=int, default=1, help="queries run (untimed) before each mode")
+    ap.add_argument("--generate", action="store_true", help="include answer generation (Ollama) per query")
+    rec = ap.add_mutually_exclusive_group()
+    rec.add_argument("--record", type=str, default=None, help="record live responses to this cassette file")
+    rec.add_argument("--replay", type=str, default=None, help="replay responses from this cassette file (offline)")
+    ap.add_argument("--replay-latency", action="store_true", help="sleep for the recorded latency on replay")
+    ap.add_argument("--out", type=str, default="./tmp/bench_retrieval.json")
+    args = ap.parse_args()
+
+    cassette = None
+    if args.record:
+        cassette = Cassette(args.record, "record")
+    elif args.replay:
+        cassette = Cassette(args.replay, "replay", replay_latency=args.replay_latency)
+    install_hooks(cassette)
+
+    items = load_queries(args.file, args.synthetic) * max(1, args.repeat)
+    if not items:
+        print("No queries to run.", file=sys.stderr)
+        sys.exit(1)
+
+    results = [bench_mode(m.strip(), items, args.k, args.concurrency, args.generate, args.warmup)
+               for m in args.modes.split(",") if m.strip()]
+
+    report = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "source": "replay" if args.replay else "live",
+        "queries": args.file if not args.synthetic else f"synthetic:{args.synthetic}",
+        "results": results,
+    }
+    out = Path(args.out)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, indent=2))
+
+    print(f"{'mode':<16}{'n':>5}{'err':>5}{'qps':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'hit@k':>8}{'mrr':>8}")
+    for r in results:
+        lat, q = r["latency_ms"], r["quality"]
+        fmt = lambda x, d=1: "-" if x is None else f"{x:.{d}f}"
+        print(f"{r['mode']:<16}{r['n']:>5}{r['errors']:>5}{fmt(r['qps']):>9}{fmt(lat['p50']):>9}"
+              f"{fmt(lat['p95']):>9}{fmt(lat['p99']):>9}{fmt(q['hit@k'], 3):>8}{fmt(q['mrr@k'], 3):>8}")
+    if cassette and cassette.mode == "record":
+        print(f"Cassette saved to: {cassette.save()}")
+    print(f"Results saved to: {out.resolve()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+# scripts/bench_startup.py
+"""
+Startup budget for the API worker and CLI entry points.
+
+Imports each module in a fresh interpreter under `python -X importtime`, reports the total import
+time and the slowest top-level imports, and exits 1 if a module goes over its budget or pulls in
+a heavy dependency (torch, sentence-transformers, the ES client, ...) at import time. Those must
+load lazily, on the first request that needs them. Run it in CI next to the linters.
+
+    python -m scripts.bench_startup
+    python -m scripts.bench_startup --budget-ms 600 --repeat 5 --out tmp/bench_startup.json
+"""
+import argparse, json, os, re, statistics, subprocess, sys
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+TARGETS = ("app.api.server", "app.retrieval.searcher", "scripts.search", "scripts.answer")
+HEAVY = ("torch", "sentence_transformers", "transformers", "optimum", "onnxruntime", "elasticsearch")
+
+_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|( *)(\S+)")
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def import_profile(module: str) -> Tuple[float, List[Tuple[str, float]], List[str]]:
+    """(total ms, [(direct import, cumulative ms)], every module imported) for one cold import."""
+    env = dict(os.environ)
+    # query-only processes must start without Drive credentials
+    env.pop("GDRIVE_SERVICE_ACCOUNT_JSON_PATH", None)
+    p = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, cwd=ROOT, env=env,
+    )
+    if p.returncode != 0:
+        tail = p.stderr.strip().splitlines()[-1:] or ["?"]
+        raise RuntimeError(f"import {module} failed: {tail[0]}")
+    total = 0.0
+    direct: List[Tuple[str, float]] = []
+    names: List[str] = []
+    for line in p.stderr.splitlines():
+        m = _LINE.match(line)
+        if not m:
+            continue
+        name, ms, depth = m.group(4), int(m.group(2)) / 1000.0, len(m.group(3)) // 2
+        names.append(name)
+        if depth == 0:  # interpreter startup (site, encodings) + the module itself
+            total += ms
+        elif depth == 1:  # what the module (or an earlier top-level import) pulled in directly
+            direct.append((name, ms))
+    return total, direct, names
+
+
+def measure(module: str, repeat: int) -> Dict[str, Any]:
+    import_profile(module)  # first run writes .pyc files; don't count it
+    runs = [import_profile(module) for _ in range(repeat)]
+    totals = [r[0] for r in runs]
+    _, direct, names = runs[-1]
+    heavy = sorted({n for n in names if n.split(".")[0] in HEAVY})
+    return {
+        "module": module,
+        "median_ms": round(statistics.median(totals), 1),
+        "min_ms": round(min(totals), 1),
+        "slowest": [{"import": n, "ms": round(ms, 1)} for n, ms in sorted(direct, key=lambda t: -t[1])[:8]],
+        "heavy_imports": heavy,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Import-time startup benchmark with a budget.")
+    ap.add_argument("--modules", type=str, default=",".join(TARGETS))
+    ap.add_argument("--budget-ms", type=float, default=1000.0, help="max median import time per module")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--out", type=str, default="./tmp/bench_startup.json")
+    args = ap.parse_args()
+
+    results = [measure(m.strip(), args.repeat) for m in args.modules.split(",") if m.strip()]
+    failures = []
+    for r in results:
+        if r["median_ms"] > args.budget_ms:
+            failures.append(f"{r['module']}: {r['median_ms']}ms > budget {args.budget_ms}ms")
+        if r["heavy_imports"]:
+            failures.append(f"{r['module']}: imports {', '.join(r['heavy_imports'][:5])} eagerly")
+
+    out = Path(args.out)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps({
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": sys.version.split()[0],
+        "budget_ms": args.budget_ms,
+        "results": results,
+        "failures": failures,
+    }, indent=2))
+
+    print(f"{'module':<28}{'median ms':>10}{'min ms':>10}  slowest imports")
+    for r in results:
+        slow = ", ".join(f"{s['import']} {s['ms']}" for s in r["slowest"][:3])
+        print(f"{r['module']:<28}{r['median_ms']:>10}{r['min_ms']:>10}  {slow}")
+    print(f"Results saved to: {out.resolve()}")
+    if failures:
+        print("\nFAIL\n  " + "\n  ".join(failures))
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
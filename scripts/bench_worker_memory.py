@@ -0,0 +1,135 @@
+# scripts/bench_worker_memory.py
+"""
+Per-worker memory of the API: `uvicorn --workers N` (every worker loads its own models) vs
+scripts/serve.py (models loaded once, workers forked copy-on-write).
+
+Each mode is started with WARMUP_ON_START=1, so every worker has its models resident and has run
+one encode. Memory is sampled until the total stops moving, then RSS, PSS and USS
+(Private_Clean + Private_Dirty, the memory a worker alone adds) are read from
+/proc/<pid>/smaps_rollup for every worker. Linux only.
+
+    python -m scripts.bench_worker_memory --workers 4
+    RERANK_ENABLED=1 python -m scripts.bench_worker_memory --workers 4 --modes prefork
+"""
+import argparse, json, os, signal, subprocess, sys, time
+from pathlib import Path
+from typing import Dict, List
+
+COMMANDS = {
+    "uvicorn": lambda port, n: [sys.executable, "-m", "uvicorn", "app.api.server:app",
+                                "--port", str(port), "--workers", str(n), "--log-level", "warning"],
+    "prefork": lambda port, n: [sys.executable, "-m", "scripts.serve",
+                                "--port", str(port), "--workers", str(n), "--log-level", "warning"],
+}
+
+
+def mem_kb(pid: int) -> Dict[str, int]:
+    """Rss / Pss / Uss in kB from smaps_rollup."""
+    fields: Dict[str, int] = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[0].endswith(":") and parts[1].isdigit():
+                fields[parts[0][:-1]] = int(parts[1])
+    return {
+        "rss": fields.get("Rss", 0),
+        "pss": fields.get("Pss", 0),
+        "uss": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0),
+    }
+
+
+def children(pid: int) -> List[int]:
+    """Direct children, from /proc/*/stat (field 4 is the ppid)."""
+    out = []
+    for d in os.listdir("/proc"):
+        if not d.isdigit():
+            continue
+        try:
+            with open(f"/proc/{d}/stat") as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # the command name may contain spaces; fields after the closing paren are fixed
+        if int(stat.rsplit(")", 1)[1].split()[1]) == pid:
+            out.append(int(d))
+    return out
+
+
+def workers_of(pid: int, mode: str) -> List[int]:
+    kids = children(pid)
+    if mode == "uvicorn":
+        # uvicorn's multiprocessing supervisor also starts a resource tracker; workers import the app
+        kids = [k for k in kids if "resource_tracker" not in Path(f"/proc/{k}/cmdline").read_text(errors="ignore")]
+    return kids
+
+
+def measure(mode: str, port: int, n: int, settle: float, timeout: float) -> Dict:
+    env = {**os.environ, "WARMUP_ON_START": "1", "METRICS_ENABLED": os.getenv("METRICS_ENABLED", "1")}
+    proc = subprocess.Popen(COMMANDS[mode](port, n), env=env)
+    try:
+        deadline = time.time() + timeout
+        last, stable_since = -1, None
+        while time.time() < deadline:
+            time.sleep(2)
+            if proc.poll() is not None:
+                raise SystemExit(f"{mode}: server exited with {proc.returncode}")
+            pids = workers_of(proc.pid, mode)
+            if len(pids) < n:
+                continue
+            total = sum(mem_kb(p)["uss"] for p in pids)
+            if last > 0 and abs(total - last) <= 0.01 * last:
+                stable_since = stable_since or time.time()
+                if time.time() - stable_since >= settle:
+                    break
+            else:
+                stable_since = None
+            last = total
+        pids = workers_of(proc.pid, mode)
+        per = [mem_kb(p) for p in pids]
+        parent = mem_kb(proc.pid)
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        try:
+            proc.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+    mb = lambda kb: round(kb / 1024.0, 1)
+    return {
+        "mode": mode,
+        "workers": len(per),
+        "parent_rss_mb": mb(parent["rss"]),
+        "worker_rss_mb": mb(sum(p["rss"] for p in per) / max(1, len(per))),
+        "worker_pss_mb": mb(sum(p["pss"] for p in per) / max(1, len(per))),
+        "worker_uss_mb": mb(sum(p["uss"] for p in per) / max(1, len(per))),
+        # what the whole server really costs: every page counted once
+        "total_pss_mb": mb(parent["pss"] + sum(p["pss"] for p in per)),
+    }
+
+
+def main():
+    if not Path("/proc/self/smaps_rollup").exists():
+        raise SystemExit("needs Linux /proc/<pid>/smaps_rollup")
+    ap = argparse.ArgumentParser(description="RSS / PSS / USS per API worker, uvicorn --workers vs pre-fork.")
+    ap.add_argument("--workers", type=int, default=4)
+    ap.add_argument("--modes", default="uvicorn,prefork")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--settle", type=float, default=6.0, help="seconds the total must stay flat")
+    ap.add_argument("--timeout", type=float, default=300.0)
+    ap.add_argument("--out", default="tmp/bench_worker_memory.json")
+    args = ap.parse_args()
+
+    rows = [measure(m.strip(), args.port, args.workers, args.settle, args.timeout)
+            for m in args.modes.split(",") if m.strip()]
+
+    print(f"{'mode':<9}{'workers':>8}{'parent RSS':>12}{'RSS/worker':>12}{'PSS/worker':>12}{'USS/worker':>12}{'total PSS':>11}")
+    for r in rows:
+        print(f"{r['mode']:<9}{r['workers']:>8}{r['parent_rss_mb']:>12}{r['worker_rss_mb']:>12}"
+              f"{r['worker_pss_mb']:>12}{r['worker_uss_mb']:>12}{r['total_pss_mb']:>11}")
+    out = Path(args.out)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(rows, indent=2))
+    print(f"Results saved to: {out.resolve()}")
+
+
+if __name__ == "__main__":
+    main()
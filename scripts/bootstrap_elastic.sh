@@ -7,12 +7,20 @@ ES_PASS="${ELASTIC_PASSWORD:-changeme}"
 INDEX="${ELASTIC_INDEX_NAME:-rag_documents_v1}"
 ELSER_EP="${ELSER_ENDPOINT_ID:-elser_v2_endpoint}"
 PIPELINE="${ELSER_PIPELINE_ID:-elser_v2_pipeline}"
+# dense_vector index: int8_hnsw (default) | hnsw | int4_hnsw | bbq_hnsw (8.16+) | flat | int8_flat
+VEC_TYPE="${VECTOR_INDEX_TYPE:-int8_hnsw}"
+HNSW_M="${HNSW_M:-16}"
+HNSW_EF="${HNSW_EF_CONSTRUCTION:-100}"
+case "$VEC_TYPE" in
+  *hnsw) VEC_OPTS="{ \"type\": \"$VEC_TYPE\", \"m\": $HNSW_M, \"ef_construction\": $HNSW_EF }" ;;
+  *)     VEC_OPTS="{ \"type\": \"$VEC_TYPE\" }" ;;
+esac
 
 auth=(-u "$ES_USER:$ES_PASS" -H "Content-Type: application/json")
 
-echo "1) Create index: $INDEX"
+echo "1) Create index: $INDEX (vectors: $VEC_TYPE)"
 curl -sS "${auth[@]}" -X PUT "$ES_URL/$INDEX" \
-  -d @- <<'JSON'
+  -d @- <<JSON
 {
   "mappings": {
     "properties": {
@@ -21,7 +29,8 @@ curl -sS "${auth[@]}" -X PUT "$ES_URL/$INDEX" \
         "type": "dense_vector",
         "dims": 384,
         "index": true,
-        "similarity": "cosine"
+        "similarity": "cosine",
+        "index_options": $VEC_OPTS
       },
       "ml": {
         "properties": {
@@ -32,8 +41,10 @@ curl -sS "${auth[@]}" -X PUT "$ES_URL/$INDEX" \
       "filename":  { "type": "keyword" },
       "drive_url": { "type": "keyword" },
       "chunk_id":  { "type": "keyword" },
+      "collection": { "type": "keyword" },
       "page_start":{ "type": "integer" },
       "page_end":  { "type": "integer" },
+      "duplicate_of": { "type": "keyword" },
       "ingested_at": { "type": "date" }
     }
   }
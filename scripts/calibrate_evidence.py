@@ -0,0 +1,124 @@
+# scripts/calibrate_evidence.py
+"""
+Calibrate the evidence gate (app.generation.evidence) over an eval set.
+
+Every question in --qa is searched with per-hit cosine on. It counts as answerable when the
+retrieval hits its gold (scripts.eval.is_hit) and the item isn't marked "answerable": false;
+questions with "gold": null, answerable: false or a retrieval miss are the ones the gate should
+skip. For each mode, the thresholds (min_score, min_legs, min_cosine) come from a grid over the
+signal values seen on answerable questions. The setting kept is the one that skips the most
+unanswerable questions while still letting --target-recall of the answerable ones through.
+
+    python -m scripts.calibrate_evidence --modes elser,hybrid --k 5
+    python -m scripts.calibrate_evidence --qa data/eval/qa.jsonl --target-recall 0.95 --out tmp/evidence_calibration.json
+
+Add unanswerable questions to the eval set to give the gate something to learn from:
+    {"q": "What is the capital of Mars?", "gold": null, "answerable": false}
+"""
+import argparse, json, os
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from app.generation.evidence import SIGNALS, signals
+from app.retrieval.searcher import elser_only, hybrid_rrf
+from scripts.eval import is_hit
+
+MAX_GRID = 40  # candidate thresholds per signal
+
+
+def collect(mode: str, items: List[Dict[str, Any]], k: int) -> List[Dict[str, Any]]:
+    search_fn = elser_only if mode == "elser" else hybrid_rrf
+    rows = []
+    for it in items:
+        hits = search_fn(it["q"], k, filters=it.get("filters"), cosine=True)
+        gold = it.get("gold")
+        hit = bool(gold) and is_hit(hits, gold)[0]
+        sig = signals(hits, mode) if hits else {s: None for s in SIGNALS}
+        rows.append({"q": it["q"], "positive": hit and it.get("answerable", True) is not False, **sig})
+    return rows
+
+
+def _grid(values: np.ndarray) -> List[float]:
+    """0 (signal off) plus thresholds at the answerable questions' own values, thinned to MAX_GRID."""
+    vals = np.unique(values[~np.isnan(values)])
+    if len(vals) > MAX_GRID:
+        vals = np.quantile(vals, np.linspace(0, 1, MAX_GRID))
+    return [0.0] + [float(v) for v in vals]
+
+
+def fit(rows: List[Dict[str, Any]], target_recall: float) -> Dict[str, Any]:
+    pos = np.array([r["positive"] for r in rows], dtype=bool)
+    # a missing signal never fails the gate: treat it as +inf
+    cols = {s: np.array([np.inf if r[s] is None else r[s] for r in rows], dtype=float) for s in SIGNALS}
+    grids = {s: _grid(np.where(np.isinf(cols[s][pos]), np.nan, cols[s][pos])) if pos.any() else [0.0]
+             for s in SIGNALS}
+
+    best: Optional[Dict[str, Any]] = None
+    for ms in grids["score"]:
+        pass_score = cols["score"] >= ms
+        for ml in grids["legs"]:
+            pass_sl = pass_score & (cols["legs"] >= ml)
+            for mc in grids["cosine"]:
+                passed = pass_sl & (cols["cosine"] >= mc)
+                recall = passed[pos].mean() if pos.any() else 1.0
+                if recall < target_recall:
+                    continue
+                skipped_neg = int((~passed & ~pos).sum())
+                # most negatives skipped, then fewest positives lost, then the loosest thresholds
+                key = (skipped_neg, recall, -(ms + ml + mc))
+                if best is None or key > best["key"]:
+                    best = {"key": key, "thresholds": {"min_score": ms, "min_legs": ml, "min_cosine": mc},
+                            "answerable_kept": round(float(recall), 4),
+                            "unanswerable_skipped": skipped_neg,
+                            "skip_rate": round(float((~passed).mean()), 4)}
+    assert best is not None  # all-zero thresholds always reach recall 1.0
+    best.pop("key")
+    return {**best, "n": len(rows), "answerable": int(pos.sum()), "unanswerable": int((~pos).sum())}
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Fit evidence-gate thresholds on an eval set.")
+    ap.add_argument("--qa", default="data/eval/qa.jsonl")
+    ap.add_argument("--modes", default="elser,hybrid")
+    ap.add_argument("--k", type=int, default=5)
+    ap.add_argument("--target-recall", type=float, default=float(os.getenv("EVIDENCE_TARGET_RECALL", "0.98")),
+                    help="share of answerable questions that must still reach the LLM")
+    ap.add_argument("--out", default=os.getenv("EVIDENCE_CALIBRATION_PATH", "./tmp/evidence_calibration.json"))
+    ap.add_argument("--dump", help="also write every question's signals to this JSONL file")
+    args = ap.parse_args()
+
+    items = [json.loads(l) for l in Path(args.qa).read_text().splitlines() if l.strip()]
+    if not items:
+        raise SystemExit(f"no eval items in {args.qa}")
+
+    res: Dict[str, Any] = {"created_at": datetime.now(timezone.utc).isoformat(), "qa": args.qa, "k": args.k,
+                           "target_recall": args.target_recall, "modes": {}}
+    dump = []
+    for mode in [m.strip() for m in args.modes.split(",") if m.strip()]:
+        rows = collect(mode, items, args.k)
+        dump += [{"mode": mode, **r} for r in rows]
+        res["modes"][mode] = fit(rows, args.target_recall)
+
+    out = Path(args.out)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(res, indent=2))
+    if args.dump:
+        Path(args.dump).write_text("\n".join(json.dumps(r) for r in dump) + "\n")
+
+    print(f"{'mode':<8}{'n':>5}{'ans':>6}{'unans':>7}{'min_score':>11}{'min_legs':>10}{'min_cos':>9}"
+          f"{'kept':>7}{'skipped':>9}{'skip%':>7}")
+    for mode, r in res["modes"].items():
+        t = r["thresholds"]
+        print(f"{mode:<8}{r['n']:>5}{r['answerable']:>6}{r['unanswerable']:>7}{t['min_score']:>11.4g}"
+              f"{t['min_legs']:>10.0f}{t['min_cosine']:>9.3f}{r['answerable_kept']:>7}"
+              f"{r['unanswerable_skipped']:>9}{r['skip_rate'] * 100:>6.1f}%")
+        if not r["unanswerable"]:
+            print(f"  {mode}: no unanswerable questions in {args.qa}; thresholds stay off")
+    print(f"Calibration saved to: {out.resolve()}")
+
+
+if __name__ == "__main__":
+    main()
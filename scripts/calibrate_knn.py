@@ -0,0 +1,138 @@
+# scripts/calibrate_knn.py
+"""
+Offline kNN calibration: recall@k and latency per num_candidates.
+
+For a sample of query vectors (embedded questions from --qa, topped up with random stored chunk
+vectors), the exact top-k comes from a brute-force script_score (cosineSimilarity over every
+vector in the index, on the original float vectors), then the HNSW kNN search is run for each
+num_candidates in the grid. The result is written to KNN_CALIBRATION_PATH, which
+app.retrieval.knn_tuning reads to pick the cheapest num_candidates meeting KNN_TARGET_RECALL.
+
+    python -m scripts.calibrate_knn --k 50 --queries 100 --candidates 50,75,100,150,200,400
+    python -m scripts.calibrate_knn --qa data/eval/qa.jsonl --target-recall 0.98 --out tmp/knn_calibration.json
+"""
+import argparse, json, os, statistics, time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Set, Tuple
+
+from app.infra.es_client import get_es
+from app.retrieval.knn_tuning import calibrated_ratio
+from app.storage.collections import default_index
+
+VECTOR_FIELD = "vector"
+
+
+def sample_queries(es, index: str, qa: str | None, n: int, seed: int) -> List[List[float]]:
+    vecs: List[List[float]] = []
+    if qa and Path(qa).exists():
+        from app.retrieval.embedder import embed_query
+        items = [json.loads(l) for l in Path(qa).read_text().splitlines() if l.strip()]
+        vecs = [embed_query(it["q"]) for it in items[:n]]
+    if len(vecs) < n:
+        # stored chunk vectors stand in for queries; they're from the same distribution
+        resp = es.search(index=index, body={
+            "size": n - len(vecs),
+            "_source": [VECTOR_FIELD],
+            "query": {"function_score": {
+                "query": {"exists": {"field": VECTOR_FIELD}},
+                "random_score": {"seed": seed, "field": "_seq_no"},
+            }},
+        })
+        vecs += [h["_source"][VECTOR_FIELD] for h in resp["hits"]["hits"]]
+    return vecs
+
+
+def exact_top_k(es, index: str, qv: List[float], k: int) -> Set[str]:
+    resp = es.search(index=index, body={
+        "size": k,
+        "_source": False,
+        "query": {"script_score": {
+            "query": {"exists": {"field": VECTOR_FIELD}},
+            "script": {"source": f"cosineSimilarity(params.qv, '{VECTOR_FIELD}') + 1.0", "params": {"qv": qv}},
+        }},
+    }, request_timeout=300)
+    return {h["_id"] for h in resp["hits"]["hits"]}
+
+
+def ann_top_k(es, index: str, qv: List[float], k: int, num_candidates: int) -> Tuple[Set[str], float, float]:
+    t0 = time.perf_counter()
+    resp = es.search(index=index, body={
+        "size": k,
+        "_source": False,
+        "knn": {"field": VECTOR_FIELD, "query_vector": qv, "k": k, "num_candidates": num_candidates},
+    })
+    wall_ms = (time.perf_counter() - t0) * 1000.0
+    return {h["_id"] for h in resp["hits"]["hits"]}, float(resp.get("took", 0)), wall_ms
+
+
+def _pct(xs: List[float], p: float) -> float:
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(round(p * (len(xs) - 1))))]
+
+
+def calibrate(index: str, k: int, grid: List[int], queries: int, qa: str | None, seed: int) -> Dict[str, Any]:
+    es = get_es()
+    vecs = sample_queries(es, index, qa, queries, seed)
+    if not vecs:
+        raise SystemExit(f"no vectors found in {index}")
+    truth = [exact_top_k(es, index, qv, k) for qv in vecs]
+
+    points = []
+    for nc in sorted(set(max(k, c) for c in grid)):
+        recalls, took, wall = [], [], []
+        for qv, exact in zip(vecs, truth):
+            ids, t_ms, w_ms = ann_top_k(es, index, qv, k, nc)
+            recalls.append(len(ids & exact) / max(1, len(exact)))
+            took.append(t_ms)
+            wall.append(w_ms)
+        points.append({
+            "num_candidates": nc,
+            "recall": round(statistics.mean(recalls), 4),
+            "min_recall": round(min(recalls), 4),
+            "took_p50_ms": _pct(took, 0.5),
+            "took_p95_ms": _pct(took, 0.95),
+            "wall_p50_ms": round(_pct(wall, 0.5), 2),
+        })
+    count = es.count(index=index, query={"exists": {"field": VECTOR_FIELD}})["count"]
+    return {"index": index, "k": k, "queries": len(vecs), "vectors": count, "points": points}
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Measure kNN recall vs exact search per num_candidates.")
+    ap.add_argument("--index", default=default_index())
+    ap.add_argument("--k", type=int, default=50, help="neighbours per query (hybrid_rrf asks for its RRF window, >= 50)")
+    ap.add_argument("--candidates", default="50,75,100,150,200,300,500,1000")
+    ap.add_argument("--queries", type=int, default=100)
+    ap.add_argument("--qa", default="data/eval/qa.jsonl", help="questions to embed as queries (optional)")
+    ap.add_argument("--target-recall", type=float, default=float(os.getenv("KNN_TARGET_RECALL", "0.95")))
+    ap.add_argument("--seed", type=int, default=7)
+    ap.add_argument("--out", default=os.getenv("KNN_CALIBRATION_PATH", "./tmp/knn_calibration.json"))
+    args = ap.parse_args()
+
+    grid = [int(c) for c in args.candidates.split(",") if c.strip()]
+    res = calibrate(args.index, args.k, grid, args.queries, args.qa, args.seed)
+    ratio = calibrated_ratio(res["points"], args.k, args.target_recall)
+    res.update({
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "target_recall": args.target_recall,
+        "chosen_ratio": ratio,
+    })
+
+    out = Path(args.out)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(res, indent=2))
+
+    print(f"index={res['index']} vectors={res['vectors']} queries={res['queries']} k={args.k}")
+    print(f"{'num_cand':>9}{'recall':>9}{'min':>8}{'took p50':>10}{'took p95':>10}")
+    for p in res["points"]:
+        print(f"{p['num_candidates']:>9}{p['recall']:>9}{p['min_recall']:>8}{p['took_p50_ms']:>10}{p['took_p95_ms']:>10}")
+    if ratio is None:
+        print(f"No setting reached recall {args.target_recall}; widen --candidates.")
+    else:
+        print(f"num_candidates = {ratio:.2f} x k meets recall {args.target_recall}")
+    print(f"Calibration saved to: {out.resolve()}")
+
+
+if __name__ == "__main__":
+    main()
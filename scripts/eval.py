@@ -3,6 +3,7 @@ import argparse, json, sys, statistics
 from pathlib import Path
 
 from app.retrieval.searcher import elser_only, hybrid_rrf
+from app.retrieval.reranker import rerank_enabled
 
 def is_hit(hits, gold):
     """
@@ -27,7 +28,7 @@ def is_hit(hits, gold):
             return True, i
     return False, None
 
-def evaluate(mode, k, file, verbose=False):
+def evaluate(mode, k, file, verbose=False, rerank=None):
     lines = [json.loads(l) for l in Path(file).read_text().splitlines() if l.strip()]
     if not lines:
         print("No eval items found.", file=sys.stderr)
@@ -41,7 +42,8 @@ def evaluate(mode, k, file, verbose=False):
     for idx, item in enumerate(lines, start=1):
         q = item["q"]
         gold = item["gold"]
-        results = search_fn(q, k)
+        # optional per-item {"collection": ..., "filename": ...} pre-filters
+        results = search_fn(q, k, rerank_hits=rerank, filters=item.get("filters"))
 
         ok, rr = is_hit(results, gold)
         hits_count += int(ok)
@@ -66,6 +68,7 @@ def evaluate(mode, k, file, verbose=False):
     summary = {
         "mode": mode,
         "k": k,
+        "rerank": rerank_enabled(rerank),
         "n": n,
         "hit@k": round(hit_at_k, 4),
         "mrr@k": round(mrr, 4),
@@ -79,9 +82,10 @@ def main():
     ap.add_argument("--k", type=int, default=5)
     ap.add_argument("--file", default="data/eval/qa.jsonl")
     ap.add_argument("--verbose", action="store_true")
+    ap.add_argument("--rerank", action="store_true", help="Re-rank a larger candidate window with the cross-encoder")
     args = ap.parse_args()
 
-    evaluate(args.mode, args.k, args.file, args.verbose)
+    evaluate(args.mode, args.k, args.file, args.verbose, rerank=args.rerank or None)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,164 @@
+# scripts/fake_ollama.py
+"""
+A stand-in for Ollama's /api/generate that models prompt-prefix caching, for measuring prefill
+without a model.
+
+Like llama.cpp, it keeps the token sequence of the last request in each of `slots` KV-cache
+slots (OLLAMA_NUM_PARALLEL). A request takes the slot sharing the longest prefix with it, or the
+least recently used one when no slot shares at least half the prompt, and only "evaluates" the part of the prompt after that prefix. prompt_eval_count and
+prompt_eval_duration are reported the way Ollama reports them. Requests are templated
+phi3-style (system, user, assistant) and tokenised on words and punctuation. `context` is
+returned and accepted like the real API. stream() yields the NDJSON lines of a streaming request;
+the HTTP server here only answers `stream: false` (scripts/standin_server serves both).
+
+    python -m scripts.fake_ollama --port 11435 --slots 4 --prefill-ms 2 --decode-ms 20 --sleep
+    OLLAMA_BASE_URL=http://127.0.0.1:11435 python -m scripts.answer --q "..."
+"""
+import argparse, json, re, threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator, List, Optional
+
+_TOKENS = re.compile(r"\w+|[^\w\s]|\n")
+_PIECES = re.compile(r"\s*(?:\w+|[^\w\s])")  # streamed chunks: a token with its leading whitespace
+
+
+class FakeOllama:
+    def __init__(self, prefill_ms: float = 2.0, decode_ms: float = 20.0, sleep: bool = False,
+                 response: str = "I don't know.", slots: int = 1):
+        self.prefill_ms = prefill_ms
+        self.decode_ms = decode_ms
+        self.sleep = sleep
+        self.response = response
+        self._vocab: Dict[str, int] = {}
+        self._inv: List[str] = []
+        self._slots: List[List[int]] = [[] for _ in range(max(1, slots))]  # most recently used first
+        self._lock = threading.Lock()  # requests are served one at a time
+        self.requests = 0
+
+    def tokenize(self, text: str) -> List[int]:
+        ids = []
+        for t in _TOKENS.findall(text):
+            i = self._vocab.get(t)
+            if i is None:
+                i = self._vocab[t] = len(self._inv)
+                self._inv.append(t)
+            ids.append(i)
+        return ids
+
+    @staticmethod
+    def template(system: Optional[str], prompt: str) -> str:
+        sys_part = f"<|system|>\n{system}<|end|>\n" if system else ""
+        return f"{sys_part}<|user|>\n{prompt}<|end|>\n<|assistant|>\n"
+
+    def generate(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        return self._generate(body, decode=True)
+
+    def stream(self, body: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """`stream: true`: one line per generated token (decode_ms apart with sleep), then the stats."""
+        final = self._generate(body, decode=False)
+        for piece in _PIECES.findall(self.response):
+            if self.sleep:
+                time.sleep(self.decode_ms / 1000.0)
+            yield {"model": final["model"], "created_at": final["created_at"], "response": piece, "done": False}
+        yield {**final, "response": ""}
+
+    def _generate(self, body: Dict[str, Any], decode: bool) -> Dict[str, Any]:
+        with self._lock:
+            self.requests += 1
+            ctx = list(body.get("context") or [])
+            full = ctx + self.tokenize(self.template(None if ctx else body.get("system"), body.get("prompt", "")))
+            best, reused = len(self._slots) - 1, 0  # default: evict the least recently used slot
+            for i, slot in enumerate(self._slots):
+                n = 0
+                for a, b in zip(slot, full):
+                    if a != b:
+                        break
+                    n += 1
+                if n > reused:
+                    best, reused = i, n
+            if reused < 0.5 * len(full):
+                # llama.cpp only picks a slot by similarity above slot_prompt_similarity (0.5);
+                # otherwise it takes the least recently used one and keeps whatever prefix that has
+                best = len(self._slots) - 1
+                reused = 0
+                for a, b in zip(self._slots[best], full):
+                    if a != b:
+                        break
+                    reused += 1
+            evaluated = max(1, len(full) - reused)  # llama.cpp always evaluates the last token
+            out = self.tokenize(self.response)
+            prefill_s = evaluated * self.prefill_ms / 1000.0
+            decode_s = len(out) * self.decode_ms / 1000.0
+            if self.sleep:
+                time.sleep(prefill_s + (decode_s if decode else 0.0))
+            self._slots.pop(best)
+            self._slots.insert(0, full + out)
+        return {
+            "model": body.get("model", "fake"),
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "response": self.response,
+            "done": True,
+            "done_reason": "stop",
+            "context": full + out,
+            "prompt_eval_count": evaluated,
+            "prompt_eval_duration": int(prefill_s * 1e9),
+            "eval_count": len(out),
+            "eval_duration": int(decode_s * 1e9),
+            "load_duration": 0,
+            "total_duration": int((prefill_s + decode_s) * 1e9),
+            # not in the real API: what the cache saved
+            "prompt_tokens": len(full),
+            "prompt_cached_tokens": len(full) - evaluated,
+        }
+
+
+def make_server(fake: FakeOllama, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, code: int, payload: Dict[str, Any]) -> None:
+            data = json.dumps(payload).encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path == "/api/tags":
+                return self._send(200, {"models": [{"name": "fake"}]})
+            self._send(404, {"error": "not found"})
+
+        def do_POST(self):
+            if self.path != "/api/generate":
+                return self._send(404, {"error": "not found"})
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            self._send(200, fake.generate(body))
+
+        def log_message(self, *args):
+            pass
+
+    return ThreadingHTTPServer((host, port), Handler)
+
+
+def start(fake: FakeOllama, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    """Serve on a daemon thread; the URL is http://host:server.server_port."""
+    server = make_server(fake, host, port)
+    threading.Thread(target=server.serve_forever, name="fake-ollama", daemon=True).start()
+    return server
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Fake Ollama with prefix-cache accounting.")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=11435)
+    ap.add_argument("--slots", type=int, default=1, help="KV-cache slots, like OLLAMA_NUM_PARALLEL")
+    ap.add_argument("--prefill-ms", type=float, default=2.0, help="per evaluated prompt token")
+    ap.add_argument("--decode-ms", type=float, default=20.0, help="per generated token")
+    ap.add_argument("--sleep", action="store_true", help="actually take that long")
+    args = ap.parse_args()
+    server = make_server(FakeOllama(args.prefill_ms, args.decode_ms, args.sleep, slots=args.slots), args.host, args.port)
+    print(f"fake ollama on http://{args.host}:{server.server_port}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
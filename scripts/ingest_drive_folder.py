@@ -1,25 +1,128 @@
 # scripts/ingest_drive_folder.py
 import argparse
-from app.ingestion.ingestion_pipeline import run_ingestion, write_report, index_chunks
+from pathlib import Path
+from app.ingestion.ingestion_pipeline import (
+    run_ingestion, write_report, index_chunks, delete_file_chunks, default_collection,
+)
+from app.ingestion.dedup import DedupIndex, index_path
+from app.storage.collections import index_for
+from app.ingestion.sources import LocalDirClient, watch_directory
+from app.utils.settings import settings
+from app.utils.metrics import render_prometheus
+
+def _write_metrics(path: str | None) -> None:
+    if path:
+        mp = Path(path)
+        mp.parent.mkdir(parents=True, exist_ok=True)
+        mp.write_text(render_prometheus())
+        print(f"   Stage metrics: {mp.resolve()}")
+
+def with_orphaned_duplicates(source: LocalDirClient, dedup: DedupIndex | None, changed: list,
+                             removed: list) -> list:
+    """
+    The changed files plus the files whose near-duplicates were dropped or linked against chunks
+    of the changed/removed ones. Those chunks are about to be deleted, so the dependents are
+    re-ingested with them: their content is indexed again, or linked to the new canonical chunks.
+    """
+    if dedup is None:
+        return changed
+    gone = {f.file_id for f in changed} | set(removed)
+    extra = []
+    for fid in sorted(dedup.dependents(gone) - gone):
+        path = source.root / fid
+        if path.is_file():
+            extra.append(source.describe(path))
+    return changed + extra
 
 def main():
-    ap = argparse.ArgumentParser(description="Ingest PDFs from Google Drive.")
+    ap = argparse.ArgumentParser(description="Ingest PDFs from Google Drive or a local directory.")
     ap.add_argument("--folder-id", type=str, default=None, help="Override GDRIVE_FOLDER_ID")
+    ap.add_argument("--local-dir", type=str, default=None, help="Ingest PDFs from this directory instead of Drive")
+    ap.add_argument("--watch", action="store_true",
+                    help="With --local-dir: keep running and ingest PDFs as they are added/changed/removed")
+    ap.add_argument("--poll-interval", type=float, default=1.0, help="Watch mode rescan interval (seconds)")
+    ap.add_argument("--settle", type=float, default=1.0,
+                    help="Watch mode: a file must be unchanged this long before it is ingested")
+    ap.add_argument("--collection", type=str, default=None,
+                    help="Tag chunks with this collection (default: Drive folder id / directory name)")
     ap.add_argument("--limit", type=int, default=None, help="Limit number of files")
     ap.add_argument("--report", type=str, default="./tmp/ingestion_report.json", help="Report JSON path")
     ap.add_argument("--index", action="store_true", help="Index chunks into Elasticsearch via ELSER pipeline")
+    ap.add_argument("--metrics", type=str, default="./tmp/ingest_metrics.prom",
+                    help="Prometheus textfile with per-stage timings for this run")
+    ap.add_argument("--reset-dedup", action="store_true",
+                    help="Start from an empty near-duplicate index (e.g. after deleting the ES index)")
     args = ap.parse_args()
 
-    report, chunks = run_ingestion(folder_id=args.folder_id, limit_files=args.limit)
+    if args.watch and not args.local_dir:
+        ap.error("--watch needs --local-dir")
+
+    source = LocalDirClient(args.local_dir) if args.local_dir else None
+    # Snapshot before the initial pass so files landing during it are picked up by the watcher
+    baseline = source.snapshot() if args.watch else None
+    collection = args.collection or (
+        default_collection(source) if source else (args.folder_id or settings.gdrive_folder_id)
+    )
+
+    dedup = None
+    if settings.dedup_mode.lower() != "off":
+        path = index_path(collection)
+        dedup = DedupIndex(path) if args.reset_dedup else DedupIndex.load(path)
+
+    report, batches = run_ingestion(
+        folder_id=args.folder_id, limit_files=args.limit, dedup=dedup, source=source, collection=collection
+    )
     out = write_report(report, args.report)
     print(f"\n✅ Ingestion dry-run complete.")
     print(f"   Files seen: {report['files_seen']}")
     print(f"   Total chunks: {report['chunks_total']}")
+    print(f"   Collection: {collection} → index {index_for(collection)}")
+    if report.get("dedup"):
+        print(f"   Near-duplicates: {report['dedup']['duplicates']} ({report['dedup']['removed_pct']}%)")
     print(f"   Report saved to: {out}")
 
-    if args.index and chunks:
-        res = index_chunks(chunks)
+    if args.index and batches:
+        res = index_chunks(batches)
         print(f"✅ Indexed {res['indexed']} chunks into Elasticsearch")
+        if dedup is not None:
+            # only persist signatures of chunks that actually made it into the index
+            print(f"   Dedup index saved to: {dedup.save()}")
+
+    _write_metrics(args.metrics)
+
+    if not args.watch:
+        return
+
+    def on_change(changed, removed):
+        changed = with_orphaned_duplicates(source, dedup, changed, removed)
+        if dedup is not None:
+            # forget the old signatures, or the new version would be deduped against itself
+            dedup.remove([f.file_id for f in changed] + removed)
+        if args.index:
+            # changed files are re-chunked from scratch, so drop their old chunks first
+            n = delete_file_chunks([f.file_id for f in changed] + removed, collection=collection)
+            if n:
+                print(f"   Removed {n} stale chunks")
+        if not changed:
+            if args.index and dedup is not None:
+                dedup.save()
+            return
+        rep, new_batches = run_ingestion(dedup=dedup, source=source, files=changed, collection=collection)
+        write_report(rep, args.report)
+        names = ", ".join(f.filename for f in changed)
+        print(f"↻ {len(changed)} changed file(s) → {rep['chunks_total']} chunks ({names})")
+        if args.index and new_batches:
+            res = index_chunks(new_batches)
+            print(f"✅ Indexed {res['indexed']} chunks")
+            if dedup is not None:
+                dedup.save()
+        _write_metrics(args.metrics)
+
+    print(f"\n👀 Watching {source.root} (Ctrl-C to stop)")
+    try:
+        watch_directory(source, on_change, interval=args.poll_interval, settle=args.settle, baseline=baseline)
+    except KeyboardInterrupt:
+        pass
 
 if __name__ == "__main__":
     main()
@@ -1,4 +1,5 @@
-import argparse, json
+import argparse, json, sys
+from app.generation.guardrails import is_safe, REFUSAL
 from app.retrieval.searcher import elser_only, hybrid_rrf
 
 def main():
@@ -6,8 +7,17 @@ def main():
     p.add_argument("--mode", choices=["elser","hybrid"], default="elser")
     p.add_argument("--q", required=True, help="question/query")
     p.add_argument("--k", type=int, default=5)
+    p.add_argument("--rerank", action="store_true", help="cross-encoder re-ranking of a larger candidate window")
+    p.add_argument("--collection", action="append", help="restrict to a collection (repeatable)")
+    p.add_argument("--filename", action="append", help="restrict to a file name (repeatable)")
     a = p.parse_args()
-    results = elser_only(a.q, a.k) if a.mode=="elser" else hybrid_rrf(a.q, a.k)
+    if not is_safe(a.q):
+        print(REFUSAL, file=sys.stderr)
+        print(json.dumps([]))
+        return
+    search_fn = elser_only if a.mode=="elser" else hybrid_rrf
+    filters = {"collection": a.collection, "filename": a.filename}
+    results = search_fn(a.q, a.k, rerank_hits=a.rerank or None, filters=filters)
     print(json.dumps(results, indent=2))
 
 if __name__ == "__main__":
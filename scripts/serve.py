@@ -0,0 +1,115 @@
+# scripts/serve.py
+"""
+Pre-fork launcher for the API: load the models once, then fork the workers.
+
+`uvicorn --workers N` spawns fresh interpreters, so every worker loads its own MiniLM (and
+cross-encoder) and RSS grows with N. Here the parent imports the app, loads the weights
+(server.preload_models, no forward pass), freezes the GC so collections don't write to the shared
+objects' headers, binds the socket and forks. Workers read the same physical weight pages
+copy-on-write, so each one only adds its private memory.
+
+    python -m scripts.serve --workers 4 --port 8000
+    python -m scripts.serve --workers 4 --torch-threads 1   # 4 workers x 1 intra-op thread
+
+The parent supervises: a worker that dies is re-forked from the already-loaded parent (no reload),
+and SIGINT/SIGTERM are passed on to the workers for a graceful shutdown. Linux/macOS only (fork).
+Compare memory with `python -m scripts.bench_worker_memory`.
+"""
+import argparse, gc, os, signal, socket, sys, time
+from typing import Dict
+
+from app.utils.logging import get_logger
+
+log = get_logger("app.serve")
+
+
+def _bind(host: str, port: int, backlog: int = 2048) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _worker(app, sock: socket.socket, args) -> None:
+    import uvicorn
+
+    # default handlers back, uvicorn installs its own for graceful shutdown
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    if args.torch_threads and "torch" in sys.modules:
+        sys.modules["torch"].set_num_threads(args.torch_threads)
+    config = uvicorn.Config(app, log_level=args.log_level, lifespan="on", timeout_keep_alive=5)
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def _fork(app, sock: socket.socket, args) -> int:
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            _worker(app, sock, args)
+        except BaseException:
+            log.exception("worker %d crashed", os.getpid())
+            code = 1
+        finally:
+            os._exit(code)
+    return pid
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Serve the API from pre-forked workers sharing loaded models.")
+    ap.add_argument("--host", default=os.getenv("API_HOST", "0.0.0.0"))
+    ap.add_argument("--port", type=int, default=int(os.getenv("API_PORT", "8000")))
+    ap.add_argument("--workers", type=int, default=int(os.getenv("API_WORKERS", "2")))
+    ap.add_argument("--torch-threads", type=int, default=int(os.getenv("TORCH_THREADS_PER_WORKER", "0")),
+                    help="intra-op threads per worker (0 = torch default); cores / workers avoids oversubscription")
+    ap.add_argument("--log-level", default="info")
+    args = ap.parse_args()
+
+    t0 = time.perf_counter()
+    from app.api import server
+    server.preload_models()
+    gc.collect()
+    gc.freeze()  # everything loaded so far moves to the permanent generation: never scanned, never touched
+    log.info("models loaded in %.1fs; forking %d workers", time.perf_counter() - t0, args.workers)
+
+    sock = _bind(args.host, args.port)
+    workers: Dict[int, int] = {}  # pid -> slot
+    for slot in range(args.workers):
+        workers[_fork(server.app, sock, args)] = slot
+
+    stopping = False
+
+    def _stop(signum, _frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, _stop)
+    signal.signal(signal.SIGTERM, _stop)
+
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        slot = workers.pop(pid, None)
+        if slot is None:
+            continue
+        if not stopping:
+            log.warning("worker %d (slot %d) exited with status %d; re-forking", pid, slot, status)
+            time.sleep(1)  # don't spin if workers die at startup
+            workers[_fork(server.app, sock, args)] = slot
+    sock.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,435 @@
+# scripts/standin_es.py
+"""
+In-memory emulation of the slice of Elasticsearch this project uses, for scripts/standin_server.
+
+Documents live in dicts per index. Queries are evaluated exactly (no analysis beyond lowercase
+word tokens, no HNSW), which is plenty for latency, throughput and timeout work. It is not meant
+for relevance comparisons with a real cluster.
+
+Supported: bulk (index / create / delete, `pipeline` fills ml.tokens like the ELSER pipeline),
+search with `query`, top-level `knn` or `retriever.rrf` (standard + knn retrievers), msearch,
+count, delete_by_query, indices exists / create, and _inference sparse_embedding. Queries: bool,
+match, multi_match, term, terms, range, exists, ids, match_all, sparse_vector, text_expansion,
+script_score (cosineSimilarity), function_score (random_score). Also highlight (unified-style:
+one fragment), script_fields (query-vector cosine) and _source filtering.
+"""
+import fnmatch
+import hashlib
+import math
+import random
+import re
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+_WORD = re.compile(r"\w+")
+_STOP = frozenset("a an and are as at be by for from has in is it of on or that the to was were with what who".split())
+_CORPUS_WORDS = ("contract refund payment clause notice period employee leave policy warranty supplier invoice "
+                 "delivery liability insurance claim renewal deadline termination schedule budget audit").split()
+
+
+class ESError(Exception):
+    def __init__(self, status: int, etype: str, reason: str):
+        super().__init__(reason)
+        self.status, self.etype, self.reason = status, etype, reason
+
+    def body(self) -> Dict[str, Any]:
+        return {"error": {"type": self.etype, "reason": self.reason,
+                          "root_cause": [{"type": self.etype, "reason": self.reason}]}, "status": self.status}
+
+
+def words(text: Any) -> List[str]:
+    return _WORD.findall(str(text or "").lower())
+
+
+def expand(text: str) -> Dict[str, float]:
+    """Deterministic stand-in for ELSER: content words weighted by frequency, plus 3-char stems."""
+    toks: Dict[str, float] = {}
+    for w, n in Counter(w for w in words(text) if w not in _STOP).items():
+        toks[w] = round(1.0 + math.log(n), 4)
+        if len(w) > 4:
+            toks.setdefault(w[:4], 0.3)
+    return toks
+
+
+def synthetic_docs(n: int = 200, dims: int = 384, seed: int = 0) -> List[Dict[str, Any]]:
+    """Chunks with random prose, unit vectors and ml.tokens, shaped like index_chunks() output."""
+    rng = random.Random(seed)
+    docs = []
+    for i in range(n):
+        text = " ".join(rng.choice(_CORPUS_WORDS) for _ in range(60)) + "."
+        v = [rng.gauss(0.0, 1.0) for _ in range(dims)]
+        norm = sum(x * x for x in v) ** 0.5
+        docs.append({
+            "file_id": f"file{i // 10}", "filename": f"doc{i // 10}.pdf", "drive_url": f"file:///docs/doc{i // 10}.pdf",
+            "chunk_id": f"chunk{i:05d}", "page_start": i % 10 + 1, "page_end": i % 10 + 1,
+            "text": text, "vector": [x / norm for x in v], "ml": {"tokens": expand(text)},
+        })
+    return docs
+
+
+def _get(doc: Dict[str, Any], path: str) -> Any:
+    cur: Any = doc
+    for part in path.split("."):
+        if not isinstance(cur, dict) or part not in cur:
+            return None
+        cur = cur[part]
+    return cur
+
+
+def _query_text(q: Any) -> List[str]:
+    """The free text of a query clause (match / multi_match queries, text_expansion model_text)."""
+    if isinstance(q, list):
+        return [t for c in q for t in _query_text(c)]
+    if not isinstance(q, dict):
+        return []
+    out = []
+    for k, v in q.items():
+        if k in ("query", "model_text") and isinstance(v, str):
+            out.append(v)
+        elif k in ("match", "match_phrase") and isinstance(v, dict):
+            out += [x if isinstance(x, str) else x.get("query", "") for x in v.values()]
+        else:
+            out += _query_text(v)
+    return out
+
+
+def _cosine(a: List[float], b: List[float]) -> Optional[float]:
+    if not a or not b or len(a) != len(b):
+        return None
+    dot = sum(x * y for x, y in zip(a, b))
+    na = math.sqrt(sum(x * x for x in a))
+    nb = math.sqrt(sum(y * y for y in b))
+    return dot / (na * nb) if na and nb else 0.0
+
+
+class MiniES:
+    def __init__(self):
+        self.indices: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self.mappings: Dict[str, Dict[str, Any]] = {}
+        self._df: Dict[str, Counter] = {}  # index -> document frequency per word, rebuilt lazily
+        self._lock = threading.RLock()
+
+    # ---------- indices ----------
+    def resolve(self, expr: Optional[str], must_exist: bool = False) -> List[str]:
+        names: List[str] = []
+        for part in (expr or "_all").split(","):
+            part = part.strip()
+            if part in ("_all", "*"):
+                names += list(self.indices)
+            elif any(c in part for c in "*?"):
+                names += fnmatch.filter(self.indices, part)
+            elif part in self.indices:
+                names.append(part)
+            elif must_exist:
+                raise ESError(404, "index_not_found_exception", f"no such index [{part}]")
+        return list(dict.fromkeys(names))
+
+    def exists(self, index: str) -> bool:
+        return all(i in self.indices for i in index.split(","))
+
+    def create(self, index: str, body: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        with self._lock:
+            if index in self.indices:
+                raise ESError(400, "resource_already_exists_exception", f"index [{index}] already exists")
+            self.indices[index] = {}
+            self.mappings[index] = (body or {}).get("mappings", {})
+        return {"acknowledged": True, "shards_acknowledged": True, "index": index}
+
+    def delete_index(self, index: str) -> Dict[str, Any]:
+        with self._lock:
+            for name in self.resolve(index, must_exist=True):
+                self.indices.pop(name, None)
+                self._df.pop(name, None)
+        return {"acknowledged": True}
+
+    # ---------- writes ----------
+    def bulk(self, lines: List[Dict[str, Any]], default_index: Optional[str] = None,
+             pipeline: Optional[str] = None) -> Dict[str, Any]:
+        t0 = time.perf_counter()
+        items, errors, i = [], False, 0
+        with self._lock:
+            while i < len(lines):
+                (op, meta), = lines[i].items()
+                i += 1
+                index = meta.get("_index") or default_index
+                _id = meta.get("_id") or hashlib.sha1(f"{index}{i}{time.time_ns()}".encode()).hexdigest()[:20]
+                docs = self.indices.setdefault(index, {})
+                if op == "delete":
+                    found = docs.pop(_id, None) is not None
+                    items.append({op: {"_index": index, "_id": _id, "status": 200 if found else 404,
+                                       "result": "deleted" if found else "not_found"}})
+                    continue
+                src = lines[i]
+                i += 1
+                if op == "update":
+                    src = {**docs.get(_id, {}), **src.get("doc", {})}
+                if op == "create" and _id in docs:
+                    errors = True
+                    items.append({op: {"_index": index, "_id": _id, "status": 409,
+                                       "error": {"type": "version_conflict_engine_exception",
+                                                 "reason": f"[{_id}]: document already exists"}}})
+                    continue
+                if (meta.get("pipeline") or pipeline) and src.get("text") and not _get(src, "ml.tokens"):
+                    src = {**src, "ml": {**src.get("ml", {}), "tokens": expand(src["text"])}}
+                created = _id not in docs
+                docs[_id] = src
+                items.append({op: {"_index": index, "_id": _id, "status": 201 if created else 200,
+                                   "result": "created" if created else "updated"}})
+            self._df.clear()
+        return {"took": int((time.perf_counter() - t0) * 1000), "errors": errors, "items": items}
+
+    def delete_by_query(self, index: str, body: Dict[str, Any]) -> Dict[str, Any]:
+        t0 = time.perf_counter()
+        deleted = 0
+        with self._lock:
+            for name in self.resolve(index):
+                docs = self.indices[name]
+                for _id in [d for d, src in docs.items() if self._eval(body.get("query", {}), name, d, src) is not None]:
+                    del docs[_id]
+                    deleted += 1
+            self._df.clear()
+        return {"took": int((time.perf_counter() - t0) * 1000), "deleted": deleted, "total": deleted, "failures": []}
+
+    # ---------- reads ----------
+    def count(self, index: str, body: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        q = (body or {}).get("query", {"match_all": {}})
+        n = sum(1 for name in self.resolve(index) for d, src in list(self.indices[name].items())
+                if self._eval(q, name, d, src) is not None)
+        return {"count": n, "_shards": {"total": 1, "successful": 1, "skipped": 0, "failed": 0}}
+
+    def search(self, index: str, body: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        t0 = time.perf_counter()
+        body = body or {}
+        size = int(body.get("size", 10))
+        names = self.resolve(index, must_exist="*" not in (index or "") and index not in (None, "_all"))
+        if "retriever" in body:
+            if "highlight" in body:
+                raise ESError(400, "illegal_argument_exception", "[highlight] cannot be used in combination with [rank]")
+            scored = self._retriever(body["retriever"], names, size)
+        else:
+            scored = self._query_and_knn(body, names)
+        scored.sort(key=lambda x: (-x[0], x[2]))
+        total = len(scored)
+        hits = [self._hit(name, _id, score, body) for score, name, _id in scored[int(body.get("from", 0)):][:size]]
+        return {
+            "took": int((time.perf_counter() - t0) * 1000),
+            "timed_out": False,
+            "_shards": {"total": len(names), "successful": len(names), "skipped": 0, "failed": 0},
+            "hits": {"total": {"value": total, "relation": "eq"},
+                     "max_score": hits[0]["_score"] if hits else None, "hits": hits},
+        }
+
+    def msearch(self, lines: List[Dict[str, Any]], default_index: Optional[str] = None) -> Dict[str, Any]:
+        t0 = time.perf_counter()
+        responses = []
+        for header, body in zip(lines[0::2], lines[1::2]):
+            try:
+                r = self.search(header.get("index") or default_index, body)
+                r["status"] = 200
+            except ESError as e:
+                r = e.body()
+            responses.append(r)
+        return {"took": int((time.perf_counter() - t0) * 1000), "responses": responses}
+
+    # ---------- scoring ----------
+    def _query_and_knn(self, body: Dict[str, Any], names: List[str]) -> List[Tuple[float, str, str]]:
+        scores: Dict[Tuple[str, str], float] = {}
+        q = body.get("query")
+        if q is not None or "knn" not in body:
+            for name in names:
+                for _id, src in list(self.indices[name].items()):
+                    s = self._eval(q or {"match_all": {}}, name, _id, src)
+                    if s is not None:
+                        scores[(name, _id)] = s
+        if "knn" in body:
+            for knn in body["knn"] if isinstance(body["knn"], list) else [body["knn"]]:
+                for s, name, _id in self._knn(knn, names):
+                    scores[(name, _id)] = scores.get((name, _id), 0.0) + s
+        return [(s, n, d) for (n, d), s in scores.items()]
+
+    def _knn(self, knn: Dict[str, Any], names: List[str]) -> List[Tuple[float, str, str]]:
+        field, qv, k = knn["field"], knn["query_vector"], int(knn.get("k", 10))
+        filters = knn.get("filter") or []
+        filters = filters if isinstance(filters, list) else [filters]
+        out = []
+        for name in names:
+            for _id, src in list(self.indices[name].items()):
+                if any(self._eval(f, name, _id, src) is None for f in filters):
+                    continue
+                cos = _cosine(qv, _get(src, field) or [])
+                if cos is not None:
+                    out.append(((1.0 + cos) / 2.0, name, _id))
+        out.sort(key=lambda x: (-x[0], x[2]))
+        return out[:k]
+
+    def _retriever(self, r: Dict[str, Any], names: List[str], size: int) -> List[Tuple[float, str, str]]:
+        (kind, spec), = r.items()
+        if kind == "standard":
+            res = self._query_and_knn({"query": spec.get("query", {"match_all": {}})}, names)
+        elif kind == "knn":
+            res = self._knn(spec, names)
+        elif kind == "rrf":
+            window = int(spec.get("rank_window_size", max(size, 10)))
+            k = int(spec.get("rank_constant", 60))
+            fused: Dict[Tuple[str, str], float] = {}
+            for sub in spec["retrievers"]:
+                ranked = sorted(self._retriever(sub, names, window), key=lambda x: (-x[0], x[2]))[:window]
+                for rank, (_, name, _id) in enumerate(ranked, start=1):
+                    fused[(name, _id)] = fused.get((name, _id), 0.0) + 1.0 / (k + rank)
+            res = [(s, n, d) for (n, d), s in fused.items()]
+        else:
+            raise ESError(400, "parsing_exception", f"unknown retriever [{kind}]")
+        return res
+
+    def _df_for(self, index: str) -> Counter:
+        df = self._df.get(index)
+        if df is None:
+            df = Counter()
+            for src in list(self.indices[index].values()):
+                df.update(set(words(src.get("text"))) | set(words(src.get("filename"))))
+            self._df[index] = df
+        return df
+
+    def _match(self, index: str, fields: Iterable[str], text: str, src: Dict[str, Any]) -> Optional[float]:
+        """BM25-flavoured: saturated tf x idf, summed over query words and (boosted) fields."""
+        qwords = words(text)
+        n = max(1, len(self.indices[index]))
+        df = self._df_for(index)
+        best = None
+        for f in fields:
+            name, _, boost = f.partition("^")
+            tf = Counter(words(_get(src, name)))
+            s = sum((tf[w] / (tf[w] + 1.2)) * math.log(1 + (n - df[w] + 0.5) / (df[w] + 0.5)) for w in qwords if tf[w])
+            if s > 0:
+                s *= float(boost or 1.0)
+                best = s if best is None else max(best, s)
+        return best
+
+    def _eval(self, q: Dict[str, Any], index: str, _id: str, src: Dict[str, Any]) -> Optional[float]:
+        """Score of a document for a query clause, or None when it doesn't match."""
+        (kind, spec), = q.items()
+        if kind == "match_all":
+            return 1.0
+        if kind == "bool":
+            def clauses(key):
+                v = spec.get(key) or []
+                return v if isinstance(v, list) else [v]
+            score = 0.0
+            for c in clauses("must"):
+                s = self._eval(c, index, _id, src)
+                if s is None:
+                    return None
+                score += s
+            for c in clauses("filter"):
+                if self._eval(c, index, _id, src) is None:
+                    return None
+            for c in clauses("must_not"):
+                if self._eval(c, index, _id, src) is not None:
+                    return None
+            should = [s for s in (self._eval(c, index, _id, src) for c in clauses("should")) if s is not None]
+            msm = spec.get("minimum_should_match", 0 if clauses("must") or clauses("filter") else 1)
+            if clauses("should") and len(should) < int(msm):
+                return None
+            return score + sum(should)
+        if kind == "match":
+            (field, v), = spec.items()
+            return self._match(index, [field], v["query"] if isinstance(v, dict) else v, src)
+        if kind == "multi_match":
+            return self._match(index, spec.get("fields", ["text"]), spec["query"], src)
+        if kind == "term":
+            (field, v), = spec.items()
+            v = v.get("value") if isinstance(v, dict) else v
+            val = _get(src, field)
+            return 1.0 if val == v or (isinstance(val, list) and v in val) else None
+        if kind == "terms":
+            (field, vs), = spec.items()
+            val = _get(src, field)
+            vals = val if isinstance(val, list) else [val]
+            return 1.0 if any(x in vs for x in vals) else None
+        if kind == "range":
+            (field, r), = spec.items()
+            val = _get(src, field)
+            if val is None:
+                return None
+            ok = all([
+                "gte" not in r or val >= r["gte"], "gt" not in r or val > r["gt"],
+                "lte" not in r or val <= r["lte"], "lt" not in r or val < r["lt"],
+            ])
+            return 1.0 if ok else None
+        if kind == "exists":
+            return 1.0 if _get(src, spec["field"]) not in (None, [], {}) else None
+        if kind == "ids":
+            return 1.0 if _id in spec.get("values", []) else None
+        if kind == "sparse_vector":
+            return self._sparse(src, spec["field"], spec.get("query_vector") or expand(spec.get("query", "")))
+        if kind == "text_expansion":
+            (field, v), = spec.items()
+            return self._sparse(src, field, expand(v.get("model_text", "")))
+        if kind == "script_score":
+            if self._eval(spec.get("query", {"match_all": {}}), index, _id, src) is None:
+                return None
+            script = spec["script"]
+            qv = script.get("params", {}).get("qv") or script.get("params", {}).get("query_vector")
+            m = re.search(r"cosineSimilarity\(params\.\w+,\s*'([\w.]+)'\)", script.get("source", ""))
+            cos = _cosine(qv or [], _get(src, m.group(1)) or []) if m else None
+            if cos is None:
+                raise ESError(400, "script_exception", "stand-in only runs cosineSimilarity scripts")
+            return cos + (1.0 if "+ 1.0" in script.get("source", "") else 0.0)
+        if kind == "function_score":
+            base = self._eval(spec.get("query", {"match_all": {}}), index, _id, src)
+            if base is None:
+                return None
+            if "random_score" in spec:
+                seed = str(spec["random_score"].get("seed", 0))
+                return int(hashlib.md5((seed + _id).encode()).hexdigest()[:8], 16) / 0xFFFFFFFF
+            return base
+        raise ESError(400, "parsing_exception", f"unknown query [{kind}]")
+
+    @staticmethod
+    def _sparse(src: Dict[str, Any], field: str, qtokens: Dict[str, float]) -> Optional[float]:
+        dtokens = _get(src, field) or {}
+        s = sum(w * dtokens[t] for t, w in qtokens.items() if t in dtokens)
+        return s if s > 0 else None
+
+    # ---------- hit rendering ----------
+    def _hit(self, index: str, _id: str, score: float, body: Dict[str, Any]) -> Dict[str, Any]:
+        src = self.indices[index].get(_id, {})
+        hit: Dict[str, Any] = {"_index": index, "_id": _id, "_score": round(score, 6)}
+        want = body.get("_source", True)
+        if want is True:
+            hit["_source"] = src
+        elif isinstance(want, list):
+            hit["_source"] = {f: v for f in want if (v := _get(src, f)) is not None}
+        if "highlight" in body:
+            frag = self._highlight(src, body["highlight"], body)
+            if frag:
+                hit["highlight"] = frag
+        if "script_fields" in body:
+            fields = {}
+            for name, sf in body["script_fields"].items():
+                qv = sf["script"].get("params", {}).get("qv")
+                fields[name] = [_cosine(qv or [], src.get("vector") or [])]
+            hit["fields"] = fields
+        return hit
+
+    @staticmethod
+    def _highlight(src: Dict[str, Any], hl: Dict[str, Any], body: Dict[str, Any]) -> Dict[str, List[str]]:
+        out = {}
+        terms = {w for w in words(" ".join(_query_text(hl.get("highlight_query") or body.get("query") or {})))
+                 if w not in _STOP}
+        for field, opts in hl.get("fields", {}).items():
+            text = str(src.get(field) or "")
+            if not text:
+                continue
+            size = int(opts.get("fragment_size", hl.get("fragment_size", 100)))
+            m = next((m for m in _WORD.finditer(text) if m.group(0).lower() in terms), None)
+            if m is None:
+                if opts.get("no_match_size"):
+                    out[field] = [text[:int(opts["no_match_size"])]]
+                continue
+            start = max(0, m.start() - size // 4)
+            frag = text[start:start + size]
+            out[field] = [_WORD.sub(lambda w: f"<em>{w.group(0)}</em>" if w.group(0).lower() in terms else w.group(0), frag)]
+        return out
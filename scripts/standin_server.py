@@ -0,0 +1,533 @@
+# scripts/standin_server.py
+"""
+Local stand-in for Elasticsearch and Ollama on one port, so searcher / index_chunks / generation
+work can be run and benchmarked on a laptop with no cluster, no ELSER deployment and no model.
+
+    python -m scripts.standin_server --port 9250 --fault search.latency_ms=15 --fault generate.error_rate=0.05
+    ELASTIC_URL=http://127.0.0.1:9250 OLLAMA_BASE_URL=http://127.0.0.1:9250 python -m scripts.search --q "..."
+
+Three modes:
+
+  emulate  (default) answer from scripts.standin_es (in-memory ES: _search incl. retriever.rrf,
+           _msearch, _bulk, _count, _delete_by_query, ping, indices, _inference) and
+           scripts.fake_ollama (/api/generate, streaming and not)
+  record   proxy to --es-upstream / --ollama-upstream and append every exchange to --cassette
+  replay   answer from --cassette; requests it doesn't hold fall back to emulation, or fail
+           with a 500 under --strict. --replay-latency reproduces the recorded upstream timings.
+
+Cassette entries are keyed on method, path, sorted query string and the canonical JSON body, and
+repeated keys are replayed in recorded order (the last one then repeats).
+
+Faults are per operation (ping, info, indices, search, msearch, bulk, count, delete_by_query,
+inference, generate, tags, other; "*" for all) and are drawn from a seeded RNG per operation:
+
+  latency_ms / jitter_ms   fixed delay plus uniform 0..jitter
+  slow_rate / slow_ms      a fraction of requests gets slow_ms extra (a latency tail)
+  error_rate / error_status  a fraction fails (ES-style error body; Ollama {"error": ...})
+  hang_rate / hang_ms      a fraction stalls hang_ms and then drops the connection (timeouts)
+
+A request sent with an X-Opaque-Id (the ES client's opaque_id; the searcher tags its searches
+"rag:<leg>") also picks up the settings of "op:opaque-id", e.g. "search:rag:hybrid", so one query
+leg can be made to fail while BM25 keeps working.
+
+Set them with --fault op.key=value, or at runtime with POST /_standin/faults {"search": {...}}.
+GET /_standin/stats reports per-operation counts; POST /_standin/reset clears faults, stats and
+(with {"data": true}) the indices. Every response carries X-Elastic-Product: Elasticsearch, which
+the 8.x Python client checks for.
+"""
+import argparse, gzip, hashlib, json, os, random, socket, threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+from scripts.fake_ollama import FakeOllama
+from scripts.standin_es import ESError, MiniES, expand
+
+FAULT_KEYS = ("latency_ms", "jitter_ms", "slow_rate", "slow_ms", "error_rate", "error_status", "hang_rate", "hang_ms")
+_FAULT_DEFAULTS = {"error_status": 503, "hang_ms": 60_000.0}
+_ES_INFO = {
+    "name": "standin", "cluster_name": "standin", "cluster_uuid": "standin",
+    "version": {"number": "8.15.0", "build_flavor": "default", "lucene_version": "9.11.1",
+                "minimum_wire_compatibility_version": "7.17.0", "minimum_index_compatibility_version": "7.0.0"},
+    "tagline": "You Know, for Search",
+}
+
+
+def classify(method: str, path: str) -> str:
+    """Operation name of a request, used for faults and stats."""
+    parts = [p for p in path.split("/") if p]
+    if path.startswith("/api/"):
+        return {"generate": "generate", "tags": "tags"}.get(parts[1] if len(parts) > 1 else "", "other")
+    if not parts:
+        return "ping" if method == "HEAD" else "info"
+    if parts[0] == "_inference":
+        return "inference"
+    last = parts[-1]
+    if last in ("_search", "_msearch", "_bulk", "_count", "_delete_by_query"):
+        return last[1:]
+    if len(parts) == 1 and not parts[0].startswith("_"):
+        return "indices"
+    return "other"
+
+
+class Faults:
+    def __init__(self, spec: Optional[Dict[str, Dict[str, float]]] = None, seed: int = 0):
+        self.seed = seed
+        self._spec: Dict[str, Dict[str, float]] = {}
+        self._rngs: Dict[str, random.Random] = {}
+        self._lock = threading.Lock()
+        self.update(spec or {})
+
+    def update(self, spec: Dict[str, Dict[str, float]]) -> None:
+        with self._lock:
+            for op, values in spec.items():
+                bad = set(values) - set(FAULT_KEYS)
+                if bad:
+                    raise ValueError(f"unknown fault setting(s) for {op}: {sorted(bad)}")
+                self._spec.setdefault(op, {}).update({k: float(v) for k, v in values.items()})
+
+    def clear(self) -> None:
+        with self._lock:
+            self._spec.clear()
+            self._rngs.clear()
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {op: dict(v) for op, v in self._spec.items()}
+
+    def draw(self, op: str, tag: Optional[str] = None) -> Tuple[float, Optional[str], Dict[str, float]]:
+        """(delay seconds, None | "error" | "hang", settings) for one request."""
+        with self._lock:
+            f = {**_FAULT_DEFAULTS, **self._spec.get("*", {}), **self._spec.get(op, {})}
+            if tag:
+                f.update(self._spec.get(f"{op}:{tag}", {}))
+            rng = self._rngs.get(op)
+            if rng is None:
+                rng = self._rngs[op] = random.Random(f"{self.seed}:{op}")
+            delay = f.get("latency_ms", 0.0) + rng.uniform(0.0, f.get("jitter_ms", 0.0))
+            if rng.random() < f.get("slow_rate", 0.0):
+                delay += f.get("slow_ms", 0.0)
+            r = rng.random()
+            if r < f.get("hang_rate", 0.0):
+                outcome = "hang"
+            elif r < f.get("hang_rate", 0.0) + f.get("error_rate", 0.0):
+                outcome = "error"
+            else:
+                outcome = None
+        return delay / 1000.0, outcome, f
+
+
+def parse_fault(arg: str) -> Dict[str, Dict[str, float]]:
+    """"search.latency_ms=20" -> {"search": {"latency_ms": 20.0}}"""
+    target, _, value = arg.partition("=")
+    op, _, key = target.rpartition(".")
+    if not op or not value:
+        raise argparse.ArgumentTypeError(f"expected op.key=value, got {arg!r}")
+    return {op: {key: float(value)}}
+
+
+# ---------- cassette ----------
+def _canonical(body: bytes) -> str:
+    if not body:
+        return ""
+    text = body.decode("utf-8", "replace")
+    try:
+        return json.dumps(json.loads(text), sort_keys=True, separators=(",", ":"))
+    except ValueError:  # ndjson (bulk / msearch)
+        lines = []
+        for line in text.splitlines():
+            try:
+                lines.append(json.dumps(json.loads(line), sort_keys=True, separators=(",", ":")))
+            except ValueError:
+                lines.append(line)
+        return "\n".join(lines)
+
+
+def request_key(method: str, path: str, query: str, body: bytes) -> str:
+    qs = "&".join(f"{k}={v}" for k, v in sorted(parse_qsl(query, keep_blank_values=True)))
+    raw = f"{method} {path}?{qs}\n{_canonical(body)}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+class Cassette:
+    """Recorded exchanges: {"interactions": [{key, method, path, status, headers, body | chunks, elapsed_ms}]}."""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = Path(path) if path else None
+        self.interactions: List[Dict[str, Any]] = []
+        self._by_key: Dict[str, List[Dict[str, Any]]] = {}
+        self._served: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        if self.path and self.path.exists():
+            for it in json.loads(self.path.read_text()).get("interactions", []):
+                self._add(it)
+
+    def _add(self, it: Dict[str, Any]) -> None:
+        self.interactions.append(it)
+        self._by_key.setdefault(it["key"], []).append(it)
+
+    def add(self, it: Dict[str, Any]) -> None:
+        with self._lock:
+            self._add(it)
+            if self.path:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+                tmp.write_text(json.dumps({"interactions": self.interactions}, indent=1))
+                os.replace(tmp, self.path)
+
+    def next(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            recorded = self._by_key.get(key)
+            if not recorded:
+                return None
+            i = self._served.get(key, 0)
+            self._served[key] = i + 1
+            return recorded[min(i, len(recorded) - 1)]
+
+    def rewind(self) -> None:
+        with self._lock:
+            self._served.clear()
+
+
+# ---------- the stand-in ----------
+class Response:
+    def __init__(self, status: int, body: Any = None, headers: Optional[Dict[str, str]] = None,
+                 chunks: Optional[Iterable[bytes]] = None):
+        self.status = status
+        self.body = body if isinstance(body, (bytes, type(None))) else json.dumps(body).encode("utf-8")
+        self.headers = {"Content-Type": "application/json", **(headers or {})}
+        self.chunks = chunks  # streamed with chunked transfer encoding when set
+
+
+class StandIn:
+    def __init__(self, es: Optional[MiniES] = None, ollama: Optional[FakeOllama] = None,
+                 faults: Optional[Faults] = None, mode: str = "emulate", cassette: Optional[Cassette] = None,
+                 es_upstream: Optional[str] = None, ollama_upstream: Optional[str] = None,
+                 strict: bool = False, replay_latency: bool = False):
+        if mode not in ("emulate", "record", "replay"):
+            raise ValueError(f"unknown mode {mode!r}")
+        if mode == "record" and not (es_upstream or ollama_upstream):
+            raise ValueError("record mode needs es_upstream and/or ollama_upstream")
+        self.es = es or MiniES()
+        self.ollama = ollama or FakeOllama(prefill_ms=0.5, decode_ms=5.0)
+        self.faults = faults or Faults()
+        self.mode = mode
+        self.cassette = cassette or Cassette()
+        self.es_upstream = es_upstream.rstrip("/") if es_upstream else None
+        self.ollama_upstream = ollama_upstream.rstrip("/") if ollama_upstream else None
+        self.strict = strict
+        self.replay_latency = replay_latency
+        self.upstream_auth: Optional[str] = None  # the client's Authorization, forwarded when recording
+        self._stats: Dict[str, Dict[str, float]] = {}
+        self._stats_lock = threading.Lock()
+
+    # ---------- stats ----------
+    def count(self, op: str, **fields: float) -> None:
+        with self._stats_lock:
+            s = self._stats.setdefault(op, {"requests": 0, "errors_injected": 0, "hangs_injected": 0,
+                                            "delay_ms": 0.0, "replayed": 0, "replay_misses": 0, "recorded": 0})
+            s["requests"] += fields.pop("requests", 0)
+            for k, v in fields.items():
+                s[k] = s.get(k, 0) + v
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            per_op = {op: {k: round(v, 1) if isinstance(v, float) else v for k, v in s.items()}
+                      for op, s in self._stats.items()}
+        return {"mode": self.mode, "ops": per_op, "faults": self.faults.snapshot(),
+                "indices": {name: len(docs) for name, docs in self.es.indices.items()},
+                "cassette": len(self.cassette.interactions), "ollama_requests": self.ollama.requests}
+
+    def reset(self, data: bool = False) -> None:
+        self.faults.clear()
+        self.cassette.rewind()
+        with self._stats_lock:
+            self._stats.clear()
+        if data:
+            self.es.__init__()
+
+    # ---------- dispatch ----------
+    def handle(self, method: str, path: str, query: str, body: bytes) -> Response:
+        if path.startswith("/_standin"):
+            return self._admin(method, path, body)
+        if self.mode == "record":
+            return self._record(method, path, query, body)
+        if self.mode == "replay":
+            it = self.cassette.next(request_key(method, path, query, body))
+            if it is not None:
+                self.count(classify(method, path), replayed=1)
+                if self.replay_latency:
+                    time.sleep(it.get("elapsed_ms", 0) / 1000.0)
+                return self._replayed(it)
+            self.count(classify(method, path), replay_misses=1)
+            if self.strict:
+                return self._error(path, 500, "standin_cassette_miss",
+                                   f"no recorded response for {method} {path} (strict replay)")
+        return self._emulate(method, path, query, body)
+
+    def _emulate(self, method: str, path: str, query: str, body: bytes) -> Response:
+        params = dict(parse_qsl(query))
+        if path.startswith("/api/"):
+            return self._ollama(method, path, body)
+        parts = [p for p in path.split("/") if p]
+        try:
+            if not parts:
+                return Response(200, None if method == "HEAD" else _ES_INFO)
+            if parts[0] == "_inference":
+                texts = json.loads(body or b"{}").get("input") or []
+                texts = [texts] if isinstance(texts, str) else texts
+                return Response(200, {"sparse_embedding": [{"is_truncated": False, "embedding": expand(t)}
+                                                           for t in texts]})
+            if parts[0] == "_cluster":
+                return Response(200, {"cluster_name": "standin", "status": "green", "number_of_nodes": 1})
+            if parts[0] in ("_ingest", "_ml", "_security"):
+                return Response(200, {"acknowledged": True})
+            index = None if parts[0].startswith("_") else parts[0]
+            action = parts[-1] if parts[-1].startswith("_") else None
+            if action == "_bulk":
+                return Response(200, self.es.bulk(_ndjson(body), index, params.get("pipeline")))
+            if action == "_msearch":
+                return Response(200, self.es.msearch(_ndjson(body), index))
+            if action == "_search":
+                return Response(200, self.es.search(index or "_all", json.loads(body or b"{}")))
+            if action == "_count":
+                return Response(200, self.es.count(index or "_all", json.loads(body or b"{}")))
+            if action == "_delete_by_query":
+                return Response(200, self.es.delete_by_query(index or "_all", json.loads(body or b"{}")))
+            if action in ("_refresh", "_flush", "_forcemerge"):
+                return Response(200, {"_shards": {"total": 1, "successful": 1, "failed": 0}})
+            if index and action is None and len(parts) == 1:
+                if method == "HEAD":
+                    return Response(200 if self.es.exists(index) else 404, None)
+                if method == "PUT":
+                    return Response(200, self.es.create(index, json.loads(body or b"{}")))
+                if method == "DELETE":
+                    return Response(200, self.es.delete_index(index))
+            raise ESError(400, "illegal_argument_exception", f"stand-in has no handler for {method} {path}")
+        except ESError as e:
+            return Response(e.status, None if method == "HEAD" else e.body())
+        except (ValueError, KeyError, TypeError) as e:
+            return Response(400, ESError(400, "parsing_exception", f"{type(e).__name__}: {e}").body())
+
+    def _ollama(self, method: str, path: str, body: bytes) -> Response:
+        if path == "/api/tags":
+            return Response(200, {"models": [{"name": "fake", "model": "fake"}]})
+        if path == "/api/version":
+            return Response(200, {"version": "0.0.0-standin"})
+        if path != "/api/generate" or method != "POST":
+            return Response(404, {"error": f"no handler for {method} {path}"})
+        req = json.loads(body or b"{}")
+        if not req.get("stream", True):  # Ollama streams unless told not to
+            return Response(200, self.ollama.generate(req))
+        lines = (json.dumps(line).encode("utf-8") + b"\n" for line in self.ollama.stream(req))
+        return Response(200, headers={"Content-Type": "application/x-ndjson"}, chunks=lines)
+
+    # ---------- record / replay ----------
+    def _record(self, method: str, path: str, query: str, body: bytes) -> Response:
+        import requests
+        upstream = self.ollama_upstream if path.startswith("/api/") else self.es_upstream
+        if upstream is None:
+            return self._emulate(method, path, query, body)
+        op = classify(method, path)
+        headers = {"Content-Type": "application/x-ndjson" if op in ("bulk", "msearch") else "application/json"}
+        if self.upstream_auth:
+            headers["Authorization"] = self.upstream_auth
+        t0 = time.perf_counter()
+        r = requests.request(method, f"{upstream}{path}" + (f"?{query}" if query else ""), data=body or None,
+                             headers=headers, stream=True, timeout=600)
+        it: Dict[str, Any] = {
+            "key": request_key(method, path, query, body), "method": method, "path": path, "query": query,
+            "status": r.status_code, "headers": {"Content-Type": r.headers.get("Content-Type", "application/json")},
+        }
+        self.count(op, recorded=1)
+        if r.headers.get("Content-Type", "").startswith("application/x-ndjson"):
+            def relay():
+                chunks, offsets = [], []
+                for line in r.iter_lines():
+                    chunks.append(line.decode("utf-8"))
+                    offsets.append(round((time.perf_counter() - t0) * 1000, 2))
+                    yield line + b"\n"
+                self.cassette.add({**it, "chunks": chunks, "chunk_ms": offsets, "elapsed_ms": offsets[-1] if offsets else 0})
+            return Response(r.status_code, headers=it["headers"], chunks=relay())
+        content = r.content
+        self.cassette.add({**it, "body": content.decode("utf-8"), "elapsed_ms": round((time.perf_counter() - t0) * 1000, 2)})
+        return Response(r.status_code, content if method != "HEAD" else None, headers=it["headers"])
+
+    def _replayed(self, it: Dict[str, Any]) -> Response:
+        if "chunks" in it:
+            def lines():
+                prev = 0.0
+                for line, at in zip(it["chunks"], it.get("chunk_ms") or [0.0] * len(it["chunks"])):
+                    if self.replay_latency:
+                        time.sleep(max(0.0, at - prev) / 1000.0)
+                        prev = at
+                    yield line.encode("utf-8") + b"\n"
+            return Response(it["status"], headers=it.get("headers"), chunks=lines())
+        body = it.get("body")
+        return Response(it["status"], body.encode("utf-8") if body is not None else None, headers=it.get("headers"))
+
+    # ---------- admin ----------
+    def _admin(self, method: str, path: str, body: bytes) -> Response:
+        req = json.loads(body or b"{}")
+        if path == "/_standin/stats":
+            return Response(200, self.stats())
+        if path == "/_standin/faults":
+            if method in ("POST", "PUT"):
+                if req.pop("_replace", False):
+                    self.faults.clear()
+                try:
+                    self.faults.update(req)
+                except ValueError as e:
+                    return Response(400, {"error": str(e)})
+            return Response(200, self.faults.snapshot())
+        if path == "/_standin/reset" and method == "POST":
+            self.reset(data=bool(req.get("data")))
+            return Response(200, {"acknowledged": True})
+        return Response(404, {"error": f"no handler for {method} {path}"})
+
+    @staticmethod
+    def _error(path: str, status: int, etype: str, reason: str) -> Response:
+        if path.startswith("/api/"):
+            return Response(status, {"error": reason})
+        return Response(status, ESError(status, etype, reason).body())
+
+
+def _ndjson(body: bytes) -> List[Dict[str, Any]]:
+    return [json.loads(line) for line in body.decode("utf-8").splitlines() if line.strip()]
+
+
+# ---------- HTTP ----------
+def make_server(standin: StandIn, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, as the ES client's connection pool expects
+
+        def _body(self) -> bytes:
+            if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+                data = b""
+                while True:
+                    n = int(self.rfile.readline().split(b";")[0], 16)
+                    if n == 0:
+                        self.rfile.readline()
+                        break
+                    data += self.rfile.read(n)
+                    self.rfile.readline()
+            else:
+                data = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            if self.headers.get("Content-Encoding", "").lower() == "gzip":
+                data = gzip.decompress(data)
+            return data
+
+        def _handle(self):
+            url = urlsplit(self.path)
+            body = self._body()
+            if standin.mode == "record" and self.headers.get("Authorization"):
+                standin.upstream_auth = self.headers["Authorization"]
+            op = classify(self.command, url.path)
+            if url.path.startswith("/_standin"):
+                return self._send(standin.handle(self.command, url.path, url.query, body))
+            delay, outcome, f = standin.faults.draw(op, self.headers.get("X-Opaque-Id"))
+            standin.count(op, requests=1, delay_ms=delay * 1000.0)
+            if delay:
+                time.sleep(delay)
+            if outcome == "hang":
+                standin.count(op, hangs_injected=1)
+                time.sleep(f["hang_ms"] / 1000.0)
+                self.close_connection = True
+                try:
+                    self.connection.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+                return
+            if outcome == "error":
+                standin.count(op, errors_injected=1)
+                status = int(f["error_status"])
+                return self._send(standin._error(url.path, status, "standin_injected_fault",
+                                                 f"injected {status} for {op}"))
+            self._send(standin.handle(self.command, url.path, url.query, body))
+
+        def _send(self, resp: Response) -> None:
+            self.send_response(resp.status)
+            self.send_header("X-Elastic-Product", "Elasticsearch")
+            for k, v in resp.headers.items():
+                self.send_header(k, v)
+            try:
+                if resp.chunks is not None:
+                    self.send_header("Transfer-Encoding", "chunked")
+                    self.end_headers()
+                    for chunk in resp.chunks:
+                        self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+                        self.wfile.flush()
+                    self.wfile.write(b"0\r\n\r\n")
+                    return
+                body = resp.body or b""
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                if self.command != "HEAD":
+                    self.wfile.write(body)
+            except (BrokenPipeError, ConnectionResetError):
+                self.close_connection = True  # the client gave up (its timeout); nothing to do
+
+        do_GET = do_POST = do_PUT = do_DELETE = do_HEAD = _handle
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    return server
+
+
+def start(standin: StandIn, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    """Serve on a daemon thread; the URL is http://host:server.server_port."""
+    server = make_server(standin, host, port)
+    threading.Thread(target=server.serve_forever, name="standin", daemon=True).start()
+    return server
+
+
+def load_bulk_file(es: MiniES, path: str, index: Optional[str] = None) -> int:
+    """Seed the in-memory indices from an _bulk-format NDJSON file; returns the item count."""
+    return len(es.bulk(_ndjson(Path(path).read_bytes()), index)["items"])
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Elasticsearch + Ollama stand-in with record/replay and fault injection.")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=9250)
+    ap.add_argument("--mode", choices=("emulate", "record", "replay"), default="emulate")
+    ap.add_argument("--cassette", help="JSON file written in record mode, read in replay mode")
+    ap.add_argument("--es-upstream", help="real Elasticsearch to record from, e.g. http://localhost:9200")
+    ap.add_argument("--ollama-upstream", help="real Ollama to record from, e.g. http://localhost:11434")
+    ap.add_argument("--strict", action="store_true", help="replay: fail requests missing from the cassette")
+    ap.add_argument("--replay-latency", action="store_true", help="replay: sleep the recorded upstream time")
+    ap.add_argument("--fault", type=parse_fault, action="append", default=[], metavar="OP.KEY=VALUE",
+                    help=f"keys: {', '.join(FAULT_KEYS)}; op '*' applies to every operation")
+    ap.add_argument("--seed", type=int, default=0, help="fault RNG seed")
+    ap.add_argument("--load", action="append", default=[], metavar="BULK_NDJSON", help="seed the emulated indices")
+    ap.add_argument("--prefill-ms", type=float, default=0.5, help="fake Ollama: per evaluated prompt token")
+    ap.add_argument("--decode-ms", type=float, default=5.0, help="fake Ollama: per generated token")
+    ap.add_argument("--no-sleep", action="store_true", help="fake Ollama: report timings without sleeping them")
+    ap.add_argument("--response", default="I don't know.", help="fake Ollama answer text")
+    args = ap.parse_args()
+
+    faults = Faults(seed=args.seed)
+    for f in args.fault:
+        faults.update(f)
+    standin = StandIn(
+        ollama=FakeOllama(args.prefill_ms, args.decode_ms, sleep=not args.no_sleep, response=args.response),
+        faults=faults, mode=args.mode, cassette=Cassette(args.cassette),
+        es_upstream=args.es_upstream, ollama_upstream=args.ollama_upstream,
+        strict=args.strict, replay_latency=args.replay_latency,
+    )
+    for path in args.load:
+        print(f"loaded {load_bulk_file(standin.es, path)} docs from {path}")
+    server = make_server(standin, args.host, args.port)
+    print(f"stand-in ({args.mode}) on http://{args.host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+Fixtures around the local Elasticsearch/Ollama stand-in (scripts/standin_server):
+
+  standin         the server (one per session): .url, .standin (StandIn), .faults(op=..., **settings),
+                  .reset(data=False), .stats()
+  standin_env     points ELASTIC_URL / OLLAMA_BASE_URL at it for one test and drops cached ES
+                  clients, the hedging executor (breakers) and cached ELSER expansions;
+                  faults and stats are reset after
+  standin_corpus  standin_env plus a synthetic corpus bulk-loaded into ELASTIC_INDEX_NAME
+  api             call(method, path, json=None, headers=None) -> ApiResponse against the FastAPI
+                  app, driven in-process over ASGI (no HTTP client library needed)
+
+    python -m pytest
+    python -m pytest --standin-mode replay --standin-cassette tmp/es.json
+"""
+import asyncio
+import json
+from typing import Any, Dict, List, Optional
+
+import pytest
+import requests
+
+from scripts.fake_ollama import FakeOllama
+from scripts.standin_es import synthetic_docs
+from scripts.standin_server import Cassette, Faults, StandIn, start
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("standin")
+    group.addoption("--standin-mode", choices=("emulate", "record", "replay"), default="emulate")
+    group.addoption("--standin-cassette", default=None, help="record / replay file")
+    group.addoption("--standin-es-upstream", default=None)
+    group.addoption("--standin-ollama-upstream", default=None)
+    group.addoption("--standin-strict", action="store_true", help="replay: fail on requests not in the cassette")
+    group.addoption("--standin-seed", type=int, default=0)
+
+
+class Handle:
+    def __init__(self, standin: StandIn, url: str):
+        self.standin, self.url = standin, url
+
+    def faults(self, op: str = "*", **settings: float) -> None:
+        self.standin.faults.update({op: settings})
+
+    def reset(self, data: bool = False) -> None:
+        self.standin.reset(data=data)
+
+    def stats(self) -> Dict[str, Any]:
+        return self.standin.stats()
+
+
+class ApiResponse:
+    def __init__(self, status: int, headers: Dict[str, str], chunks: List[bytes]):
+        self.status, self.headers, self.chunks = status, headers, chunks
+        self.body = b"".join(chunks)
+
+    def json(self) -> Any:
+        return json.loads(self.body)
+
+    def lines(self) -> List[Any]:
+        """NDJSON body, one parsed object per line."""
+        return [json.loads(line) for line in self.body.decode().splitlines() if line.strip()]
+
+
+def call_asgi(app, method: str, path: str, json_body: Any = None,
+              headers: Optional[Dict[str, str]] = None) -> ApiResponse:
+    data = b"" if json_body is None else json.dumps(json_body).encode()
+    hdrs = {"content-type": "application/json", **{k.lower(): v for k, v in (headers or {}).items()}}
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": method,
+        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"", "root_path": "",
+        "headers": [(k.encode(), v.encode()) for k, v in hdrs.items()],
+        "client": ("127.0.0.1", 50000), "server": ("testserver", 80),
+    }
+
+    async def run():
+        messages = []
+        pending = [{"type": "http.request", "body": data, "more_body": False}]
+
+        async def receive():
+            if pending:
+                return pending.pop()
+            await asyncio.Event().wait()  # the client never disconnects
+
+        async def send(message):
+            messages.append(message)
+
+        await app(scope, receive, send)
+        return messages
+
+    messages = asyncio.run(run())
+    start = next(m for m in messages if m["type"] == "http.response.start")
+    chunks = [m["body"] for m in messages if m["type"] == "http.response.body" and m.get("body")]
+    return ApiResponse(start["status"], {k.decode().lower(): v.decode() for k, v in start["headers"]}, chunks)
+
+
+@pytest.fixture
+def api():
+    from app.api.server import app
+    return lambda method, path, json=None, headers=None: call_asgi(app, method, path, json, headers)
+
+
+@pytest.fixture(scope="session")
+def standin(request):
+    opt = request.config.getoption
+    s = StandIn(
+        ollama=FakeOllama(prefill_ms=0.5, decode_ms=5.0),
+        faults=Faults(seed=opt("--standin-seed")),
+        mode=opt("--standin-mode"),
+        cassette=Cassette(opt("--standin-cassette")),
+        es_upstream=opt("--standin-es-upstream"),
+        ollama_upstream=opt("--standin-ollama-upstream"),
+        strict=opt("--standin-strict"),
+    )
+    server = start(s)
+    yield Handle(s, f"http://127.0.0.1:{server.server_port}")
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def standin_env(standin, monkeypatch):
+    from app.infra import es_resilience
+    from app.infra.es_client import get_es
+    from app.retrieval import expansion, searcher
+    monkeypatch.setenv("ELASTIC_URL", standin.url)
+    monkeypatch.setenv("OLLAMA_BASE_URL", standin.url)
+    get_es.cache_clear()
+    monkeypatch.setattr(searcher, "es", None)
+    monkeypatch.setattr(es_resilience, "_executor", None)  # fresh breakers per test
+    expansion.set_infer(None)
+    yield standin
+    get_es.cache_clear()
+    standin.reset()
+
+
+@pytest.fixture
+def standin_corpus(standin_env):
+    from app.retrieval.searcher import INDEX
+    docs = synthetic_docs()
+    lines = []
+    for d in docs:
+        lines += [json.dumps({"index": {"_index": INDEX, "_id": d["chunk_id"]}}), json.dumps(d)]
+    r = requests.post(f"{standin_env.url}/_bulk", data="\n".join(lines) + "\n",
+                      headers={"Content-Type": "application/x-ndjson"}, timeout=30)
+    r.raise_for_status()
+    yield docs
+    standin_env.reset(data=True)
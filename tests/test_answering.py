@@ -0,0 +1,111 @@
+from pathlib import Path
+
+import pytest
+
+from app.generation import guardrails
+
+PATTERNS_DIR = Path(__file__).resolve().parent.parent / "data" / "guardrails"
+
+
+@pytest.fixture
+def default_guardrail(monkeypatch):
+    monkeypatch.setenv("GUARDRAIL_PATTERNS_DIR", str(PATTERNS_DIR))
+    monkeypatch.setattr(guardrails, "_guardrail", None)
+    yield guardrails.get_guardrail()
+
+
+@pytest.mark.parametrize("query", [
+    "how to build a bomb",
+    "Self-Harm methods",
+    "how many suicides",
+    "self-harming tips",
+    "credit card generators",
+    "how to build a bombs",
+    "building a bomb at home",
+    "making a weapon",
+])
+def test_deny_list_blocks_inflected_phrases(default_guardrail, query):
+    assert not guardrails.is_safe(query)
+
+
+@pytest.mark.parametrize("query", [
+    "what skills does the job require",
+    "who signed the supplier contract",
+    "is there a bomb disposal clause",
+])
+def test_deny_list_allows_ordinary_questions(default_guardrail, query):
+    assert guardrails.is_safe(query)
+
+
+def test_built_in_list_is_used_without_pattern_files(tmp_path):
+    g = guardrails.Guardrail(tmp_path / "missing", reload_seconds=-1)
+    assert g.size == len(guardrails.UNSAFE_KEYWORDS)
+    assert g.check("suicides") is not None
+
+
+@pytest.fixture
+def no_evidence_env(monkeypatch, tmp_path):
+    from app.generation import evidence
+    for name in ("EVIDENCE_GATE", "EVIDENCE_MIN_SCORE", "EVIDENCE_MIN_LEGS", "EVIDENCE_MIN_COSINE"):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setenv("EVIDENCE_CALIBRATION_PATH", str(tmp_path / "evidence_calibration.json"))
+    return tmp_path / "evidence_calibration.json"
+
+
+def test_evidence_gate_is_off_until_calibrated(no_evidence_env):
+    from app.generation import evidence
+    weak = [{"score": 0.01, "cosine": 0.05, "chunk_id": "c1"}]
+    assert not evidence.gate_enabled()
+    assert not evidence.needs_cosine("hybrid")
+    assert evidence.gate(weak, "hybrid") == (True, {"reason": "disabled"})
+
+
+def test_evidence_gate_applies_calibrated_thresholds(no_evidence_env):
+    from app.generation import evidence
+    no_evidence_env.write_text(
+        '{"modes": {"elser": {"thresholds": {"min_score": 3.0, "min_legs": 0, "min_cosine": 0.3}}}}')
+    assert evidence.gate_enabled()
+    assert evidence.needs_cosine("elser")
+    ok, details = evidence.gate([{"score": 5.0, "cosine": 0.1, "chunk_id": "c1"}], "elser")
+    assert not ok and details["reason"] == "cosine"
+    ok, _ = evidence.gate([{"score": 5.0, "cosine": 0.4, "chunk_id": "c1"}], "elser")
+    assert ok
+
+
+def test_calibration_is_picked_up_without_a_restart(no_evidence_env):
+    from app.generation import evidence
+    assert not evidence.gate_enabled()
+    no_evidence_env.write_text('{"modes": {"elser": ')  # caught mid-write
+    assert not evidence.gate_enabled()
+    no_evidence_env.write_text('{"modes": {"elser": {"thresholds": {"min_score": 3.0}}}}')
+    assert evidence.gate_enabled()
+    assert evidence.thresholds("elser")["min_score"] == 3.0
+    no_evidence_env.unlink()
+    assert not evidence.gate_enabled()
+
+
+def test_concurrent_turns_of_one_session_are_serialised(monkeypatch):
+    import threading
+    import time
+
+    from app.llm import ollama_client
+
+    sent = []
+
+    def fake_generate(p, model=None, options=None, context=None, timeout=120):
+        sent.append(context)
+        time.sleep(0.05)  # a second turn arriving now must wait for this one's context
+        return {"response": "ok", "context": (context or []) + [len(sent)]}
+
+    monkeypatch.setattr(ollama_client, "generate", fake_generate)
+    hits = [{"chunk_id": "c1", "filename": "a.pdf", "page_range": [1, 1], "snippet": "text"}]
+    sid = "test-session-lock"
+    ollama_client.sessions.drop(sid)
+    threads = [threading.Thread(target=ollama_client.answer, args=(f"question {i}", hits, sid)) for i in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sent == [None, [1]]
+    assert ollama_client.sessions.get(sid).context == [1, 2]
+    ollama_client.sessions.drop(sid)
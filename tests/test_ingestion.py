@@ -0,0 +1,223 @@
+import os
+import time
+
+import numpy as np
+import pytest
+
+from app.ingestion.dedup import DedupIndex, dedup_chunks
+from app.ingestion.models import ChunkBatch
+
+TEXTS = [
+    f"section {i} of the supplier agreement covers payment terms, notice periods and the refund "
+    f"policy for order {i}, including the invoice schedule and the liability cap of clause {i}"
+    for i in range(5)
+]
+
+
+def _batch(file_id, texts):
+    n = len(texts)
+    return ChunkBatch(file_id=file_id, filename=f"{file_id}.pdf", drive_url=f"file:///{file_id}.pdf",
+                      texts=list(texts), page_start=np.arange(1, n + 1), page_end=np.arange(1, n + 1))
+
+
+def test_chunk_batch_take_keeps_columns_aligned():
+    b = _batch("a", TEXTS)
+    b.collection = "legal"
+    b.duplicate_of = [None, "x1", None, "x3", None]
+    sub = b.take([3, 1])
+    assert sub.texts == [TEXTS[3], TEXTS[1]]
+    assert sub.chunk_ids == [b.chunk_ids[3], b.chunk_ids[1]]
+    assert sub.page_start.tolist() == [4, 2] and sub.page_start.dtype == np.int32
+    assert sub.duplicate_of == ["x3", "x1"]
+    assert (sub.file_id, sub.ingested_at, sub.collection) == ("a", b.ingested_at, "legal")
+    assert len(b.take([])) == 0
+
+
+def test_chunk_batch_round_trips_through_pydantic_chunks():
+    b = _batch("a", TEXTS[:3])
+    b.duplicate_of = [None, None, "c0"]
+    chunks = b.to_chunks()
+    assert [c.chunk_id for c in chunks] == b.chunk_ids
+    assert [(c.page_start, c.page_end) for c in chunks] == [(1, 1), (2, 2), (3, 3)]
+    assert [c.duplicate_of for c in chunks] == [None, None, "c0"]
+    back = ChunkBatch.from_chunks(chunks)
+    assert (back.texts, back.chunk_ids, back.duplicate_of) == (b.texts, b.chunk_ids, b.duplicate_of)
+    assert back.page_end.tolist() == b.page_end.tolist() and back.ingested_at == b.ingested_at
+    assert ChunkBatch.from_chunks(_batch("a", TEXTS[:1]).to_chunks()).duplicate_of is None
+
+
+def test_from_chunks_rejects_mixed_files():
+    chunks = _batch("a", TEXTS[:1]).to_chunks() + _batch("b", TEXTS[1:2]).to_chunks()
+    with pytest.raises(ValueError):
+        ChunkBatch.from_chunks(chunks)
+    with pytest.raises(ValueError):
+        ChunkBatch.from_chunks([])
+
+
+def test_dedup_drops_copies_from_other_files():
+    idx = DedupIndex(threshold=0.85)
+    kept, dups = dedup_chunks(_batch("a", TEXTS), idx, mode="drop")
+    assert (len(kept), dups) == (5, 0)
+    kept, dups = dedup_chunks(_batch("b", TEXTS[:3]), idx, mode="drop")
+    assert (len(kept), dups) == (0, 3)
+
+
+def test_changed_file_is_not_deduped_against_its_old_version():
+    idx = DedupIndex(threshold=0.85)
+    dedup_chunks(_batch("a", TEXTS), idx, mode="drop")
+    # watch mode: the file changed, its old chunks are deleted and it is re-chunked
+    assert idx.remove(["a"]) == 5
+    assert len(idx) == 0
+    kept, dups = dedup_chunks(_batch("a", TEXTS + ["a new closing section about renewal deadlines"]), idx, mode="drop")
+    assert (len(kept), dups) == (6, 0)
+
+
+def test_file_never_matches_its_own_signatures():
+    idx = DedupIndex(threshold=0.85)
+    dedup_chunks(_batch("a", TEXTS), idx, mode="drop")
+    kept, dups = dedup_chunks(_batch("a", TEXTS), idx, mode="drop")
+    assert (len(kept), dups) == (5, 0)
+
+
+def test_link_mode_points_at_live_chunks_after_remove():
+    idx = DedupIndex(threshold=0.85)
+    a = _batch("a", TEXTS)
+    dedup_chunks(a, idx, mode="link")
+    b = _batch("b", TEXTS)
+    dedup_chunks(b, idx, mode="link")
+    assert b.duplicate_of == a.chunk_ids
+    idx.remove(["a"])  # file a was deleted
+    a2 = _batch("a", TEXTS)
+    dedup_chunks(a2, idx, mode="link")
+    assert a2.duplicate_of is None  # nothing links to the deleted chunk ids any more
+
+
+def test_index_round_trip_keeps_file_ids(tmp_path):
+    idx = DedupIndex(str(tmp_path / "dedup.npz"), threshold=0.85)
+    dedup_chunks(_batch("a", TEXTS), idx, mode="drop")
+    idx.save()
+    loaded = DedupIndex.load(str(tmp_path / "dedup.npz"), threshold=0.85)
+    assert loaded.file_ids == ["a"] * 5
+    assert loaded.remove(["a"]) == 5
+
+
+def test_changing_a_canonical_file_reingests_its_duplicates(tmp_path):
+    from app.ingestion.sources import LocalDirClient
+    from scripts.ingest_drive_folder import with_orphaned_duplicates
+
+    for name in ("a.pdf", "b.pdf", "c.pdf"):
+        (tmp_path / name).write_bytes(b"%PDF-1.4")
+    source = LocalDirClient(str(tmp_path))
+    idx = DedupIndex(str(tmp_path / "dedup.npz"), threshold=0.85)
+    dedup_chunks(_batch("a.pdf", TEXTS), idx, mode="drop")
+    dedup_chunks(_batch("b.pdf", TEXTS[:3]), idx, mode="drop")  # all dropped against a.pdf
+    dedup_chunks(_batch("c.pdf", ["an unrelated memo about the office move and parking permits"]), idx, mode="drop")
+    idx.save()
+    idx = DedupIndex.load(str(tmp_path / "dedup.npz"), threshold=0.85)
+    assert idx.dependents(["a.pdf"]) == {"b.pdf"}
+
+    # watch mode: a.pdf was rewritten, so b.pdf lost the chunks its content was dropped against
+    changed = with_orphaned_duplicates(source, idx, [source.describe(tmp_path / "a.pdf")], [])
+    assert [f.file_id for f in changed] == ["a.pdf", "b.pdf"]
+    idx.remove([f.file_id for f in changed])
+    dedup_chunks(_batch("a.pdf", ["a rewritten agreement that no longer repeats the old sections"]), idx, mode="drop")
+    kept, dups = dedup_chunks(_batch("b.pdf", TEXTS[:3]), idx, mode="drop")
+    assert (len(kept), dups) == (3, 0)
+    assert idx.dependents(["a.pdf"]) == set()
+
+
+def test_words_mode_skips_the_tokenizer(monkeypatch):
+    from app.ingestion import tokenizer
+    from app.utils.settings import settings
+
+    def boom():
+        raise AssertionError("tokenizer loaded for report stats in words mode")
+
+    monkeypatch.setattr(settings, "chunk_mode", "words")
+    monkeypatch.setattr(settings, "chunk_token_stats", False)
+    monkeypatch.setattr(tokenizer, "get_tokenizer", boom)
+    assert tokenizer.chunk_token_lengths(TEXTS) is None
+
+
+def test_parallel_extraction_matches_inline_and_reuses_one_pool(monkeypatch):
+    import random
+
+    from app.ingestion import pdf_extractor
+    from app.utils.settings import settings
+    from scripts.bench_ingestion import make_pdf
+
+    pdf = make_pdf(12, 40, random.Random(3))
+    monkeypatch.setattr(settings, "pdf_parallel_min_pages", 1)
+    monkeypatch.setattr(settings, "pdf_pages_per_task", 5)
+    inline = list(pdf_extractor.iter_pages_from_pdf_bytes(pdf, workers=1))
+    first = list(pdf_extractor.iter_pages_from_pdf_bytes(pdf, workers=2))
+    pool = pdf_extractor._pool
+    second = list(pdf_extractor.iter_pages_from_pdf_bytes(pdf, workers=2, with_blocks=True))
+    assert pdf_extractor._pool is pool
+    assert [(p.page_number, p.text) for p in first] == [(p.page_number, p.text) for p in inline]
+    assert [p.page_number for p in second] == list(range(1, 13)) and all(p.blocks for p in second)
+
+
+def _open_temp_pdfs(pids):
+    found = []
+    for pid in pids:
+        try:
+            fds = os.listdir(f"/proc/{pid}/fd")
+        except OSError:
+            continue
+        for fd in fds:
+            try:
+                target = os.readlink(f"/proc/{pid}/fd/{fd}")
+            except OSError:
+                continue
+            if "rag-pdf-" in target:
+                found.append(target)
+    return found
+
+
+@pytest.mark.skipif(not os.path.isdir("/proc/self/fd"), reason="needs /proc")
+def test_workers_release_the_unlinked_temp_pdf(monkeypatch):
+    import random
+
+    from app.ingestion import pdf_extractor
+    from app.utils.settings import settings
+    from scripts.bench_ingestion import make_pdf
+
+    monkeypatch.setattr(settings, "pdf_parallel_min_pages", 1)
+    monkeypatch.setattr(settings, "pdf_pages_per_task", 2)
+    pages = list(pdf_extractor.iter_pages_from_pdf_bytes(make_pdf(12, 40, random.Random(4)), workers=2))
+    assert len(pages) == 12
+    pids = list(pdf_extractor._pool._processes)
+    deadline = time.monotonic() + 5 * pdf_extractor.WORKER_IDLE_CLOSE + 2
+    while _open_temp_pdfs(pids) and time.monotonic() < deadline:
+        time.sleep(0.1)
+    assert _open_temp_pdfs(pids) == []
+
+
+def test_client_side_elser_falls_back_to_the_pipeline(monkeypatch):
+    from elasticsearch import ApiError
+    from app.ingestion import ingestion_pipeline
+    from app.retrieval import expansion
+
+    class Meta:
+        status = 404
+
+    def no_endpoint(texts):
+        raise ApiError("resource_not_found_exception", meta=Meta(), body={})
+
+    sent = []
+
+    def bulk(es, actions, **kw):
+        sent.extend(actions)
+        return len(sent), {}
+
+    monkeypatch.setenv("ELSER_INGEST_MODE", "client")
+    monkeypatch.setattr(ingestion_pipeline, "make_es", lambda: None)
+    monkeypatch.setattr(ingestion_pipeline, "embed_texts", lambda texts: [[0.0] * 384 for _ in texts])
+    monkeypatch.setattr(ingestion_pipeline.helpers, "bulk", bulk)
+    expansion.set_infer(no_endpoint)
+    try:
+        assert ingestion_pipeline.index_chunks([_batch("a", TEXTS)])["indexed"] == 5
+    finally:
+        expansion.set_infer(None)
+    assert all(a["pipeline"] == "elser_v2_pipeline" and "ml" not in a["_source"] for a in sent)
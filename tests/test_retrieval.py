@@ -0,0 +1,228 @@
+import json
+
+import pytest
+
+from app.retrieval import knn_tuning
+
+
+def test_uncalibrated_num_candidates_matches_old_default(monkeypatch, tmp_path):
+    monkeypatch.setenv("KNN_CALIBRATION_PATH", str(tmp_path / "missing.json"))
+    monkeypatch.delenv("KNN_MIN_CANDIDATES", raising=False)
+    monkeypatch.delenv("KNN_CANDIDATE_RATIO", raising=False)
+    assert [knn_tuning.num_candidates(k) for k in (5, 10, 20, 50, 100)] == [max(100, k * 2) for k in (5, 10, 20, 50, 100)]
+
+
+def test_calibrated_num_candidates_can_go_below_the_fallback_floor(monkeypatch, tmp_path):
+    cal = tmp_path / "knn.json"
+    cal.write_text(json.dumps({"k": 10, "points": [{"num_candidates": 15, "recall": 0.97},
+                                                   {"num_candidates": 10, "recall": 0.80}]}))
+    monkeypatch.setenv("KNN_CALIBRATION_PATH", str(cal))
+    monkeypatch.delenv("KNN_MIN_CANDIDATES", raising=False)
+    assert knn_tuning.num_candidates(10) == 15
+    monkeypatch.setenv("KNN_MIN_CANDIDATES", "40")
+    assert knn_tuning.num_candidates(10) == 40
+
+
+def test_elser_leg_defaults_to_server_side_text_expansion(monkeypatch):
+    from app.retrieval import expansion
+    monkeypatch.delenv("ELSER_QUERY_MODE", raising=False)
+    assert "text_expansion" in expansion.elser_query("refund policy")
+
+
+def test_failed_expansion_raises_expansion_error(monkeypatch):
+    from app.retrieval import expansion
+    monkeypatch.setenv("ELSER_QUERY_MODE", "cached")
+
+    def down(texts):
+        raise TimeoutError("ML node busy")
+
+    expansion.set_infer(down)
+    try:
+        with pytest.raises(expansion.ExpansionError):
+            expansion.elser_query("refund policy")
+    finally:
+        expansion.set_infer(None)
+
+
+def test_half_open_breaker_only_listens_to_its_probe():
+    from app.infra.es_resilience import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+    b = CircuitBreaker("test", min_requests=2, error_rate=0.5, cooldown=0.0)
+    stale = b.allow()  # in flight while the breaker opens
+    b.record(False, b.allow())
+    b.record(False, b.allow())
+    assert b.state == OPEN
+
+    probe = b.allow()
+    assert probe is not None and b.state == HALF_OPEN
+    assert b.allow() is None  # one probe at a time
+    b.record(True, stale)
+    b.record(False, stale)
+    assert b.state == HALF_OPEN
+    b.record(True, probe)
+    assert b.state == CLOSED
+
+
+class _KeywordScorer:
+    """Stand-in cross-encoder: a pair scores the number of times its chunk mentions `word`."""
+
+    def __init__(self, word):
+        self.word, self.batches = word, []
+
+    def score(self, pairs):
+        self.batches.append(len(pairs))
+        return [float(text.lower().split().count(self.word)) for _, text in pairs]
+
+
+def test_candidate_window_is_capped_but_never_below_k(monkeypatch):
+    from app.retrieval import reranker
+    monkeypatch.setenv("RERANK_CANDIDATES", "30")
+    assert [reranker.candidate_window(k) for k in (1, 5, 10, 50)] == [4, 20, 30, 50]
+
+
+def test_rerank_scores_one_batch_and_keeps_the_top_k(monkeypatch):
+    from app.retrieval import reranker
+    scorer = _KeywordScorer("refund")
+    monkeypatch.setattr(reranker, "_get_scorer", lambda: scorer)
+    hits = [{"chunk_id": f"c{i}", "score": 10.0 - i, "text": "refund " * i} for i in range(6)]
+    top = reranker.rerank("refund policy", hits, 3)
+    assert scorer.batches == [6]
+    assert [h["chunk_id"] for h in top] == ["c5", "c4", "c3"]
+    assert [h["score"] for h in top] == [5.0, 6.0, 7.0]  # ES scores are left as they were
+    assert reranker.rerank("refund policy", [], 3) == []
+
+
+def test_filter_clauses_map_each_filter_to_one_clause():
+    from app.storage.collections import filter_clauses
+    assert filter_clauses(None) == [] and filter_clauses({"file_id": [], "filename": ""}) == []
+    assert filter_clauses({
+        "collection": "legal", "file_id": ["f1", "f2"],
+        "ingested_after": "2024-01-01", "ingested_before": "2024-06-30",
+    }) == [
+        {"term": {"collection": "legal"}},
+        {"terms": {"file_id": ["f1", "f2"]}},
+        {"range": {"ingested_at": {"gte": "2024-01-01", "lte": "2024-06-30"}}},
+    ]
+    with pytest.raises(ValueError, match="unknown filter"):
+        filter_clauses({"author": "me"})
+
+
+def test_search_index_only_touches_the_requested_collections(monkeypatch):
+    from app.storage.collections import index_for, search_index
+    monkeypatch.setenv("ELASTIC_INDEX_NAME", "rag_documents_v1")
+    monkeypatch.setenv("ELASTIC_COLLECTION_INDEXES", "legal=rag_legal_v1, hr=rag_hr_v1,broken")
+    assert index_for("legal") == "rag_legal_v1" and index_for("misc") == "rag_documents_v1"
+    assert search_index({"collection": "legal"}) == "rag_legal_v1"
+    assert search_index({"collection": ["legal", "misc", "other"]}) == "rag_legal_v1,rag_documents_v1"
+    assert search_index(None) == "rag_documents_v1,rag_legal_v1,rag_hr_v1"
+
+
+def test_snippet_window_centres_on_the_query_terms():
+    from app.utils.snippets import SnippetBuilder
+    filler = " ".join(f"word{i}" for i in range(60))
+    text = f"{filler} the refund policy allows a refund within thirty days {filler}"
+    b = SnippetBuilder("What is the refund policy?", width=80)
+    snip = b.window(text)
+    assert "refund policy allows a refund" in snip and len(snip) <= 80
+    assert not text.startswith(snip) and f" {snip} " in f" {text} "  # cut at word boundaries
+    assert b.window("short text") == "short text"
+    assert SnippetBuilder("the and", width=20).window(filler).startswith("word0 word1")
+    assert b.mark("Refund policy, refunds") == "<mark>Refund</mark> <mark>policy</mark>, refunds"
+
+
+def test_format_hits_prefers_the_es_highlight():
+    from app.retrieval.searcher import format_hits
+    from app.utils.snippets import strip_highlight
+    assert strip_highlight("the <em>refund</em> <em>policy</em>") == "the refund policy"
+    resp = {"hits": {"hits": [
+        {"_score": 2.0, "_source": {"chunk_id": "c1", "page_start": 1, "page_end": 2},
+         "highlight": {"text": ["our <em>refund</em> rules"]}},
+        {"_score": 1.0, "_source": {"chunk_id": "c2", "text": "nothing about it here " * 20 + "refund rules"}},
+        {"_score": 0.5, "_source": {"chunk_id": "c3"}},
+    ]}}
+    hits = format_hits(resp, q="refund rules")
+    assert [h["snippet"] for h in hits[::2]] == ["our refund rules", None]  # c3: filled by the follow-up
+    assert hits[1]["snippet"].endswith("refund rules") and "text" not in hits[1]
+    assert hits[0]["page_range"] == [1, 2]
+    assert format_hits(resp, keep_text=True, q="refund")[1]["text"].startswith("nothing")
+
+
+class _GatedFn:
+    """fn(items) for a MicroBatcher: records each batch; the first call waits for `release`."""
+
+    def __init__(self, fail_on=None):
+        import threading
+        self.calls, self.fail_on = [], fail_on
+        self.started, self.release = threading.Event(), threading.Event()
+
+    def __call__(self, items):
+        self.calls.append(list(items))
+        if len(self.calls) == 1:
+            self.started.set()
+            self.release.wait(5)
+        if self.fail_on in items:
+            raise ValueError(f"bad item {self.fail_on}")
+        return [i * 10 for i in items]
+
+
+def test_micro_batcher_serves_queued_callers_in_one_batch():
+    from app.utils.batching import MicroBatcher
+    fn = _GatedFn()
+    b = MicroBatcher(fn, max_batch=3, max_wait_ms=0, name="t")
+    try:
+        first = b.submit(0)
+        assert fn.started.wait(5)
+        rest = [b.submit(i) for i in range(1, 6)]  # queued while the first batch runs
+        fn.release.set()
+        assert [f.result(5) for f in [first] + rest] == [0, 10, 20, 30, 40, 50]
+        assert fn.calls == [[0], [1, 2, 3], [4, 5]]  # capped at max_batch, order kept
+    finally:
+        b.close()
+    with pytest.raises(RuntimeError):
+        b.submit(6)
+
+
+def test_micro_batcher_fails_only_the_batch_that_raised():
+    from app.utils.batching import MicroBatcher
+    fn = _GatedFn(fail_on=2)
+    b = MicroBatcher(fn, max_batch=2, max_wait_ms=0, name="t")
+    try:
+        first = b.submit(0)
+        assert fn.started.wait(5)
+        futs = [b.submit(i) for i in (1, 2, 3)]
+        fn.release.set()
+        assert first.result(5) == 0
+        for f in futs[:2]:
+            with pytest.raises(ValueError):
+                f.result(5)
+        assert futs[2].result(5) == 30  # the worker lives on
+    finally:
+        b.close()
+
+
+def test_micro_batcher_rejects_a_short_result_list():
+    from app.utils.batching import MicroBatcher
+    b = MicroBatcher(lambda items: items[:-1], name="t")
+    try:
+        with pytest.raises(RuntimeError, match="0 results for 1 items"):
+            b(7, timeout=5)
+    finally:
+        b.close()
+
+
+def test_embed_query_goes_through_the_batcher(monkeypatch):
+    from app.retrieval import embedder
+    batches = []
+
+    def encode(texts):
+        batches.append(list(texts))
+        return [[float(len(t))] for t in texts]
+
+    monkeypatch.setattr(embedder, "_encode_batch", encode)
+    embedder.start_batching(max_batch=4, max_wait_ms=0)
+    try:
+        assert embedder._batcher.fn is encode
+        assert embedder.embed_query("abc") == [3.0]
+    finally:
+        embedder.stop_batching()
+    assert embedder._batcher is None
+    assert embedder.embed_query("abcd") == [4.0] and batches == [["abc"], ["abcd"]]
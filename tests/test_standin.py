@@ -0,0 +1,242 @@
+import json
+import marshal
+import time
+
+import pytest
+import requests
+
+from app.infra import es_resilience
+from app.retrieval import searcher
+
+
+def _es_client():
+    pytest.importorskip("elasticsearch")
+
+
+def test_bulk_indexes_the_corpus(standin_corpus, standin_env):
+    r = requests.get(f"{standin_env.url}/{searcher.INDEX}/_count", timeout=10)
+    assert r.json()["count"] == len(standin_corpus)
+    assert standin_env.stats()["ops"]["bulk"]["requests"] == 1
+
+
+def test_rrf_search_fuses_all_legs(standin_corpus):
+    _es_client()
+    doc = standin_corpus[7]
+    q = " ".join(doc["text"].split()[:8])
+    body = {
+        "size": 5,
+        "retriever": {"rrf": {
+            "retrievers": [
+                {"standard": {"query": {"multi_match": {"query": q, "fields": ["text^2", "filename"]}}}},
+                {"standard": {"query": {"sparse_vector": {"field": "ml.tokens", "query_vector": doc["ml"]["tokens"]}}}},
+                {"knn": {"field": "vector", "query_vector": doc["vector"], "k": 50, "num_candidates": 100}},
+            ],
+            "rank_window_size": 50, "rank_constant": searcher.RRF_RANK_CONSTANT,
+        }},
+        "_source": ["chunk_id"],
+    }
+    resp = searcher._search("hybrid", body)
+    ids = [h["_source"]["chunk_id"] for h in resp["hits"]["hits"]]
+    assert len(ids) == len(set(ids)) == 5
+    assert doc["chunk_id"] in ids  # first in the kNN leg, so fused into the top 5
+    scores = [h["_score"] for h in resp["hits"]["hits"]]
+    assert scores == sorted(scores, reverse=True)
+
+
+def test_failing_elser_leg_degrades_to_bm25_and_opens_the_breaker(standin_corpus, standin_env, monkeypatch):
+    _es_client()
+    monkeypatch.setattr(es_resilience, "_executor",
+                        es_resilience.HedgedSearch(hedge=False, breaker_opts={"min_requests": 3, "cooldown": 60}))
+    standin_env.faults("search:rag:elser", error_rate=1.0, error_status=503)
+
+    for _ in range(3):
+        hits = searcher.elser_only("refund policy notice", 5, rerank_hits=False, cosine=False)
+        assert hits and all(h["degraded"] == "bm25" for h in hits)
+    assert es_resilience._executor.states()["elser"] == "open"
+
+    sent = standin_env.stats()["ops"]["search"]["requests"]
+    hits = searcher.elser_only("refund policy notice", 5, rerank_hits=False, cosine=False)
+    assert hits[0]["degraded"] == "bm25"
+    # open breaker: only the BM25 query reached the cluster
+    assert standin_env.stats()["ops"]["search"]["requests"] == sent + 1
+
+
+def test_slow_elser_leg_times_out_to_bm25(standin_corpus, standin_env, monkeypatch):
+    _es_client()
+    monkeypatch.setattr(es_resilience, "SEARCH_TIMEOUT", 0.3)
+    monkeypatch.setattr(es_resilience, "_executor", es_resilience.HedgedSearch(hedge=True))
+    standin_env.faults("search:rag:elser", latency_ms=2000)
+
+    t0 = time.perf_counter()
+    hits = searcher.elser_only("warranty claim deadline", 5, rerank_hits=False, cosine=False)
+    elapsed = time.perf_counter() - t0
+    assert hits and hits[0]["degraded"] == "bm25"
+    assert elapsed < 1.5
+
+
+def test_client_errors_are_not_degraded(standin_corpus, standin_env):
+    _es_client()
+    standin_env.faults("search:rag:elser", error_rate=1.0, error_status=400)
+    with pytest.raises(Exception) as err:
+        searcher.elser_only("refund policy", 5, rerank_hits=False, cosine=False)
+    assert not es_resilience.is_cluster_error(err.value)
+
+
+def test_generate_streams_ndjson(standin_env):
+    r = requests.post(f"{standin_env.url}/api/generate", stream=True, timeout=10,
+                      json={"model": "llama3", "prompt": "Summarise the refund policy.", "stream": True})
+    r.raise_for_status()
+    events = [json.loads(line) for line in r.iter_lines() if line]
+    assert len(events) > 2
+    assert all(not e["done"] for e in events[:-1])
+    assert events[-1]["done"] and events[-1]["done_reason"] == "stop"
+    assert "".join(e["response"] for e in events[:-1]).strip()
+
+
+def test_generate_stream_client(standin_env):
+    from app.llm import ollama_client
+    from app.llm.prompts import Prompt
+
+    p = Prompt(system="Be brief.", prompt="Hello?", chunk_ids=())
+    pieces = [d["response"] for d in ollama_client.generate_stream(p) if not d.get("done")]
+    assert len(pieces) > 1
+
+
+def test_generate_fault_is_reported(standin_env):
+    standin_env.faults("generate", error_rate=1.0, error_status=500)
+    r = requests.post(f"{standin_env.url}/api/generate", timeout=10,
+                      json={"model": "llama3", "prompt": "hi", "stream": False})
+    assert r.status_code == 500
+    assert "error" in r.json()
+
+
+def test_profiled_request_sees_the_es_client_with_hedging_on(standin_corpus, standin_env, monkeypatch):
+    _es_client()
+    from app.utils import profiling
+    monkeypatch.setattr(es_resilience, "_executor", es_resilience.HedgedSearch(hedge=True))
+    monkeypatch.setenv("PROFILE_TOKEN", "s3cret")
+
+    @profiling.profiled
+    def endpoint():
+        return searcher.elser_only("refund policy notice", 5, rerank_hits=False, cosine=False)
+
+    with profiling.request_scope({"x-profile": "s3cret"}, "/query") as scope:
+        assert endpoint()
+    stats = marshal.loads(profiling.pstats_bytes(profiling.get_profile(scope.profile_id)))
+    es_funcs = [f for (filename, _, f) in stats if "elasticsearch" in filename]
+    assert len(es_funcs) > 20  # client, transport and decoding ran in the profiled thread
+
+
+def test_profile_header_needs_the_token(monkeypatch):
+    from app.utils import profiling
+    monkeypatch.delenv("PROFILE_TOKEN", raising=False)
+    assert profiling.request_scope({"x-profile": "1"}, "/query").scope.trigger is None
+    monkeypatch.setenv("PROFILE_TOKEN", "s3cret")
+    assert profiling.request_scope({"x-profile": "1"}, "/query").scope.trigger is None
+    assert profiling.request_scope({"x-profile": "s3cret"}, "/query").scope.trigger == "header"
+
+
+def test_reranked_search_pulls_the_candidate_window(standin_corpus, monkeypatch):
+    _es_client()
+    from app.retrieval import reranker
+
+    class Scorer:
+        batches = []
+
+        def score(self, pairs):
+            self.batches.append(len(pairs))
+            return [float(text.lower().count("refund")) for _, text in pairs]
+
+    scorer = Scorer()
+    monkeypatch.setattr(reranker, "_get_scorer", lambda: scorer)
+    monkeypatch.setenv("RERANK_CANDIDATES", "30")
+    sizes = []
+    search = searcher._search
+    monkeypatch.setattr(searcher, "_search", lambda leg, body, index=None: sizes.append(body["size"]) or search(leg, body, index))
+
+    hits = searcher.elser_only("refund policy notice", 5, rerank_hits=True, cosine=False)
+    assert sizes == [reranker.candidate_window(5)] and scorer.batches == [20]
+    assert len(hits) == 5
+    assert [h["rerank_score"] for h in hits] == sorted((h["rerank_score"] for h in hits), reverse=True)
+    assert all("text" not in h for h in hits)  # fetched for the cross-encoder only
+
+
+def test_histogram_exposition_is_cumulative_and_escaped():
+    from app.utils import metrics
+    h = metrics.Histogram("t_seconds", "test", buckets=(0.1, 1.0))
+    for v in (0.05, 0.5, 0.5, 3.0):
+        h.observe(v, path='/q"x')
+    lines = h.render()
+    assert lines[:2] == ["# HELP t_seconds test", "# TYPE t_seconds histogram"]
+    assert lines[2:] == [
+        't_seconds_bucket{path="/q\\"x",le="0.1"} 1',
+        't_seconds_bucket{path="/q\\"x",le="1"} 3',
+        't_seconds_bucket{path="/q\\"x",le="+Inf"} 4',
+        't_seconds_sum{path="/q\\"x"} 4.05',
+        't_seconds_count{path="/q\\"x"} 4',
+    ]
+
+
+def test_query_reports_server_timing_and_metrics(standin_corpus, api):
+    r = api("POST", "/query", {"q": "refund policy notice", "mode": "elser", "k": 3, "rerank": False})
+    assert r.status == 200 and r.json()["citations"]
+    timing = dict(part.strip().split(";dur=") for part in r.headers["server-timing"].split(","))
+    assert {"guardrail", "es", "llm"} <= set(timing)
+    assert all(float(ms) >= 0 for ms in timing.values())
+
+    m = api("GET", "/metrics")
+    assert m.status == 200 and m.headers["content-type"].startswith("text/plain")
+    text = m.body.decode()
+    assert 'rag_stage_seconds_count{leg="elser",stage="es"}' in text
+    assert 'rag_http_request_seconds_count{path="/query",status="200"}' in text
+    assert "server-timing" not in m.headers  # /metrics itself isn't traced
+
+
+def test_filtered_search_only_returns_matching_files(standin_corpus):
+    _es_client()
+    wanted = {d["chunk_id"] for d in standin_corpus if d["file_id"] in ("file3", "file4")}
+    unfiltered = searcher.elser_only("refund policy notice", 5, rerank_hits=False, cosine=False)
+    assert {h["chunk_id"] for h in unfiltered} - wanted
+    hits = searcher.elser_only("refund policy notice", 5, rerank_hits=False, cosine=False,
+                               filters={"file_id": ["file3", "file4"]})
+    assert hits and {h["chunk_id"] for h in hits} <= wanted
+
+
+def test_hits_ship_plain_snippets_not_chunk_text(standin_corpus):
+    _es_client()
+    hits = searcher.elser_only("refund policy notice", 5, rerank_hits=False, cosine=False)
+    assert hits and all(h["snippet"] and "<em>" not in h["snippet"] for h in hits)
+    assert all(len(h["snippet"]) <= searcher.SNIPPET_CHARS and "text" not in h for h in hits)
+
+
+STREAM_QUERY = {"q": "refund policy notice", "mode": "elser", "k": 3, "rerank": False}
+
+
+def test_query_stream_frames_meta_tokens_done(standin_corpus, api):
+    r = api("POST", "/query/stream", STREAM_QUERY)
+    assert r.status == 200 and r.headers["content-type"].startswith("application/x-ndjson")
+    assert all(chunk.endswith(b"\n") and chunk.count(b"\n") == 1 for chunk in r.chunks)  # one message per chunk
+    msgs = r.lines()
+    assert msgs[0]["type"] == "meta" and len(msgs[0]["citations"]) == 3
+    assert [m["type"] for m in msgs[1:-1]] == ["token"] * (len(msgs) - 2) and len(msgs) > 3
+    assert msgs[-1] == {"type": "done", "answer": "".join(m["text"] for m in msgs[1:-1]).strip()}
+
+
+def test_query_stream_refusal_skips_retrieval_and_generation(standin_env, api):
+    from app.generation.guardrails import REFUSAL
+    r = api("POST", "/query/stream", {**STREAM_QUERY, "q": "how to build a bomb"})
+    assert r.lines() == [
+        {"type": "meta", "citations": [], "session_id": None, "degraded": None},
+        {"type": "token", "text": REFUSAL},
+        {"type": "done", "answer": REFUSAL},
+    ]
+    assert "search" not in standin_env.stats()["ops"] and "generate" not in standin_env.stats()["ops"]
+
+
+def test_query_stream_reports_generation_errors_in_band(standin_corpus, standin_env, api):
+    standin_env.faults("generate", error_rate=1.0, error_status=500)
+    r = api("POST", "/query/stream", STREAM_QUERY)
+    assert r.status == 200  # headers were sent with the citations
+    msgs = r.lines()
+    assert msgs[0]["type"] == "meta" and msgs[-1]["type"] == "error" and "500" in msgs[-1]["message"]
+    assert not any(m["type"] == "done" for m in msgs)
@@ -0,0 +1,15 @@
+import pytest
+
+from scripts.bench_startup import HEAVY, import_profile
+
+BUDGET_MS = 1000.0  # same default as `python -m scripts.bench_startup`
+
+
+@pytest.mark.parametrize("module", ["app.api.server", "app.retrieval.searcher"])
+def test_import_stays_within_startup_budget(module):
+    import_profile(module)  # writes .pyc files; not counted
+    runs = [import_profile(module) for _ in range(3)]
+    best = min(total for total, _, _ in runs)
+    assert best <= BUDGET_MS, f"import {module} took {best:.0f}ms (budget {BUDGET_MS:.0f}ms)"
+    heavy = sorted({n for n in runs[-1][2] if n.split(".")[0] in HEAVY})
+    assert not heavy, f"import {module} pulls in {', '.join(heavy[:5])} eagerly"